@@ -0,0 +1,408 @@
+"""
+Bulk ingestion of directories, ZIP archives and lists of PDFs.
+
+Documents flow through the same stages as /files/upload/ (hash, duplicate
+lookup, extraction + classification + entities, MinIO, MySQL, search and
+vector indexes), but pipelined: reading and MinIO uploads run on an I/O
+pool, extraction on a CPU pool, and finished documents are logged in
+batches with log_many. Every committed document is appended to a
+checkpoint file, so an interrupted run resumes where it stopped.
+
+CLI, from the title_search_platform directory:
+    python -m app.bulk_ingest /archives/county_2019.zip /archives/scans/
+"""
+import os
+import io
+import json
+import time
+import hashlib
+import zipfile
+import logging
+import argparse
+import datetime
+import threading
+from collections import deque
+from contextlib import ExitStack
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional
+
+from app import db_manager
+from app.file_service import (
+    analyze_pdf_bytes, cached_analysis, content_object_name, rerun_entities, store_object, upload_record,
+    DocumentAnalysis,
+)
+from app.search_service import index_upload
+
+logger = logging.getLogger(__name__)
+
+BULK_CPU_WORKERS = int(os.getenv("BULK_CPU_WORKERS", "2"))
+BULK_IO_WORKERS = int(os.getenv("BULK_IO_WORKERS", "4"))
+# Documents logged per log_many transaction (and per checkpoint write)
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "50"))
+# Documents read but not yet logged; bounds the PDF bytes held in memory
+BULK_MAX_IN_FLIGHT = int(os.getenv("BULK_MAX_IN_FLIGHT", str(BULK_CPU_WORKERS * 4)))
+BULK_INGEST_DIR = os.getenv("BULK_INGEST_DIR", str(Path(__file__).parent / ".bulk_ingest"))
+PROGRESS_INTERVAL_SECONDS = 10.0
+
+
+class SourceDocument(NamedTuple):
+    key: str                    # Checkpoint key, unique across sources
+    filename: str               # Stored as FileUpload.filename
+    read: Callable[[], bytes]
+
+
+def iter_source_documents(source: str, stack: ExitStack) -> Iterator[SourceDocument]:
+    """
+    PDFs under a directory (recursively), inside a ZIP archive, or a single
+    PDF. Archives stay open on `stack` so members can be read from worker
+    threads after iteration has moved on.
+    """
+    path = Path(source).resolve()
+    if path.is_dir():
+        for pdf in sorted(p for p in path.rglob("*") if p.is_file() and p.suffix.lower() == ".pdf"):
+            relative = pdf.relative_to(path).as_posix()
+            yield SourceDocument(f"{path}/{relative}", relative, pdf.read_bytes)
+    elif zipfile.is_zipfile(path):
+        archive = stack.enter_context(zipfile.ZipFile(path))
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or not name.lower().endswith(".pdf") or name.startswith("__MACOSX/"):
+                continue
+            yield SourceDocument(f"{path}!{name}", name, lambda info=info: archive.read(info))
+    elif path.is_file() and path.suffix.lower() == ".pdf":
+        yield SourceDocument(str(path), path.name, path.read_bytes)
+    else:
+        raise ValueError(f"'{source}' is not a directory, ZIP archive or PDF.")
+
+
+def read_checkpoint(path: str) -> set:
+    """Keys of the documents a previous run already logged."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as checkpoint:
+        for line in checkpoint:
+            try:
+                done.add(json.loads(line)["key"])
+            except (ValueError, KeyError):
+                # A line cut short by a crash; the document is simply redone
+                continue
+    return done
+
+
+def default_checkpoint_path(sources: List[str]) -> str:
+    """Checkpoint path derived from the sources, so rerunning the same command resumes."""
+    digest = hashlib.sha1("\n".join(sorted(str(Path(s).resolve()) for s in sources)).encode()).hexdigest()
+    return str(Path(BULK_INGEST_DIR) / f"checkpoint-{digest[:16]}.jsonl")
+
+
+class _Item:
+    """A document moving through the pipeline."""
+
+    def __init__(self, source: SourceDocument):
+        self.source = source
+        self.uploaded_time = datetime.datetime.utcnow()
+        self.file_size = 0
+        self.content_hash: Optional[str] = None
+        self.cached: Optional[dict] = None
+        self.analysis: Optional[DocumentAnalysis] = None
+        self.minio_object_name: Optional[str] = None
+        self.minio_seconds: Optional[float] = None
+        self.outstanding = 0
+        self.error: Optional[str] = None
+
+
+class BulkIngest:
+    """
+    One bulk ingestion run over `sources` (directories, ZIP archives or PDFs).
+
+    Args:
+        sources (List[str]): Paths to ingest.
+        checkpoint_path (Optional[str]): JSON-lines file of logged documents.
+            Defaults to a path derived from the sources.
+        extractor (Optional[str]): Entity extractor backend, as for /files/upload/.
+        cpu_workers (int): Documents analyzed at once. Pages of one document
+            are still fanned out to the page extraction processes.
+        io_workers (int): Concurrent reads and MinIO uploads.
+        batch_size (int): Documents per log_many transaction.
+        index (bool): Add logged documents to the search and vector indexes.
+            Other processes, such as the API workers, may append to the same
+            index files; every write holds the index directory's lock.
+    """
+
+    def __init__(self, sources: List[str], checkpoint_path: Optional[str] = None, extractor: Optional[str] = None,
+                 cpu_workers: int = BULK_CPU_WORKERS, io_workers: int = BULK_IO_WORKERS,
+                 batch_size: int = BULK_BATCH_SIZE, max_in_flight: int = BULK_MAX_IN_FLIGHT, index: bool = True,
+                 on_progress: Optional[Callable[[dict], None]] = None):
+        self.sources = list(sources)
+        self.checkpoint_path = checkpoint_path or default_checkpoint_path(self.sources)
+        self.extractor = extractor
+        self.cpu_workers = max(1, cpu_workers)
+        self.io_workers = max(1, io_workers)
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self.index = index
+        self.on_progress = on_progress
+        self.status = "pending"
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._counts = {"documents": 0, "pages": 0, "duplicates": 0, "failed": 0, "skipped": 0}
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+
+    def stop(self) -> None:
+        """Stops admitting documents; in-flight ones are finished and checkpointed."""
+        self._stop.set()
+
+    def stats(self) -> dict:
+        """Counts so far plus docs/sec and pages/sec since the run started."""
+        with self._lock:
+            counts = dict(self._counts)
+        if self._started is None:
+            seconds = 0.0
+        else:
+            seconds = (self._finished or time.perf_counter()) - self._started
+        return {
+            "status": self.status,
+            **counts,
+            "seconds": round(seconds, 2),
+            "docs_per_second": round(counts["documents"] / seconds, 3) if seconds else 0.0,
+            "pages_per_second": round(counts["pages"] / seconds, 3) if seconds else 0.0,
+        }
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counts[name] += amount
+
+    def run(self) -> dict:
+        """
+        Ingests every source document not in the checkpoint.
+
+        Returns:
+            dict: The final stats.
+        """
+        done = read_checkpoint(self.checkpoint_path)
+        Path(self.checkpoint_path).parent.mkdir(parents=True, exist_ok=True)
+        self.status = "running"
+        self._started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                io_pool = stack.enter_context(ThreadPoolExecutor(self.io_workers, thread_name_prefix="bulk-io"))
+                cpu_pool = stack.enter_context(ThreadPoolExecutor(self.cpu_workers, thread_name_prefix="bulk-cpu"))
+                checkpoint = stack.enter_context(open(self.checkpoint_path, "a", encoding="utf-8"))
+                documents = (
+                    document for source in self.sources for document in iter_source_documents(source, stack)
+                )
+                self._pipeline(documents, done, io_pool, cpu_pool, checkpoint)
+            self.status = "stopped" if self._stop.is_set() else "done"
+        except KeyboardInterrupt:
+            self.status = "stopped"
+            raise
+        except Exception:
+            self.status = "failed"
+            raise
+        finally:
+            self._finished = time.perf_counter()
+        stats = self.stats()
+        logger.info(f"Bulk ingest {self.status}: {stats}")
+        return stats
+
+    def _pipeline(self, documents: Iterator[SourceDocument], done: set, io_pool: ThreadPoolExecutor,
+                  cpu_pool: ThreadPoolExecutor, checkpoint: io.TextIOBase) -> None:
+        pending: Dict[Future, tuple] = {}
+        ready: List[_Item] = []
+        in_flight = 0
+        # Hashes being processed. A second copy of the same content waits for
+        # the first to be logged, then is served from the stored extraction.
+        active_hashes = set()
+        deferred: Dict[str, List[SourceDocument]] = {}
+        retry: deque = deque()
+        exhausted = False
+        last_report = time.perf_counter()
+
+        def finish(item: _Item) -> None:
+            if item.error is None:
+                ready.append(item)
+                return
+            logger.error(f"Bulk ingest of '{item.source.key}' failed: {item.error}")
+            self._count("failed")
+            release(item)
+
+        def release(item: _Item) -> None:
+            nonlocal in_flight
+            in_flight -= 1
+            if item.content_hash in active_hashes:
+                active_hashes.discard(item.content_hash)
+                retry.extend(deferred.pop(item.content_hash, []))
+
+        while True:
+            while not self._stop.is_set() and in_flight < self.max_in_flight and (retry or not exhausted):
+                if retry:
+                    source = retry.popleft()
+                else:
+                    source = next(documents, None)
+                    if source is None:
+                        exhausted = True
+                        break
+                    if source.key in done:
+                        self._count("skipped")
+                        continue
+                item = _Item(source)
+                pending[io_pool.submit(self._read, item)] = ("read", item)
+                in_flight += 1
+
+            flush = len(ready) >= self.batch_size or (ready and not pending)
+            if flush:
+                for item in self._log_batch(ready, checkpoint):
+                    release(item)
+                ready = []
+            if not pending:
+                if in_flight == 0 and ((exhausted and not retry) or self._stop.is_set()):
+                    break
+                continue
+
+            finished, _ = wait(list(pending), timeout=PROGRESS_INTERVAL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, item = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    item.error = item.error or f"{stage}: {e}"
+                    result = None
+
+                if stage == "read":
+                    if item.error is not None:
+                        finish(item)
+                    elif item.content_hash in active_hashes:
+                        deferred.setdefault(item.content_hash, []).append(item.source)
+                        in_flight -= 1
+                    else:
+                        active_hashes.add(item.content_hash)
+                        self._dispatch(item, result, io_pool, cpu_pool, pending, finish)
+                    continue
+
+                if stage == "analyze" and result is not None:
+                    item.analysis = result
+                elif stage == "upload" and result is not None:
+                    upload_etag, item.minio_seconds = result
+                    if not upload_etag:
+                        item.error = item.error or "MinIO upload failed."
+                item.outstanding -= 1
+                if item.outstanding == 0:
+                    finish(item)
+
+            if time.perf_counter() - last_report >= PROGRESS_INTERVAL_SECONDS:
+                last_report = time.perf_counter()
+                self._report()
+
+    def _read(self, item: _Item) -> bytes:
+        file_bytes = item.source.read()
+        item.file_size = len(file_bytes)
+        if not item.file_size:
+            raise ValueError("file is empty")
+        item.content_hash = hashlib.sha256(file_bytes).hexdigest()
+        item.cached = db_manager.db_metadata_manager.find_by_content_hash(item.content_hash)
+        return file_bytes
+
+    def _dispatch(self, item: _Item, file_bytes: bytes, io_pool: ThreadPoolExecutor, cpu_pool: ThreadPoolExecutor,
+                  pending: Dict[Future, tuple], finish: Callable[[_Item], None]) -> None:
+        if item.cached is not None:
+            item.minio_object_name = item.cached["minio_object_name"] or content_object_name(item.content_hash)
+            item.analysis = cached_analysis(item.cached)
+            if self.extractor is None:
+                finish(item)
+                return
+            item.outstanding = 1
+            pending[cpu_pool.submit(rerun_entities, item.analysis, self.extractor)] = ("analyze", item)
+            return
+        # Extraction and the MinIO upload of the same bytes run side by side
+        item.minio_object_name = content_object_name(item.content_hash)
+        item.outstanding = 2
+        pending[cpu_pool.submit(analyze_pdf_bytes, file_bytes, self.extractor)] = ("analyze", item)
+        pending[io_pool.submit(
+            store_object, io.BytesIO(file_bytes), item.minio_object_name, item.file_size
+        )] = ("upload", item)
+
+    def _log_batch(self, items: List[_Item], checkpoint: io.TextIOBase) -> List[_Item]:
+        records = [
+            upload_record(
+                item.analysis, item.cached, item.minio_seconds,
+                filename=item.source.filename,
+                uploaded_time=item.uploaded_time,
+                file_size=item.file_size,
+                content_hash=item.content_hash,
+                minio_object_name=item.minio_object_name,
+            )
+            for item in items
+        ]
+        db_ids = db_manager.db_metadata_manager.log_many(records)
+        if db_ids is None:
+            # Not checkpointed, so the next run retries them
+            logger.error(f"Logging a batch of {len(items)} documents failed.")
+            self._count("failed", len(items))
+            return items
+
+        for item, db_id in zip(items, db_ids):
+            if self.index:
+                analysis = item.analysis
+                index_upload(
+                    db_id, item.source.filename, item.uploaded_time, analysis.document_type,
+                    analysis.extracted_text, analysis.extracted_entities, analysis.sentences,
+                    analysis.sentence_embeddings
+                )
+            checkpoint.write(json.dumps({"key": item.source.key, "db_id": db_id}) + "\n")
+        checkpoint.flush()
+        os.fsync(checkpoint.fileno())
+
+        duplicates = sum(1 for item in items if item.cached is not None)
+        self._count("documents", len(items))
+        self._count("duplicates", duplicates)
+        self._count("pages", sum(item.analysis.total_pages for item in items if item.cached is None))
+        return items
+
+    def _report(self) -> None:
+        stats = self.stats()
+        logger.info(
+            f"Bulk ingest: {stats['documents']} docs ({stats['docs_per_second']}/s), "
+            f"{stats['pages']} pages ({stats['pages_per_second']}/s), {stats['failed']} failed"
+        )
+        if self.on_progress is not None:
+            self.on_progress(stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="+", help="Directories, ZIP archives or PDFs to ingest.")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: derived from the sources, under BULK_INGEST_DIR).")
+    parser.add_argument("--extractor", help="Entity extractor backend: semantic or ner (default: per document type).")
+    parser.add_argument("--cpu-workers", type=int, default=BULK_CPU_WORKERS)
+    parser.add_argument("--io-workers", type=int, default=BULK_IO_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE)
+    parser.add_argument("--max-in-flight", type=int, default=BULK_MAX_IN_FLIGHT)
+    parser.add_argument("--no-index", action="store_true",
+                        help="Skip the local search and vector indexes, e.g. when the API runs on another machine. "
+                             "The API's background search index sync picks the rows up.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    db_manager.db_metadata_manager.create_tables()
+    from app import minio_manager
+    minio_manager.minio_metadata_manager.ensure_bucket()
+
+    run = BulkIngest(
+        args.sources, checkpoint_path=args.checkpoint, extractor=args.extractor, cpu_workers=args.cpu_workers,
+        io_workers=args.io_workers, batch_size=args.batch_size, max_in_flight=args.max_in_flight,
+        index=not args.no_index,
+    )
+    print(f"Checkpoint: {run.checkpoint_path}")
+    try:
+        stats = run.run()
+    except KeyboardInterrupt:
+        stats = run.stats()
+        print("Interrupted; rerun the same command to resume.")
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import re
+import json
+import uuid
+import fcntl
+import shutil
+import logging
+import threading
+from pathlib import Path
+from typing import IO, Annotated, Dict, List, Optional
+from fastapi import APIRouter, UploadFile, File, HTTPException
+from pydantic import BaseModel
+
+from app.bulk_ingest import BulkIngest, BULK_INGEST_DIR, read_checkpoint
+from app.executors import io_executor
+from app.file_service import validate_extractor
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# One directory per run: staged sources/, run.json (options), checkpoint.jsonl
+# and, once the run has ended, summary.json. Runs without a summary are
+# resumed at startup by whichever API worker claims them first.
+RUNS_DIR = Path(BULK_INGEST_DIR) / "runs"
+_RUN_ID = re.compile(r"[0-9a-f]{32}")
+
+_runs: Dict[str, BulkIngest] = {}
+_runs_lock = threading.Lock()
+
+
+class BulkIngestResponse(BaseModel):
+    run_id: str
+    status: str
+    files: List[str]
+
+
+class BulkIngestStatus(BaseModel):
+    run_id: str
+    status: str
+    documents: int = 0
+    pages: int = 0
+    duplicates: int = 0
+    failed: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+    docs_per_second: float = 0.0
+    pages_per_second: float = 0.0
+    error: Optional[str] = None
+
+
+def _run_sources(run_dir: Path) -> List[str]:
+    return sorted(str(path) for path in (run_dir / "sources").glob("*/*"))
+
+
+def _claim(run_dir: Path) -> Optional[IO[bytes]]:
+    """
+    Takes the run's exclusive flock on run.json without waiting. The claim
+    lasts as long as the returned file stays open, and the OS drops it when
+    the process dies, so at most one API worker executes a run and a run
+    whose worker died can be resumed by another.
+
+    Returns:
+        Optional[IO[bytes]]: The locked file, or None if the run is claimed
+        elsewhere (another worker process, or another thread here).
+    """
+    lock_file = open(run_dir / "run.json", "rb")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def _execute(run_id: str, run_dir: Path, ingest: BulkIngest, claim: IO[bytes]) -> None:
+    try:
+        summary = None
+        try:
+            summary = ingest.run()
+        except Exception as e:
+            logger.error(f"Bulk ingest run {run_id} failed: {e}")
+            summary = {**ingest.stats(), "error": str(e)}
+        finally:
+            with _runs_lock:
+                _runs.pop(run_id, None)
+        if summary["status"] == "stopped":
+            # Shut down mid-run; picked up again by resume_bulk_runs
+            return
+        (run_dir / "summary.json").write_text(json.dumps(summary))
+        shutil.rmtree(run_dir / "sources", ignore_errors=True)
+    finally:
+        # Released only once the summary is written, so no other worker resumes a finished run
+        claim.close()
+
+
+def start_run(run_id: str) -> Optional[BulkIngest]:
+    """
+    Claims a staged run and executes it in a background thread.
+
+    Returns:
+        Optional[BulkIngest]: The run, or None if it has finished or
+        another worker holds it.
+    """
+    run_dir = RUNS_DIR / run_id
+    claim = _claim(run_dir)
+    if claim is None:
+        return None
+    # Checked under the claim: the previous owner writes the summary before letting go
+    if (run_dir / "summary.json").exists():
+        claim.close()
+        return None
+    try:
+        options = json.loads((run_dir / "run.json").read_text())
+        ingest = BulkIngest(
+            _run_sources(run_dir), checkpoint_path=str(run_dir / "checkpoint.jsonl"), extractor=options.get("extractor")
+        )
+    except Exception:
+        claim.close()
+        raise
+    with _runs_lock:
+        _runs[run_id] = ingest
+    threading.Thread(
+        target=_execute, args=(run_id, run_dir, ingest, claim), name=f"bulk-{run_id[:8]}", daemon=True
+    ).start()
+    return ingest
+
+
+def resume_bulk_runs() -> int:
+    """
+    Restarts bulk runs left unfinished by a previous process. Every API
+    worker calls this at startup; each run is resumed only by the worker
+    that claims it, and runs another live worker is executing are skipped.
+    """
+    if not RUNS_DIR.is_dir():
+        return 0
+    resumed = 0
+    for run_dir in RUNS_DIR.iterdir():
+        if _RUN_ID.fullmatch(run_dir.name) and (run_dir / "run.json").exists() \
+                and not (run_dir / "summary.json").exists():
+            if start_run(run_dir.name) is not None:
+                resumed += 1
+    return resumed
+
+
+def _claimed_status(run_dir: Path) -> str:
+    """'running' if another worker process holds the run, else 'interrupted'."""
+    if not (run_dir / "run.json").exists():
+        return "interrupted"
+    claim = _claim(run_dir)
+    if claim is None:
+        return "running"
+    claim.close()
+    return "interrupted"
+
+
+def stop_bulk_runs() -> None:
+    """Stops admitting documents; each run checkpoints what it has in flight."""
+    with _runs_lock:
+        for ingest in _runs.values():
+            ingest.stop()
+
+
+def stage_upload(file: UploadFile, target: Path) -> None:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    file.file.seek(0)
+    with open(target, "wb") as out:
+        shutil.copyfileobj(file.file, out, length=1024 * 1024)
+
+
+@router.post("/", response_model=BulkIngestResponse, status_code=202)
+async def submit_bulk_ingest(files: Annotated[List[UploadFile], File()], extractor: Optional[str] = None):
+    """
+    Ingests many PDFs at once: any mix of PDF files and ZIP archives of
+    PDFs. The uploads are staged to disk and processed in the background
+    by a pipelined, checkpointed run. Poll /files/bulk/{run_id} for progress.
+    """
+    validate_extractor(extractor)
+    names = [Path(file.filename or "").name for file in files]
+    for name in names:
+        if not name.lower().endswith((".pdf", ".zip")):
+            raise HTTPException(status_code=400, detail=f"'{name}' is not a PDF or ZIP archive.")
+
+    run_id = uuid.uuid4().hex
+    run_dir = RUNS_DIR / run_id
+    try:
+        for position, (file, name) in enumerate(zip(files, names)):
+            # One folder per upload keeps same-named files apart
+            await io_executor.run(stage_upload, file, run_dir / "sources" / f"{position:05d}" / name)
+        # Written last: a run without it was never fully staged and is not resumed
+        (run_dir / "run.json").write_text(json.dumps({"extractor": extractor, "files": names}))
+    except Exception:
+        shutil.rmtree(run_dir, ignore_errors=True)
+        raise
+    finally:
+        for file in files:
+            await file.close()
+
+    ingest = start_run(run_id)
+    # None only if a worker starting up at this moment resumed the new run first
+    return BulkIngestResponse(run_id=run_id, status=ingest.status if ingest is not None else "running", files=names)
+
+
+@router.get("/{run_id}", response_model=BulkIngestStatus)
+async def get_bulk_ingest(run_id: str):
+    """Progress of a bulk run: documents and pages done, failures, docs/sec and pages/sec."""
+    if not _RUN_ID.fullmatch(run_id):
+        raise HTTPException(status_code=404, detail="Bulk run not found.")
+    with _runs_lock:
+        ingest = _runs.get(run_id)
+    if ingest is not None:
+        return BulkIngestStatus(run_id=run_id, **ingest.stats())
+
+    run_dir = RUNS_DIR / run_id
+    summary = run_dir / "summary.json"
+    if summary.exists():
+        return BulkIngestStatus(run_id=run_id, **json.loads(summary.read_text()))
+    if run_dir.is_dir():
+        documents = len(read_checkpoint(str(run_dir / "checkpoint.jsonl")))
+        return BulkIngestStatus(run_id=run_id, status=_claimed_status(run_dir), documents=documents)
+    raise HTTPException(status_code=404, detail="Bulk run not found.")
@@ -1,11 +1,20 @@
 import os
+import json
+import time
 import datetime
-from typing import Optional  # Added for Python 3.9 type hints
+import threading
+from typing import Optional, List  # Added for Python 3.9 type hints
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, BigInteger
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import (
+    create_engine, event, Column, Integer, String, DateTime, BigInteger, Text, Float, ForeignKey, Index, and_, or_
+)
+from sqlalchemy.orm import sessionmaker, declarative_base, relationship
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.exc import SQLAlchemyError, OperationalError
 
+from app import metrics
+from app.executors import io_executor
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -16,18 +25,142 @@ MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "title_search_db") # This will be file_metadata_db from .env
 MYSQL_PORT = os.getenv("MYSQL_PORT", "3306")
 
-# Define the database URL for mysql-connector-python
-DATABASE_URL = f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
+# Define the database URL for mysql-connector-python (DATABASE_URL overrides it, e.g. for a local stand-in)
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
+)
+
+# Connection pool. Size it for the I/O executor plus the job workers; pre-ping
+# replaces connections MySQL dropped (e.g. after a restart) and recycle retires
+# them before MySQL's wait_timeout does.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+
+class DBStats:
+    """Pool checkout waits and statement latencies, fed by the engine's pool and events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.checkout_timeouts = 0
+        self.statements = 0
+        self.statement_total = 0.0
+        self.statement_max = 0.0
+        self.errors = 0
+
+    def record_checkout(self, waited: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.checkout_timeouts += 1
+                return
+            self.checkouts += 1
+            self.checkout_wait_total += waited
+            self.checkout_wait_max = max(self.checkout_wait_max, waited)
+
+    def record_statement(self, seconds: float) -> None:
+        with self._lock:
+            self.statements += 1
+            self.statement_total += seconds
+            self.statement_max = max(self.statement_max, seconds)
+
+    def record_error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.checkout_timeouts,
+                "avg_checkout_wait_seconds": self.checkout_wait_total / self.checkouts if self.checkouts else 0.0,
+                "max_checkout_wait_seconds": self.checkout_wait_max,
+                "statements": self.statements,
+                "avg_statement_seconds": self.statement_total / self.statements if self.statements else 0.0,
+                "max_statement_seconds": self.statement_max,
+                "errors": self.errors,
+            }
+
+
+db_stats = DBStats()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a free connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            db_stats.record_checkout(time.perf_counter() - started, timed_out=True)
+            raise
+        db_stats.record_checkout(time.perf_counter() - started)
+        return connection
+
+
+def _create_engine(url: str):
+    if url.startswith("sqlite"):
+        # SQLite stand-ins keep SQLAlchemy's default pool for their driver
+        engine = create_engine(url, pool_pre_ping=DB_POOL_PRE_PING)
+    else:
+        engine = create_engine(
+            url,
+            poolclass=InstrumentedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        db_stats.record_statement(time.perf_counter() - conn.info["statement_started"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(context):
+        started = context.connection.info.get("statement_started") if context.connection is not None else None
+        if started:
+            started.pop()
+        db_stats.record_error()
+
+    return engine
+
 
-# Create SQLAlchemy engine
+# Create the one SQLAlchemy engine (and connection pool) for the process
 try:
-    engine = create_engine(DATABASE_URL)
+    engine = _create_engine(DATABASE_URL)
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 except Exception as e:
     print(f"Error creating database engine: {e}")
     engine = None
     SessionLocal = None
 
+
+def pool_stats() -> dict:
+    """Pool occupancy plus checkout wait and statement latency stats."""
+    stats = db_stats.snapshot()
+    pool = engine.pool if engine is not None else None
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "idle": pool.checkedin(),
+        })
+    return stats
+
 # Define Base for declarative models
 Base = declarative_base()
 
@@ -40,24 +173,175 @@ class FileUpload(Base):
     uploaded_time = Column(DateTime, default=datetime.datetime.utcnow)
     file_size = Column(BigInteger)
     total_pages = Column(Integer)
+    content_hash = Column(String(64), index=True)  # SHA-256 of the uploaded bytes
+    minio_object_name = Column(String(255))
+    document_type = Column(String(32))
+    extracted_text = Column(Text(length=2**32 - 1))  # LONGTEXT on MySQL; only set on the first upload of a hash
+    extracted_entities = Column(Text)  # JSON-encoded dict
+
+    pages = relationship("DocumentPage", cascade="all, delete-orphan", order_by="DocumentPage.page_number")
+    classification = relationship("DocumentClassification", cascade="all, delete-orphan", uselist=False)
+    entities = relationship("DocumentEntity", cascade="all, delete-orphan", order_by="DocumentEntity.position")
+    stage_timings = relationship("StageTiming", cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<FileUpload(id={self.id}, filename='{self.filename}', pages={self.total_pages})>"
 
+# Child tables of file_uploads. Their primary keys start with the upload id, so
+# all rows of one upload are inserted with a single executemany per table.
+
+class DocumentPage(Base):
+    """Extraction method and timing of one page. The page text is a span of the upload's extracted_text."""
+    __tablename__ = "document_pages"
+
+    file_upload_id = Column(Integer, ForeignKey("file_uploads.id", ondelete="CASCADE"), primary_key=True)
+    page_number = Column(Integer, primary_key=True, autoincrement=False)  # 1-based
+    method = Column(String(8), nullable=False)  # "text", "ocr" or "error"
+    seconds = Column(Float)
+    text_start = Column(Integer)
+    text_end = Column(Integer)
+
+    __table_args__ = (Index("ix_document_pages_method", "method"),)
+
+class DocumentClassification(Base):
+    __tablename__ = "document_classifications"
+
+    file_upload_id = Column(Integer, ForeignKey("file_uploads.id", ondelete="CASCADE"), primary_key=True)
+    document_type = Column(String(32), nullable=False, index=True)
+    method = Column(String(16))  # "keyword" or "embedding" (fallback)
+    keyword_scores = Column(Text)  # JSON-encoded {document_type: score}
+
+class DocumentEntity(Base):
+    """One extracted value: a sentence (semantic backend) or a span with offsets (NER backend)."""
+    __tablename__ = "document_entities"
+
+    file_upload_id = Column(Integer, ForeignKey("file_uploads.id", ondelete="CASCADE"), primary_key=True)
+    position = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String(64), nullable=False)
+    value = Column(Text)
+    start = Column(Integer)
+    end = Column(Integer)
+
+    __table_args__ = (Index("ix_document_entities_name", "name", "file_upload_id"),)
+
+# Pipeline stages with recorded durations
+STAGE_EXTRACT = "extract"
+STAGE_CLASSIFY = "classify"
+STAGE_ENTITIES = "entities"
+STAGE_MINIO = "minio"
+STAGE_DB = "db"
+PIPELINE_STAGES = (STAGE_EXTRACT, STAGE_CLASSIFY, STAGE_ENTITIES, STAGE_MINIO, STAGE_DB)
+
+class StageTiming(Base):
+    __tablename__ = "stage_timings"
+
+    file_upload_id = Column(Integer, ForeignKey("file_uploads.id", ondelete="CASCADE"), primary_key=True)
+    stage = Column(String(16), primary_key=True)
+    seconds = Column(Float, nullable=False)
+
+    # Slowest documents per stage: WHERE stage = ? ORDER BY seconds DESC
+    __table_args__ = (Index("ix_stage_timings_stage_seconds", "stage", "seconds"),)
+
+# Job statuses for asynchronous ingestion
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# Define IngestJob model
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+
+    id = Column(String(36), primary_key=True)
+    status = Column(String(16), nullable=False, default=JOB_QUEUED, index=True)
+    # Worker process that claimed the job, and until when its claim holds
+    owner = Column(String(128))
+    lease_expires = Column(DateTime)
+    filename = Column(String(255), nullable=False)
+    minio_object_name = Column(String(255), nullable=False)
+    file_size = Column(BigInteger)
+    content_hash = Column(String(64))
+    uploaded_time = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_time = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    result = Column(Text)  # JSON-encoded FileUploadResponse once done
+    error = Column(Text)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "filename": self.filename,
+            "minio_object_name": self.minio_object_name,
+            "file_size": self.file_size,
+            "content_hash": self.content_hash,
+            "uploaded_time": self.uploaded_time,
+            "updated_time": self.updated_time,
+            "result": json.loads(self.result) if self.result else None,
+            "error": self.error,
+        }
+
+    def __repr__(self):
+        return f"<IngestJob(id={self.id}, filename='{self.filename}', status={self.status})>"
+
+def _claimable_job(now: datetime.datetime):
+    """Filter for jobs that are queued, or running under an expired (or no) lease."""
+    return or_(
+        IngestJob.status == JOB_QUEUED,
+        and_(IngestJob.status == JOB_RUNNING, or_(IngestJob.lease_expires.is_(None), IngestJob.lease_expires < now)),
+    )
+
+def _entity_rows(extracted_entities: dict) -> List[DocumentEntity]:
+    rows = []
+    for name, value in extracted_entities.items():
+        spans = value if isinstance(value, list) else [{"text": value}]
+        for span in spans:
+            if not span.get("text"):
+                continue
+            rows.append(DocumentEntity(
+                position=len(rows), name=name, value=span["text"], start=span.get("start"), end=span.get("end")
+            ))
+    return rows
+
+def _file_upload(filename: str, uploaded_time: datetime.datetime, file_size: int, total_pages: int,
+                 content_hash: Optional[str] = None, minio_object_name: Optional[str] = None,
+                 document_type: Optional[str] = None, extracted_text: Optional[str] = None,
+                 extracted_entities: Optional[dict] = None, pages: Optional[List[dict]] = None,
+                 classification: Optional[dict] = None, stage_timings: Optional[dict] = None) -> FileUpload:
+    file_upload = FileUpload(
+        filename=filename,
+        uploaded_time=uploaded_time,
+        file_size=file_size,
+        total_pages=total_pages,
+        content_hash=content_hash,
+        minio_object_name=minio_object_name,
+        document_type=document_type,
+        extracted_text=extracted_text,
+        extracted_entities=json.dumps(extracted_entities) if extracted_entities is not None else None
+    )
+    if pages:
+        file_upload.pages = [DocumentPage(**page) for page in pages]
+    if document_type is not None:
+        classification = classification or {}
+        file_upload.classification = DocumentClassification(
+            document_type=document_type,
+            method=classification.get("method"),
+            keyword_scores=json.dumps(classification["keyword_scores"]) if classification.get("keyword_scores") else None
+        )
+    if extracted_entities:
+        file_upload.entities = _entity_rows(extracted_entities)
+    if stage_timings:
+        file_upload.stage_timings = [StageTiming(stage=stage, seconds=seconds) for stage, seconds in stage_timings.items()]
+    return file_upload
+
 class DBMetadataManager:
     _instance = None
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(DBMetadataManager, cls).__new__(cls)
-            # Initialize DB engine and session
-            try:
-                cls.engine = create_engine(DATABASE_URL)
-                cls.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=cls.engine)
-            except Exception as e:
-                print(f"Error creating database engine: {e}")
-                cls.engine = None
-                cls.SessionLocal = None
+            # Share the module's engine so the process has a single connection pool
+            cls.engine = engine
+            cls.SessionLocal = SessionLocal
         return cls._instance
 
     def create_tables(self, retries: int = 10, delay: int = 3):
@@ -71,15 +355,31 @@ class DBMetadataManager:
                 time.sleep(delay)
         print("❌ Failed to connect to DB after retries.")
 
-    def log_file_metadata(self, filename: str, uploaded_time: datetime.datetime, file_size: int, total_pages: int) -> Optional[int]:
+    def log_file_metadata(self, filename: str, uploaded_time: datetime.datetime, file_size: int, total_pages: int,
+                          content_hash: Optional[str] = None, minio_object_name: Optional[str] = None,
+                          document_type: Optional[str] = None, extracted_text: Optional[str] = None,
+                          extracted_entities: Optional[dict] = None, pages: Optional[List[dict]] = None,
+                          classification: Optional[dict] = None,
+                          stage_timings: Optional[dict] = None) -> Optional[int]:
         """
-        Logs file metadata to the database.
+        Logs file metadata and the extraction results to the database, all
+        in one transaction.
 
         Args:
             filename (str): Name of the file.
             uploaded_time (datetime): Time of upload.
             file_size (int): Size of the file in bytes.
             total_pages (int): Total number of pages in the document.
+            content_hash (Optional[str]): SHA-256 hex digest of the file content.
+            minio_object_name (Optional[str]): Object the file is stored under.
+            document_type (Optional[str]): Classified document type.
+            extracted_text (Optional[str]): Extracted text, cached for repeat uploads.
+            extracted_entities (Optional[dict]): Extracted entities, also stored one row per value.
+            pages (Optional[List[dict]]): Per-page page_number, method, seconds,
+                text_start and text_end (offsets into extracted_text).
+            classification (Optional[dict]): Classifier method and keyword_scores.
+            stage_timings (Optional[dict]): Seconds per pipeline stage. The
+                time spent writing this record is added as the "db" stage.
 
         Returns:
             Optional[int]: The ID of the newly inserted record, or None on failure.
@@ -87,19 +387,34 @@ class DBMetadataManager:
         if not self.SessionLocal:
             print("Database session not initialized. Cannot log metadata.")
             return None
+        started = time.perf_counter()
         session = self.SessionLocal()
         try:
-            new_file_log = FileUpload(
+            new_file_log = _file_upload(
                 filename=filename,
                 uploaded_time=uploaded_time,
                 file_size=file_size,
-                total_pages=total_pages
+                total_pages=total_pages,
+                content_hash=content_hash,
+                minio_object_name=minio_object_name,
+                document_type=document_type,
+                extracted_text=extracted_text,
+                extracted_entities=extracted_entities,
+                pages=pages,
+                classification=classification,
+                stage_timings=stage_timings
             )
             session.add(new_file_log)
+            # The INSERT assigns the id; read it before commit expires the object
+            session.flush()
+            file_id = new_file_log.id
+            if stage_timings is not None:
+                session.add(StageTiming(file_upload_id=file_id, stage=STAGE_DB, seconds=time.perf_counter() - started))
+            committing = time.perf_counter()
             session.commit()
-            session.refresh(new_file_log)
-            print(f"Successfully logged metadata for file: {filename}, ID: {new_file_log.id}")
-            return new_file_log.id
+            metrics.observe_stage(metrics.STAGE_DB_COMMIT, time.perf_counter() - committing)
+            print(f"Successfully logged metadata for file: {filename}, ID: {file_id}")
+            return file_id
         except SQLAlchemyError as e:
             print(f"Database error while logging metadata: {e}")
             session.rollback()
@@ -111,8 +426,531 @@ class DBMetadataManager:
         finally:
             session.close()
 
+    def log_many(self, records: List[dict]) -> Optional[List[int]]:
+        """
+        Logs many files' metadata in a single transaction.
+
+        Args:
+            records (List[dict]): One dict per file with the keyword arguments
+                of log_file_metadata, including pages, classification and
+                stage_timings.
+
+        Returns:
+            Optional[List[int]]: The new record ids in input order, or None if
+            the transaction failed (nothing is inserted then).
+        """
+        if not self.SessionLocal:
+            print("Database session not initialized. Cannot log metadata.")
+            return None
+        if not records:
+            return []
+        started = time.perf_counter()
+        session = self.SessionLocal()
+        try:
+            file_logs = [_file_upload(**record) for record in records]
+            session.add_all(file_logs)
+            session.flush()
+            file_ids = [file_log.id for file_log in file_logs]
+            # Each record gets an equal share of the batch's write time
+            db_seconds = (time.perf_counter() - started) / len(records)
+            session.add_all([
+                StageTiming(file_upload_id=file_id, stage=STAGE_DB, seconds=db_seconds)
+                for file_id, record in zip(file_ids, records) if record.get("stage_timings") is not None
+            ])
+            committing = time.perf_counter()
+            session.commit()
+            metrics.observe_stage(metrics.STAGE_DB_COMMIT, time.perf_counter() - committing)
+            print(f"Successfully logged metadata for {len(file_ids)} files")
+            return file_ids
+        except SQLAlchemyError as e:
+            print(f"Database error while logging metadata in bulk: {e}")
+            session.rollback()
+            return None
+        except Exception as e:
+            print(f"An unexpected error occurred while logging metadata in bulk: {e}")
+            session.rollback()
+            return None
+        finally:
+            session.close()
+
+    def find_by_content_hash(self, content_hash: str) -> Optional[dict]:
+        """
+        Looks up the cached extraction for previously uploaded content.
+
+        Args:
+            content_hash (str): SHA-256 hex digest of the file content.
+
+        Returns:
+            Optional[dict]: Stored pages, text, document type and entities of
+            the first upload with this hash, or None if it was never processed.
+        """
+        if not self.SessionLocal:
+            return None
+        session = self.SessionLocal()
+        try:
+            record = (
+                session.query(FileUpload)
+                .filter(FileUpload.content_hash == content_hash, FileUpload.extracted_text.isnot(None))
+                .order_by(FileUpload.id)
+                .first()
+            )
+            metrics.count_cache("content_hash", record is not None)
+            if record is None:
+                return None
+            return {
+                "db_id": record.id,
+                "total_pages": record.total_pages,
+                "minio_object_name": record.minio_object_name,
+                "document_type": record.document_type,
+                "extracted_text": record.extracted_text,
+                "extracted_entities": json.loads(record.extracted_entities) if record.extracted_entities else {},
+            }
+        except SQLAlchemyError as e:
+            print(f"Database error while looking up content hash: {e}")
+            return None
+        finally:
+            session.close()
+
+    def get_extracted_texts(self, file_ids: List[int]) -> dict:
+        """
+        Returns the stored extracted text for each known file id.
+
+        Repeat uploads do not store their own copy of the text, so it is
+        resolved through their content hash.
+
+        Args:
+            file_ids (List[int]): FileUpload ids.
+
+        Returns:
+            dict: Mapping of file id to extracted text; unknown ids and records
+            without a stored extraction are omitted.
+        """
+        if not self.SessionLocal or not file_ids:
+            return {}
+        session = self.SessionLocal()
+        try:
+            records = session.query(FileUpload).filter(FileUpload.id.in_(file_ids)).all()
+            texts = {r.id: r.extracted_text for r in records if r.extracted_text is not None}
+            missing_hashes = {r.content_hash for r in records if r.extracted_text is None and r.content_hash}
+            if missing_hashes:
+                sources = (
+                    session.query(FileUpload.content_hash, FileUpload.extracted_text)
+                    .filter(FileUpload.content_hash.in_(missing_hashes), FileUpload.extracted_text.isnot(None))
+                    .all()
+                )
+                by_hash = {row.content_hash: row.extracted_text for row in sources}
+                for r in records:
+                    if r.id not in texts and r.content_hash in by_hash:
+                        texts[r.id] = by_hash[r.content_hash]
+            return texts
+        except SQLAlchemyError as e:
+            print(f"Database error while reading extracted texts: {e}")
+            return {}
+        finally:
+            session.close()
+
+    def get_document(self, file_id: int, include_text: bool = True) -> Optional[dict]:
+        """
+        Reads an upload with its stored extraction, without recomputing
+        anything. Repeat uploads take their pages and text from the first
+        upload of the same content.
+
+        Args:
+            file_id (int): FileUpload id.
+            include_text (bool): Include each page's text.
+
+        Returns:
+            Optional[dict]: Upload metadata, classification, entities, pages
+            and stage timings, or None if the id is unknown.
+        """
+        if not self.SessionLocal:
+            return None
+        session = self.SessionLocal()
+        try:
+            record = session.get(FileUpload, file_id)
+            if record is None:
+                return None
+            source = record
+            if record.extracted_text is None and record.content_hash:
+                source = (
+                    session.query(FileUpload)
+                    .filter(FileUpload.content_hash == record.content_hash, FileUpload.extracted_text.isnot(None))
+                    .order_by(FileUpload.id)
+                    .first()
+                ) or record
+            text = source.extracted_text or ""
+            classification = record.classification
+            return {
+                "db_id": record.id,
+                "filename": record.filename,
+                "uploaded_time": record.uploaded_time,
+                "file_size": record.file_size,
+                "total_pages": record.total_pages,
+                "content_hash": record.content_hash,
+                "minio_object_name": record.minio_object_name,
+                "document_type": record.document_type,
+                "classification": {
+                    "document_type": classification.document_type,
+                    "method": classification.method,
+                    "keyword_scores": json.loads(classification.keyword_scores) if classification.keyword_scores else None,
+                } if classification else None,
+                "entities": [
+                    {"name": e.name, "value": e.value, "start": e.start, "end": e.end} for e in record.entities
+                ],
+                "pages": [
+                    {
+                        "page_number": page.page_number,
+                        "method": page.method,
+                        "seconds": page.seconds,
+                        "text": text[page.text_start:page.text_end] if include_text and page.text_start is not None else None,
+                    }
+                    for page in source.pages
+                ],
+                "stage_timings": {timing.stage: timing.seconds for timing in record.stage_timings},
+            }
+        except SQLAlchemyError as e:
+            print(f"Database error while reading document {file_id}: {e}")
+            return None
+        finally:
+            session.close()
+
+    def slowest_documents(self, stage: str, limit: int = 20) -> List[dict]:
+        """
+        Uploads that spent the most time in a pipeline stage, slowest first.
+        Served by the (stage, seconds) index.
+        """
+        if not self.SessionLocal:
+            return []
+        session = self.SessionLocal()
+        try:
+            rows = (
+                session.query(StageTiming.file_upload_id, StageTiming.seconds, FileUpload.filename,
+                              FileUpload.total_pages, FileUpload.document_type)
+                .join(FileUpload, FileUpload.id == StageTiming.file_upload_id)
+                .filter(StageTiming.stage == stage)
+                .order_by(StageTiming.seconds.desc())
+                .limit(limit)
+                .all()
+            )
+            return [
+                {
+                    "db_id": row.file_upload_id,
+                    "seconds": row.seconds,
+                    "filename": row.filename,
+                    "total_pages": row.total_pages,
+                    "document_type": row.document_type,
+                }
+                for row in rows
+            ]
+        except SQLAlchemyError as e:
+            print(f"Database error while listing slowest documents: {e}")
+            return []
+        finally:
+            session.close()
+
+    def iter_document_ids(self, batch_size: int = 10000):
+        """
+        Yields the ids of processed uploads in id order, in batches. Only
+        the id column is read, so a derived index can be compared against
+        every row cheaply.
+
+        Yields:
+            List[int]: Up to `batch_size` ids.
+        """
+        if not self.SessionLocal:
+            return
+        after_id = 0
+        while True:
+            session = self.SessionLocal()
+            try:
+                ids = [
+                    row.id for row in session.query(FileUpload.id)
+                    .filter(FileUpload.id > after_id, FileUpload.document_type.isnot(None))
+                    .order_by(FileUpload.id)
+                    .limit(batch_size)
+                ]
+            except SQLAlchemyError as e:
+                print(f"Database error while reading document ids: {e}")
+                return
+            finally:
+                session.close()
+            if not ids:
+                return
+            after_id = ids[-1]
+            yield ids
+
+    def get_documents(self, file_ids: List[int]) -> List[dict]:
+        """
+        Processed uploads by id, in id order, for indexing.
+
+        Repeat uploads resolve their text through the content hash, like
+        get_extracted_texts.
+
+        Returns:
+            List[dict]: id, filename, uploaded_time, document_type,
+            extracted_text and extracted_entities per row.
+        """
+        if not self.SessionLocal or not file_ids:
+            return []
+        session = self.SessionLocal()
+        try:
+            records = (
+                session.query(FileUpload)
+                .filter(FileUpload.id.in_(file_ids), FileUpload.document_type.isnot(None))
+                .order_by(FileUpload.id)
+                .all()
+            )
+            texts = self.get_extracted_texts([r.id for r in records if r.extracted_text is None])
+            return [
+                {
+                    "id": r.id,
+                    "filename": r.filename,
+                    "uploaded_time": r.uploaded_time,
+                    "document_type": r.document_type,
+                    "extracted_text": r.extracted_text if r.extracted_text is not None else texts.get(r.id),
+                    "extracted_entities": json.loads(r.extracted_entities) if r.extracted_entities else {},
+                }
+                for r in records
+            ]
+        except SQLAlchemyError as e:
+            print(f"Database error while reading documents: {e}")
+            return []
+        finally:
+            session.close()
+
+    def create_job(self, job_id: str, filename: str, minio_object_name: str, file_size: int,
+                   uploaded_time: datetime.datetime, content_hash: Optional[str] = None) -> bool:
+        """
+        Records a new queued ingestion job.
+
+        Args:
+            job_id (str): Unique job identifier.
+            filename (str): Original name of the uploaded file.
+            minio_object_name (str): Object holding the uploaded bytes.
+            file_size (int): Size of the file in bytes.
+            uploaded_time (datetime): Time of upload.
+            content_hash (Optional[str]): SHA-256 hex digest of the file content.
+
+        Returns:
+            bool: True if the job was stored, False on failure.
+        """
+        if not self.SessionLocal:
+            print("Database session not initialized. Cannot create job.")
+            return False
+        session = self.SessionLocal()
+        try:
+            session.add(IngestJob(
+                id=job_id,
+                status=JOB_QUEUED,
+                filename=filename,
+                minio_object_name=minio_object_name,
+                file_size=file_size,
+                content_hash=content_hash,
+                uploaded_time=uploaded_time,
+            ))
+            session.commit()
+            return True
+        except SQLAlchemyError as e:
+            print(f"Database error while creating job {job_id}: {e}")
+            session.rollback()
+            return False
+        finally:
+            session.close()
+
+    def claim_job(self, job_id: str, owner: str, lease_seconds: int) -> bool:
+        """
+        Atomically takes a job for one worker process: a single conditional
+        UPDATE moves it to running if it is queued, or running under an
+        expired lease. Of several processes claiming the same job, exactly
+        one succeeds.
+
+        Args:
+            job_id (str): Job identifier.
+            owner (str): Id of the claiming process.
+            lease_seconds (int): How long the claim holds unless renewed.
+
+        Returns:
+            bool: True if this owner now holds the job.
+        """
+        if not self.SessionLocal:
+            print("Database session not initialized. Cannot claim job.")
+            return False
+        now = datetime.datetime.utcnow()
+        session = self.SessionLocal()
+        try:
+            claimed = (
+                session.query(IngestJob)
+                .filter(IngestJob.id == job_id, _claimable_job(now))
+                .update({
+                    IngestJob.status: JOB_RUNNING,
+                    IngestJob.owner: owner,
+                    IngestJob.lease_expires: now + datetime.timedelta(seconds=lease_seconds),
+                    IngestJob.updated_time: now,
+                }, synchronize_session=False)
+            )
+            session.commit()
+            return claimed == 1
+        except SQLAlchemyError as e:
+            print(f"Database error while claiming job {job_id}: {e}")
+            session.rollback()
+            return False
+        finally:
+            session.close()
+
+    def renew_job_leases(self, job_ids: List[str], owner: str, lease_seconds: int) -> int:
+        """
+        Extends the leases of running jobs this owner still holds.
+
+        Returns:
+            int: Number of leases renewed.
+        """
+        if not self.SessionLocal or not job_ids:
+            return 0
+        session = self.SessionLocal()
+        try:
+            renewed = (
+                session.query(IngestJob)
+                .filter(IngestJob.id.in_(job_ids), IngestJob.owner == owner, IngestJob.status == JOB_RUNNING)
+                .update({
+                    IngestJob.lease_expires: datetime.datetime.utcnow() + datetime.timedelta(seconds=lease_seconds)
+                }, synchronize_session=False)
+            )
+            session.commit()
+            return renewed
+        except SQLAlchemyError as e:
+            print(f"Database error while renewing job leases: {e}")
+            session.rollback()
+            return 0
+        finally:
+            session.close()
+
+    def update_job(self, job_id: str, status: str, result: Optional[dict] = None, error: Optional[str] = None,
+                   owner: Optional[str] = None) -> bool:
+        """
+        Updates the status (and optionally result or error) of a job.
+
+        Args:
+            job_id (str): Job identifier.
+            status (str): New job status.
+            result (Optional[dict]): JSON-serializable result payload.
+            error (Optional[str]): Failure description.
+            owner (Optional[str]): When set, the update only applies while
+                this owner still holds the job.
+
+        Returns:
+            bool: True if the job exists and was updated, False otherwise.
+        """
+        if not self.SessionLocal:
+            print("Database session not initialized. Cannot update job.")
+            return False
+        session = self.SessionLocal()
+        try:
+            job = session.get(IngestJob, job_id)
+            if job is None:
+                return False
+            if owner is not None and job.owner != owner:
+                print(f"Job {job_id} is now held by {job.owner}; not updating it to {status}.")
+                return False
+            job.status = status
+            if status in (JOB_DONE, JOB_FAILED):
+                job.lease_expires = None
+            if result is not None:
+                job.result = json.dumps(result, default=str)
+            if error is not None:
+                job.error = error
+            session.commit()
+            return True
+        except SQLAlchemyError as e:
+            print(f"Database error while updating job {job_id}: {e}")
+            session.rollback()
+            return False
+        finally:
+            session.close()
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """
+        Returns the stored state of a job, or None if it does not exist.
+        """
+        if not self.SessionLocal:
+            print("Database session not initialized. Cannot read job.")
+            return None
+        session = self.SessionLocal()
+        try:
+            job = session.get(IngestJob, job_id)
+            return job.to_dict() if job else None
+        except SQLAlchemyError as e:
+            print(f"Database error while reading job {job_id}: {e}")
+            return None
+        finally:
+            session.close()
+
+    def list_job_ids(self, statuses: List[str]) -> List[str]:
+        """
+        Returns ids of jobs in any of the given statuses, oldest first.
+        """
+        if not self.SessionLocal:
+            return []
+        session = self.SessionLocal()
+        try:
+            rows = (
+                session.query(IngestJob.id)
+                .filter(IngestJob.status.in_(statuses))
+                .order_by(IngestJob.uploaded_time)
+                .all()
+            )
+            return [row.id for row in rows]
+        except SQLAlchemyError as e:
+            print(f"Database error while listing jobs: {e}")
+            return []
+        finally:
+            session.close()
+
+    def list_claimable_job_ids(self) -> List[str]:
+        """
+        Returns ids of jobs any process may claim now: queued ones and
+        running ones whose lease has expired, oldest first.
+        """
+        if not self.SessionLocal:
+            return []
+        session = self.SessionLocal()
+        try:
+            rows = (
+                session.query(IngestJob.id)
+                .filter(_claimable_job(datetime.datetime.utcnow()))
+                .order_by(IngestJob.uploaded_time)
+                .all()
+            )
+            return [row.id for row in rows]
+        except SQLAlchemyError as e:
+            print(f"Database error while listing claimable jobs: {e}")
+            return []
+        finally:
+            session.close()
+
+class AsyncDBMetadataManager:
+    """
+    Awaitable view of a DBMetadataManager for the FastAPI handlers: every
+    method runs the synchronous one on the bounded I/O executor, so database
+    calls never block the event loop and are shed with a 503 under overload.
+    """
+
+    def __init__(self, manager: DBMetadataManager):
+        self._manager = manager
+
+    def __getattr__(self, name: str):
+        method = getattr(self._manager, name)
+        if not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            return await io_executor.run(method, *args, **kwargs)
+
+        call.__name__ = name
+        return call
+
 # Usage example:
 db_metadata_manager = DBMetadataManager()
+async_db_metadata_manager = AsyncDBMetadataManager(db_metadata_manager)
 
 if __name__ == '__main__':
     # Example Usage (for testing purposes)
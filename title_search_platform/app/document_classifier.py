@@ -1,10 +1,10 @@
+from typing import List, Optional
 
-from sentence_transformers import SentenceTransformer, util
-from app.model_loader import model 
-# Load sentence-transformer model once
-model = SentenceTransformer("all-MiniLM-L6-v2")
+from app.model_loader import get_embedding_model, get_static_embeddings, CLASSIFY_ENCODE_BATCH_SIZE
+from app.keyword_matcher import KeywordMatcher
 
-# Define weighted keyword sets per document type
+# Define weighted keyword sets per document type.
+# Entries are phrases (weight 1) or (phrase, weight) pairs.
 DOCUMENT_KEYWORDS = {
     "deed": [
         "grantor", "grantee", "warranty deed", "quit claim", "executed by",
@@ -24,6 +24,12 @@ DOCUMENT_KEYWORDS = {
     ]
 }
 
+# Built once from DOCUMENT_KEYWORDS; scores every document type per scan
+KEYWORD_MATCHER = KeywordMatcher(DOCUMENT_KEYWORDS)
+
+# Characters of a streamed document kept for the embedding fallback
+FALLBACK_TEXT_CHARS = 16384
+
 # Optional fallback reference examples for sentence similarity
 REFERENCE_TEXTS = {
     "deed": "This Warranty Deed is made by the grantor to the grantee for the consideration of...",
@@ -33,31 +39,90 @@ REFERENCE_TEXTS = {
     "release": "This document is a Satisfaction of Mortgage, fully releasing the borrower..."
 }
 
-def classify_doc_type(text: str) -> str:
-    text_lower = text.lower()
-    scores = {}
+def reference_embeddings():
+    """
+    Embedding matrix of REFERENCE_TEXTS, one row per document type
+    (in dict order). Computed once and cached by model_loader.
+    """
+    return get_static_embeddings(list(REFERENCE_TEXTS.values()))
 
-    # Step 1: Keyword matching
-    for doc_type, keywords in DOCUMENT_KEYWORDS.items():
-        matches = sum(1 for keyword in keywords if keyword in text_lower)
-        scores[doc_type] = matches
+def score_keywords(text: str, count_occurrences: bool = False) -> dict:
+    """
+    Keyword score per document type: the summed weights of the keywords
+    found in `text`, optionally multiplied by their occurrence counts.
+    """
+    return KEYWORD_MATCHER.score(text, count_occurrences=count_occurrences)
 
+def _keyword_match(scores: dict) -> Optional[str]:
+    """
+    Best keyword match, or None if the scores are tied or all zero
+    and the embedding fallback has to decide.
+    """
     best_match = max(scores, key=scores.get)
-    best_score = scores[best_match]
-
-    # Step 2: Fallback to embeddings if scores are tied or all zero
     sorted_scores = sorted(scores.values(), reverse=True)
     if sorted_scores[0] == 0 or (len(sorted_scores) > 1 and sorted_scores[0] == sorted_scores[1]):
-        # Encode the full text
-        text_embedding = model.encode(text, convert_to_tensor=True)
-        best_sim = -1
-        best_type = "unknown"
-        for doc_type, reference in REFERENCE_TEXTS.items():
-            ref_embedding = model.encode(reference, convert_to_tensor=True)
-            sim = util.cos_sim(text_embedding, ref_embedding)[0][0].item()
-            if sim > best_sim:
-                best_sim = sim
-                best_type = doc_type
-        return best_type
-
+        return None
     return best_match
+
+def classify_keyword_scores(scores_list: List[dict], texts: List[str]) -> List[str]:
+    """
+    Document types from precomputed keyword scores. `texts` are only
+    encoded for the documents that need the embedding fallback, which
+    happens in one batched call.
+    """
+    results: List[Optional[str]] = [_keyword_match(scores) for scores in scores_list]
+    fallback = [i for i, doc_type in enumerate(results) if doc_type is None]
+    if fallback:
+        from sentence_transformers import util
+        model = get_embedding_model()
+        # Encode the full texts and score them against every reference at once
+        text_embeddings = model.encode([texts[i] for i in fallback], batch_size=CLASSIFY_ENCODE_BATCH_SIZE,
+                                       convert_to_tensor=True)
+        sims = util.cos_sim(text_embeddings, reference_embeddings())
+        doc_types = list(REFERENCE_TEXTS)
+        for row, i in enumerate(fallback):
+            results[i] = doc_types[int(sims[row].argmax())] if doc_types else "unknown"
+    return results
+
+def classify_doc_types(texts: List[str]) -> List[str]:
+    """
+    Classifies many documents at once.
+    """
+    return classify_keyword_scores([score_keywords(text) for text in texts], texts)
+
+def classify_doc_type(text: str) -> str:
+    return classify_doc_types([text])[0]
+
+class StreamingClassifier:
+    """
+    Classifies a document fed one page at a time, without holding its text.
+
+    Keyword counts are summed across pages (keywords never span the page
+    separators). Only the first FALLBACK_TEXT_CHARS characters are kept for
+    the embedding fallback: the model truncates its input to
+    max_seq_length (256 word pieces for MiniLM) anyway, so the prefix
+    encodes the same as the full text.
+    """
+
+    def __init__(self):
+        self._counts = [0] * KEYWORD_MATCHER.num_keywords
+        self._prefix: List[str] = []
+        self._prefix_chars = 0
+        # Set by result(): the keyword scores and whether they decided ("keyword") or the embedding fallback did
+        self.keyword_scores: Optional[dict] = None
+        self.method: Optional[str] = None
+
+    def feed(self, text: str) -> None:
+        # Presence per page is enough: result() scores each keyword once if found anywhere
+        for keyword_id, found in enumerate(KEYWORD_MATCHER.find_matches(text)):
+            self._counts[keyword_id] += found
+        if self._prefix_chars < FALLBACK_TEXT_CHARS:
+            piece = text[:FALLBACK_TEXT_CHARS - self._prefix_chars]
+            self._prefix.append(piece)
+            self._prefix_chars += len(piece)
+
+    def result(self) -> str:
+        scores = KEYWORD_MATCHER.scores_from_counts(self._counts)
+        self.keyword_scores = scores
+        self.method = "keyword" if _keyword_match(scores) is not None else "embedding"
+        return classify_keyword_scores([scores], ["".join(self._prefix).strip()])[0]
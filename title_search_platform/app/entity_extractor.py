@@ -1,12 +1,24 @@
-from typing import Dict, List
-from sentence_transformers import SentenceTransformer, util
+import os
+import re
+import time
+import heapq
+from typing import Callable, Dict, List, Optional
 import nltk
 
 # Ensure punkt is downloaded
 nltk.download("punkt", quiet=True)
 from nltk.tokenize import sent_tokenize
 
-from app.model_loader import model
+from app.model_loader import get_embedding_model, get_static_embeddings, ENCODE_BATCH_SIZE
+from app.ner_extractor import extract_entities_ner_batch
+from app import metrics
+
+# Default extractor backend, optionally overridden per document type,
+# e.g. ENTITY_BACKENDS="deed=semantic,mortgage=ner"
+ENTITY_BACKEND = os.getenv("ENTITY_BACKEND", "semantic")
+ENTITY_BACKENDS_BY_TYPE = dict(
+    item.split("=", 1) for item in os.getenv("ENTITY_BACKENDS", "").replace(" ", "").split(",") if "=" in item
+)
 
 ENTITY_PROMPTS = {
     "deed": {
@@ -37,30 +49,235 @@ ENTITY_PROMPTS = {
     }
 }
 
+# Sentences containing any of these (case-insensitive) are stamps, notary
+# blocks and page furniture.
+NOISE_KEYWORDS = [
+    "Instr#", "Page", "JK-", "SEAL", "Notary", "Commission", "My commission expires",
+    "Prepared by", "Doc Stamps", "Appraisers", "SPACE ABOVE THIS LINE"
+]
+# Lowercased once, without keywords another keyword already covers. Plain
+# substring tests on the once-lowercased sentence beat a re.IGNORECASE
+# alternation here (CPython's re tries every branch at every position).
+_noise_lowered = {keyword.lower() for keyword in NOISE_KEYWORDS}
+NOISE_MARKERS = tuple(sorted(
+    keyword for keyword in _noise_lowered if not any(other != keyword and other in keyword for other in _noise_lowered)
+))
+# The "--- Page N (OCR) ---" lines extract_text_hybrid puts before each page
+PAGE_HEADER_PATTERN = re.compile(r"^--- Page \d+(?: \((?:OCR|Text)\))? ---$", re.MULTILINE)
+WORD_PATTERN = re.compile(r"\w")
+
+# At most this many sentences per document are encoded for entity scoring
+# (0 = all). Longer documents keep the sentences with the most entity cues.
+ENTITY_MAX_SENTENCES = int(os.getenv("ENTITY_MAX_SENTENCES", "256"))
+# Digits (dates, amounts, instrument numbers) and words that introduce parties
+ENTITY_CUE_PATTERN = re.compile(
+    r"\d+|\$|grant(?:or|ee)|convey|seller|buyer|between|husband|wife|trustee|record|dated|day of|executed"
+    r"|consideration|sum of|instrument|deed",
+    re.IGNORECASE,
+)
+
 def clean_sentences(text: str) -> List[str]:
-    noise_keywords = [
-        "Instr#", "Page", "JK-", "SEAL", "Notary", "Commission", "My commission expires",
-        "Prepared by", "Doc Stamps", "Appraisers", "SPACE ABOVE THIS LINE"
-    ]
-    return [
-        s.strip()
-        for s in sent_tokenize(text)
-        if s.strip() and not any(nk.lower() in s.lower() for nk in noise_keywords)
+    """
+    Splits text into sentences, page by page so no sentence runs across a
+    page break or swallows a page header, and drops boilerplate sentences
+    and fragments without any word characters.
+    """
+    sentences = []
+    for page in PAGE_HEADER_PATTERN.split(text):
+        for sentence in sent_tokenize(page):
+            sentence = sentence.strip()
+            if sentence and WORD_PATTERN.search(sentence) and not is_noise(sentence):
+                sentences.append(sentence)
+    return sentences
+
+def is_noise(sentence: str) -> bool:
+    lowered = sentence.lower()
+    return any(marker in lowered for marker in NOISE_MARKERS)
+
+def entity_cue_score(sentence: str) -> int:
+    """Number of distinct entity cues in a sentence; all numbers count as one cue."""
+    return len({"0" if match.isdigit() else match.lower() for match in ENTITY_CUE_PATTERN.findall(sentence)})
+
+class CandidateSelector:
+    """
+    select_candidates over sentences fed in pieces (e.g. page by page),
+    holding at most `limit` sentences: the weakest candidate is evicted as
+    soon as a stronger one arrives. An evicted sentence that repeats later
+    ranks lower still (same cues, later position), so remembering only the
+    kept sentences gives the same result as de-duplicating everything.
+    """
+
+    def __init__(self, limit: int = ENTITY_MAX_SENTENCES):
+        self.limit = limit
+        # (cue score, -position, sentence); the root is the weakest candidate
+        self._heap: List[tuple] = []
+        self._kept = set()
+        self._position = 0
+
+    def feed(self, sentences: List[str]) -> None:
+        for sentence in sentences:
+            if sentence in self._kept:
+                continue
+            entry = (entity_cue_score(sentence), -self._position, sentence)
+            self._position += 1
+            if self.limit <= 0 or len(self._heap) < self.limit:
+                heapq.heappush(self._heap, entry)
+                self._kept.add(sentence)
+            elif entry > self._heap[0]:
+                evicted = heapq.heapreplace(self._heap, entry)[2]
+                self._kept.discard(evicted)
+                self._kept.add(sentence)
+
+    def result(self) -> List[str]:
+        """The kept sentences, in document order."""
+        return [sentence for _, _, sentence in sorted(self._heap, key=lambda entry: -entry[1])]
+
+def select_candidates(sentences: List[str], limit: int = ENTITY_MAX_SENTENCES) -> List[str]:
+    """
+    The sentences worth encoding for entity scoring, in document order:
+    repeated sentences (boilerplate on every page) once, and for long
+    documents only the `limit` sentences with the most entity cues, earlier
+    sentences winning ties.
+    """
+    selector = CandidateSelector(limit)
+    selector.feed(sentences)
+    return selector.result()
+
+def prompt_embeddings(doc_type: str, model=None):
+    """
+    Averaged prompt embedding per entity of a document type, stacked in
+    ENTITY_PROMPTS order. All variants are encoded in one cached call, or
+    uncached with `model` when one is given (e.g. to compare models).
+    """
+    import torch
+
+    prompts = ENTITY_PROMPTS[doc_type]
+    variants = [variant for prompt_variants in prompts.values() for variant in prompt_variants]
+    if model is None:
+        variant_embeddings = get_static_embeddings(variants)
+    else:
+        variant_embeddings = model.encode(variants, convert_to_tensor=True).cpu()
+
+    averaged = []
+    offset = 0
+    for prompt_variants in prompts.values():
+        averaged.append(variant_embeddings[offset:offset + len(prompt_variants)].mean(dim=0))
+        offset += len(prompt_variants)
+    return torch.stack(averaged)
+
+def extract_entities_batch(texts: List[str], doc_types: List[str]) -> List[Dict[str, str]]:
+    """
+    Semantic entity extraction for many documents at once.
+
+    The cleaned sentences of every document are encoded in a single call
+    (sentence-transformers sorts them by length, so each padded batch holds
+    similarly sized sentences); the scores are then split back per document.
+    """
+    sentence_lists = [
+        clean_sentences(text) if doc_type in ENTITY_PROMPTS else []
+        for text, doc_type in zip(texts, doc_types)
     ]
+    return extract_entities_from_sentences(sentence_lists, doc_types)
 
-def extract_entities_semantic(text: str, doc_type: str) -> Dict[str, str]:
-    cleaned_sentences = clean_sentences(text)
-    if not cleaned_sentences or doc_type not in ENTITY_PROMPTS:
-        return {}
+def encode_sentence_lists(sentence_lists: List[List[str]]) -> list:
+    """
+    Encodes the sentences of many documents in one call and splits the
+    embeddings back per document (None for documents without sentences).
+    """
+    all_sentences = [sentence for sentences in sentence_lists for sentence in sentences]
+    if not all_sentences:
+        return [None for _ in sentence_lists]
+    model = get_embedding_model()
+    started = time.perf_counter()
+    embeddings = model.encode(all_sentences, batch_size=ENCODE_BATCH_SIZE, convert_to_tensor=True)
+    metrics.observe_stage(metrics.STAGE_ENCODE, time.perf_counter() - started)
+    per_document = []
+    offset = 0
+    for sentences in sentence_lists:
+        per_document.append(embeddings[offset:offset + len(sentences)] if sentences else None)
+        offset += len(sentences)
+    return per_document
+
+def extract_entities_from_sentences(sentence_lists: List[List[str]], doc_types: List[str],
+                                    sentence_embeddings: Optional[list] = None) -> List[Dict[str, str]]:
+    """
+    Semantic entity extraction from already cleaned sentences, e.g. collected
+    page by page while a document is still being extracted. Embeddings the
+    caller already computed with encode_sentence_lists are reused; otherwise
+    only the select_candidates of each document are encoded.
+    """
+    results: List[Dict[str, str]] = [{} for _ in sentence_lists]
+    documents = []  # (result index, sentences)
+    for i, (cleaned_sentences, doc_type) in enumerate(zip(sentence_lists, doc_types)):
+        if cleaned_sentences and doc_type in ENTITY_PROMPTS:
+            documents.append((i, cleaned_sentences))
+    if not documents:
+        return results
+
+    if sentence_embeddings is None:
+        documents = [(i, select_candidates(sentences)) for i, sentences in documents]
+        encoded = encode_sentence_lists([sentences for _, sentences in documents])
+    else:
+        encoded = [sentence_embeddings[i] for i, _ in documents]
+
+    started = time.perf_counter()
+    for (i, cleaned_sentences), doc_embeddings in zip(documents, encoded):
+        results[i] = pick_entities(doc_types[i], cleaned_sentences, doc_embeddings)
+    metrics.observe_stage(metrics.STAGE_ENTITY_SCORING, time.perf_counter() - started)
+    return results
+
+def pick_entities(doc_type: str, sentences: List[str], sentence_embeddings, prompt_matrix=None) -> Dict[str, str]:
+    """
+    The best-matching sentence per entity of `doc_type`, or "" when no
+    sentence reaches a cosine similarity of 0.5.
+    """
+    from sentence_transformers import util
+    if prompt_matrix is None:
+        prompt_matrix = prompt_embeddings(doc_type)
 
-    sentence_embeddings = model.encode(cleaned_sentences, convert_to_tensor=True)
+    # One (entities x sentences) similarity matrix for all entities at once
+    cosine_scores = util.cos_sim(prompt_matrix, sentence_embeddings)
+    best_scores, best_indices = cosine_scores.max(dim=1)
 
     extracted = {}
-    for entity, prompt_variants in ENTITY_PROMPTS[doc_type].items():
-        prompt_embeddings = model.encode(prompt_variants, convert_to_tensor=True)
-        avg_prompt_embedding = prompt_embeddings.mean(dim=0)
-        cosine_scores = util.cos_sim(avg_prompt_embedding, sentence_embeddings)[0]
-        best_idx = int(cosine_scores.argmax())
-        best_score = float(cosine_scores[best_idx])
-        extracted[entity] = cleaned_sentences[best_idx] if best_score > 0.5 else ""
+    for entity, best_score, best_idx in zip(ENTITY_PROMPTS[doc_type], best_scores.tolist(), best_indices.tolist()):
+        extracted[entity] = sentences[best_idx] if best_score > 0.5 else ""
     return extracted
+
+def extract_entities_semantic(text: str, doc_type: str) -> Dict[str, str]:
+    return extract_entities_batch([text], [doc_type])[0]
+
+# Extractor backends: (texts, doc_types) -> one entity dict per text
+EXTRACTOR_BACKENDS: Dict[str, Callable[[List[str], List[str]], List[dict]]] = {
+    "semantic": extract_entities_batch,
+    "ner": extract_entities_ner_batch,
+}
+
+def resolve_backend(doc_type: str, backend: Optional[str] = None) -> str:
+    """
+    Backend for a document: the explicitly requested one, else the
+    per-type override, else ENTITY_BACKEND.
+    """
+    name = backend or ENTITY_BACKENDS_BY_TYPE.get(doc_type, ENTITY_BACKEND)
+    if name not in EXTRACTOR_BACKENDS:
+        raise ValueError(f"Unknown entity extractor backend '{name}'. Choose from {sorted(EXTRACTOR_BACKENDS)}.")
+    return name
+
+def extract_entities(texts: List[str], doc_types: List[str], backend: Optional[str] = None) -> List[dict]:
+    """
+    Extracts entities for many documents, grouping them per backend so each
+    backend runs once over its whole share of the batch.
+    """
+    results: List[dict] = [{} for _ in texts]
+    groups: Dict[str, List[int]] = {}
+    for i, doc_type in enumerate(doc_types):
+        groups.setdefault(resolve_backend(doc_type, backend), []).append(i)
+    for name, indices in groups.items():
+        started = time.perf_counter()
+        extracted = EXTRACTOR_BACKENDS[name]([texts[i] for i in indices], [doc_types[i] for i in indices])
+        if name == "ner":
+            # The semantic backend observes its encode and scoring steps itself
+            metrics.observe_stage(metrics.STAGE_ENTITY_SCORING, time.perf_counter() - started)
+        for i, entities in zip(indices, extracted):
+            results[i] = entities
+    return results
@@ -0,0 +1,140 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# CPU stages (OCR, classification, embeddings) and I/O stages (MinIO, MySQL)
+# run on separate pools so slow storage never starves the model work.
+CPU_EXECUTOR_WORKERS = int(os.getenv("CPU_EXECUTOR_WORKERS", "2"))
+CPU_EXECUTOR_QUEUE = int(os.getenv("CPU_EXECUTOR_QUEUE", "8"))
+IO_EXECUTOR_WORKERS = int(os.getenv("IO_EXECUTOR_WORKERS", "8"))
+IO_EXECUTOR_QUEUE = int(os.getenv("IO_EXECUTOR_QUEUE", "32"))
+EXECUTOR_RETRY_AFTER = int(os.getenv("EXECUTOR_RETRY_AFTER", "5"))
+
+
+class ExecutorSaturated(Exception):
+    """Raised when a bounded executor has no free worker or queue slot."""
+
+    def __init__(self, executor_name: str, retry_after: int):
+        super().__init__(f"Executor '{executor_name}' is at capacity.")
+        self.executor_name = executor_name
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a hard limit on running plus queued calls.
+
+    Calls beyond `max_workers + max_queue` are rejected immediately with
+    ExecutorSaturated instead of piling up behind the running ones.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, retry_after: int = EXECUTOR_RETRY_AFTER):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-exec")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Runs `fn(*args, **kwargs)` on the pool and awaits its result.
+
+        Raises:
+            ExecutorSaturated: If the pool and its queue are full.
+        """
+        return await self.submit(fn, *args, **kwargs)
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> "asyncio.Future":
+        """
+        Schedules `fn(*args, **kwargs)` on the pool from the event loop.
+        Admission is decided immediately, so callers can reject a request
+        before they start responding to it. Cancelling the returned future
+        before the call starts frees its slot; a running call cannot be
+        cancelled and holds its slot until it returns.
+
+        Raises:
+            ExecutorSaturated: If the pool and its queue are full.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            logger.warning(f"Executor '{self.name}' saturated, rejecting call to {getattr(fn, '__name__', fn)}")
+            raise ExecutorSaturated(self.name, self.retry_after)
+
+        submitted = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+
+        def call():
+            started = time.perf_counter()
+            waited = started - submitted
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+                    self._run_total += time.perf_counter() - started
+                self._slots.release()
+
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._executor.submit(call)
+        except Exception:
+            self._release_queued()
+            raise
+        # A call cancelled before it starts never runs `call`, so its slot is released here
+        future.add_done_callback(lambda done: done.cancelled() and self._release_queued())
+        return asyncio.wrap_future(future, loop=loop)
+
+    def _release_queued(self) -> None:
+        with self._lock:
+            self._queued -= 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self._completed
+            return {
+                "name": self.name,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": completed,
+                "rejected": self._rejected,
+                "avg_wait_seconds": self._wait_total / completed if completed else 0.0,
+                "max_wait_seconds": self._wait_max,
+                "avg_run_seconds": self._run_total / completed if completed else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+cpu_executor = BoundedExecutor("cpu", CPU_EXECUTOR_WORKERS, CPU_EXECUTOR_QUEUE)
+io_executor = BoundedExecutor("io", IO_EXECUTOR_WORKERS, IO_EXECUTOR_QUEUE)
+
+
+def executor_stats() -> dict:
+    return {"cpu": cpu_executor.stats(), "io": io_executor.stats()}
@@ -1,22 +1,37 @@
 import os
+import json
+import time
+import uuid
+import asyncio
+import shutil
+import hashlib
 import datetime
 import logging
+import tempfile
+import threading
+import httpx
 
-import requests
-from app.entity_extractor import extract_entities_semantic
-import fitz  # PyMuPDF
-import pytesseract
-from PIL import Image
-import io
-from typing import Annotated
+from app.entity_extractor import (
+    extract_entities, extract_entities_from_sentences, encode_sentence_lists, clean_sentences, CandidateSelector,
+    resolve_backend, EXTRACTOR_BACKENDS
+)
+from pathlib import Path
+from typing import IO, Annotated, Any, AsyncIterator, Callable, Iterable, Iterator, List, NamedTuple, Optional
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from app import minio_manager
 from app import db_manager
-from app.document_classifier import classify_doc_type
+from app import metrics
+from app.document_classifier import classify_doc_types, StreamingClassifier
+from app.page_extractor import extract_pages, iter_pages, PageRecord, PdfSource
+from app.executors import cpu_executor, io_executor, ExecutorSaturated
+from app.job_queue import job_queue
+from app.search_service import index_upload
+from app.vector_index import VECTOR_INDEX_ENABLED
+from app.label_studio import exporter, ExportQueueFull, LABEL_STUDIO_BATCH_SECONDS
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 _ = minio_manager.MinioMetadataManager()
@@ -24,9 +39,60 @@ _ = db_manager.DBMetadataManager()
 
 router = APIRouter()
 
-LABEL_STUDIO_URL   = os.getenv("LABEL_STUDIO_URL", "http://labelstudio:8080")
-LABEL_STUDIO_TOKEN = os.getenv("LABEL_STUDIO_TOKEN", "changeme")
-LABEL_STUDIO_PID   = os.getenv("LABEL_STUDIO_PID", "1")
+HASH_CHUNK_SIZE = 1024 * 1024
+BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", "256"))
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+class DocumentAnalysis(NamedTuple):
+    """Output of the CPU-bound pipeline for one document."""
+    total_pages: int
+    extracted_text: str
+    document_type: str
+    extracted_entities: dict
+    # Candidate sentences and their embeddings (None unless computed), kept for the vector index
+    sentences: List[str]
+    sentence_embeddings: Any
+    # Rows for the document_pages, document_classifications and stage_timings tables
+    pages: List[dict]
+    classification: dict
+    stage_timings: dict
+
+class AnalysisCancelled(Exception):
+    """Raised inside an analysis whose caller has stopped waiting for it."""
+
+class CancelToken:
+    """
+    Stops a submitted analysis: before it starts, so it never reads the
+    upload, or at its next page once it runs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = False
+        self.cancelled = False
+
+    def start(self) -> None:
+        """Called first in the analysis thread; raises if already cancelled."""
+        with self._lock:
+            if self.cancelled:
+                raise AnalysisCancelled()
+            self._started = True
+
+    def cancel(self) -> bool:
+        """Cancels the analysis. Returns True if it had not started, so it never will."""
+        with self._lock:
+            self.cancelled = True
+            return not self._started
+
+    def watch(self, pages: Iterator[PageRecord]) -> Iterator[PageRecord]:
+        """Yields `pages` until cancelled, then closes them, which cancels their queued page chunks."""
+        try:
+            for record in pages:
+                if self.cancelled:
+                    raise AnalysisCancelled()
+                yield record
+        finally:
+            pages.close()
 
 class FileUploadResponse(BaseModel):
     db_id: int
@@ -39,43 +105,99 @@ class FileUploadResponse(BaseModel):
     extracted_text: str
     document_type: str
     extracted_entities: dict
+    content_hash: Optional[str] = None
+    # MinIO upload latency and throughput; None when no upload was needed
+    upload_seconds: Optional[float] = None
+    upload_mb_per_second: Optional[float] = None
 
 class TextInput(BaseModel):
     text: str
 
-def extract_text_hybrid(file: UploadFile) -> tuple[int, str]:
+class BatchAnalyzeRequest(BaseModel):
+    texts: Optional[List[str]] = None
+    db_ids: Optional[List[int]] = None
+    extractor: Optional[str] = None
+
+class LabelTasksRequest(BaseModel):
+    texts: Optional[List[str]] = None
+    db_ids: Optional[List[int]] = None
+
+class LabelTasksResponse(BaseModel):
+    queued: int
+    missing_db_ids: List[int] = []
+
+class BatchAnalyzeResult(BaseModel):
+    index: int
+    db_id: Optional[int] = None
+    document_type: str
+    extracted_entities: dict
+
+class BatchAnalyzeResponse(BaseModel):
+    results: List[BatchAnalyzeResult]
+    missing_db_ids: List[int]
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+    filename: str
+    minio_object_name: str
+    file_size: int
+    uploaded_time: datetime.datetime
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    filename: str
+    minio_object_name: str
+    content_hash: Optional[str] = None
+    uploaded_time: datetime.datetime
+    updated_time: Optional[datetime.datetime] = None
+    error: Optional[str] = None
+    result: Optional[FileUploadResponse] = None
+
+class DocumentPageResult(BaseModel):
+    page_number: int
+    method: str
+    seconds: Optional[float] = None
+    text: Optional[str] = None
+
+class DocumentEntityResult(BaseModel):
+    name: str
+    value: Optional[str] = None
+    start: Optional[int] = None
+    end: Optional[int] = None
+
+class DocumentClassificationResult(BaseModel):
+    document_type: str
+    method: Optional[str] = None
+    keyword_scores: Optional[dict] = None
+
+class DocumentResponse(BaseModel):
+    db_id: int
+    filename: str
+    uploaded_time: datetime.datetime
+    file_size: int
+    total_pages: int
+    content_hash: Optional[str] = None
+    minio_object_name: Optional[str] = None
+    document_type: Optional[str] = None
+    classification: Optional[DocumentClassificationResult] = None
+    entities: List[DocumentEntityResult]
+    pages: List[DocumentPageResult]
+    stage_timings: dict
+
+class SlowDocument(BaseModel):
+    db_id: int
+    seconds: float
+    filename: str
+    total_pages: int
+    document_type: Optional[str] = None
+
+def extract_text_hybrid(file: UploadFile, workers: Optional[int] = None) -> tuple[int, str]:
     file.file.seek(0)
     file_bytes = file.file.read()
-    doc = fitz.open(stream=file_bytes, filetype="pdf")
-
-    extracted_text = ""
-    total_pages = len(doc)
-
-    def is_scanned_page(page: fitz.Page) -> bool:
-        text = page.get_text("text").strip()
-        if len(text) > 30:
-            return False
-        blocks = page.get_text("dict")["blocks"]
-        has_text_blocks = any(block.get("type") == 0 for block in blocks)
-        if has_text_blocks:
-            return False
-        has_images = len(page.get_images(full=True)) > 0
-        return has_images or not text
-
-    for i, page in enumerate(doc):
-        try:
-            if is_scanned_page(page):
-                pix = page.get_pixmap(dpi=300)
-                img = Image.open(io.BytesIO(pix.tobytes("png"))).convert("L")
-                ocr_text = pytesseract.image_to_string(img, lang="eng")
-                extracted_text += f"--- Page {i+1} (OCR) ---\n{ocr_text.strip()}\n\n"
-            else:
-                text = page.get_text().strip()
-                extracted_text += f"--- Page {i+1} (Text) ---\n{text}\n\n"
-        except Exception as err:
-            extracted_text += f"--- Page {i+1} ---\n[Error: {err}]\n\n"
-
-    return total_pages, extracted_text.strip()
+    total_pages, page_segments = extract_pages(file_bytes, workers=workers)
+    return total_pages, "".join(page_segments).strip()
 
 
 def clean_extracted_text(text: str) -> str:
@@ -84,6 +206,16 @@ def clean_extracted_text(text: str) -> str:
     text = re.sub(r'\n{2,}', '\n\n', text)  # condense blank lines
     return text.strip()
 
+def build_label_tasks(documents: Iterable[tuple]) -> List[dict]:
+    """Label Studio tasks for (text, db_id) pairs; db_id is kept with the task when set."""
+    tasks = []
+    for text, db_id in documents:
+        data = {"text": clean_extracted_text(text)}
+        if db_id is not None:
+            data["db_id"] = db_id
+        tasks.append({"data": data})
+    return tasks
+
 def save_clean_text_for_label_studio(text: str, doc_id: str) -> str:
     labelstudio_dir = Path(__file__).parent / "training" / "labelstudio"
     labelstudio_dir.mkdir(parents=True, exist_ok=True)
@@ -92,72 +224,753 @@ def save_clean_text_for_label_studio(text: str, doc_id: str) -> str:
         f.write(text)
     return str(path)
 
+def analyze_pdf_bytes(file_bytes: PdfSource, extractor: Optional[str] = None,
+                      cancel: Optional[CancelToken] = None) -> DocumentAnalysis:
+    """
+    CPU-bound part of the upload pipeline: text extraction, classification
+    and entity extraction. Runs on the CPU executor or a job worker, never
+    on the event loop. `file_bytes` may also be the path of the PDF.
+    """
+    pages = iter_pages(file_bytes)
+    return analyze_pages(pages if cancel is None else cancel.watch(pages), extractor=extractor)
+
+def analyze_pages(pages: Iterable[PageRecord], extractor: Optional[str] = None) -> DocumentAnalysis:
+    """
+    Consumes extracted pages as they arrive: keyword scoring and sentence
+    splitting run per page, and the document text is joined once at the end
+    instead of being concatenated page by page. Sentences go through a
+    CandidateSelector page by page, so at most ENTITY_MAX_SENTENCES of them
+    are held; the text itself is the result (returned and stored), so it is
+    the only part that grows with the document. Only the candidates are
+    encoded; with the vector index enabled they are encoded once, for both
+    entity extraction and the index.
+    """
+    timings = {db_manager.STAGE_EXTRACT: 0.0, db_manager.STAGE_CLASSIFY: 0.0, db_manager.STAGE_ENTITIES: 0.0}
+    classifier = StreamingClassifier()
+    segments: List[str] = []
+    selector = CandidateSelector()
+    page_rows: List[dict] = []
+    offset = 0
+    page_iterator = iter(pages)
+    while True:
+        # Waiting for the next page is the extraction time; the rest overlaps with it
+        started = time.perf_counter()
+        record = next(page_iterator, None)
+        timings[db_manager.STAGE_EXTRACT] += time.perf_counter() - started
+        if record is None:
+            break
+
+        segment = record.segment
+        segments.append(segment)
+        # The page body sits between the "--- Page N ---" header line and the trailing blank line
+        header_length = segment.index("\n") + 1
+        page_rows.append({
+            "page_number": record.page_number,
+            "method": record.method,
+            "seconds": record.seconds,
+            "text_start": offset + header_length,
+            "text_end": offset + len(segment) - 2,
+        })
+        offset += len(segment)
+
+        started = time.perf_counter()
+        classifier.feed(segment)
+        timings[db_manager.STAGE_CLASSIFY] += time.perf_counter() - started
+        started = time.perf_counter()
+        selector.feed(clean_sentences(segment))
+        timings[db_manager.STAGE_ENTITIES] += time.perf_counter() - started
+
+    extracted_text = "".join(segments).strip()
+    started = time.perf_counter()
+    document_type = classifier.result()
+    timings[db_manager.STAGE_CLASSIFY] += time.perf_counter() - started
+
+    started = time.perf_counter()
+    candidates = selector.result()
+    embeddings = encode_sentence_lists([candidates])[0] if VECTOR_INDEX_ENABLED and candidates else None
+    if resolve_backend(document_type, extractor) == "semantic":
+        extracted_entities = extract_entities_from_sentences(
+            [candidates], [document_type], None if embeddings is None else [embeddings]
+        )[0]
+    else:
+        extracted_entities = extract_entities([extracted_text], [document_type], backend=extractor)[0]
+    timings[db_manager.STAGE_ENTITIES] += time.perf_counter() - started
+    metrics.observe_stage(metrics.STAGE_EXTRACT, timings[db_manager.STAGE_EXTRACT])
+    metrics.observe_stage(metrics.STAGE_CLASSIFY, timings[db_manager.STAGE_CLASSIFY])
+
+    return DocumentAnalysis(
+        total_pages=len(segments),
+        extracted_text=extracted_text,
+        document_type=document_type,
+        extracted_entities=extracted_entities,
+        sentences=candidates,
+        sentence_embeddings=None if embeddings is None else embeddings.cpu().numpy(),
+        pages=page_rows,
+        classification={"method": classifier.method, "keyword_scores": classifier.keyword_scores},
+        stage_timings=timings,
+    )
+
+def analyze_texts(texts: List[str], extractor: Optional[str] = None) -> list[tuple[str, dict]]:
+    """
+    Classification and entity extraction for already extracted texts,
+    batched across documents. Same results as the single-document path.
+    """
+    started = time.perf_counter()
+    document_types = classify_doc_types(texts)
+    metrics.observe_stage(metrics.STAGE_CLASSIFY, time.perf_counter() - started)
+    entities = extract_entities(texts, document_types, backend=extractor)
+    return list(zip(document_types, entities))
+
+def analyze_document(file: UploadFile, extractor: Optional[str] = None,
+                     cancel: Optional[CancelToken] = None) -> DocumentAnalysis:
+    if cancel is not None:
+        cancel.start()
+    file.file.seek(0)
+    file_bytes = file.file.read()
+    file.file.seek(0)
+    return analyze_pdf_bytes(file_bytes, extractor=extractor, cancel=cancel)
+
+def analyze_pdf_streamed(path: str, extractor: Optional[str], on_page: Callable[[Optional[PageRecord]], None],
+                         cancel: CancelToken) -> DocumentAnalysis:
+    """
+    analyze_pdf_bytes of the PDF at `path` that reports every page to
+    `on_page` as soon as it is extracted, followed by None once the
+    analysis has finished or failed. Stops at the next page once `cancel`
+    is cancelled.
+    """
+    cancel.start()
+
+    def report(pages: Iterable[PageRecord]) -> Iterator[PageRecord]:
+        for record in pages:
+            on_page(record)
+            yield record
+
+    try:
+        return analyze_pages(report(cancel.watch(iter_pages(path))), extractor=extractor)
+    finally:
+        on_page(None)
+
+def cached_analysis(cached: dict) -> DocumentAnalysis:
+    """The stored extraction of previously processed content, as a DocumentAnalysis."""
+    return DocumentAnalysis(
+        total_pages=cached["total_pages"],
+        extracted_text=cached["extracted_text"],
+        document_type=cached["document_type"],
+        extracted_entities=cached["extracted_entities"],
+        sentences=[],
+        sentence_embeddings=None,
+        pages=[],
+        classification={},
+        stage_timings={},
+    )
+
+def rerun_entities(analysis: DocumentAnalysis, extractor: str) -> DocumentAnalysis:
+    """Re-extracts the entities of a cached analysis with an explicitly requested backend."""
+    started = time.perf_counter()
+    extracted_entities = extract_entities([analysis.extracted_text], [analysis.document_type], extractor)[0]
+    return analysis._replace(
+        extracted_entities=extracted_entities,
+        stage_timings={db_manager.STAGE_ENTITIES: time.perf_counter() - started},
+    )
+
+def upload_record(analysis: DocumentAnalysis, cached: Optional[dict], minio_seconds: Optional[float] = None,
+                  **fields) -> dict:
+    """
+    log_file_metadata arguments for an analyzed upload. The text and pages
+    are stored once per content hash; repeat uploads point at them.
+    """
+    stage_timings = dict(analysis.stage_timings)
+    if minio_seconds is not None:
+        stage_timings[db_manager.STAGE_MINIO] = minio_seconds
+    return dict(
+        fields,
+        total_pages=analysis.total_pages,
+        document_type=analysis.document_type,
+        extracted_text=None if cached is not None else analysis.extracted_text,
+        extracted_entities=analysis.extracted_entities,
+        pages=None if cached is not None else analysis.pages,
+        classification=analysis.classification,
+        stage_timings=stage_timings,
+    )
+
+def store_object(file_data: IO[bytes], object_name: str, file_length: int) -> tuple[Optional[str], float]:
+    """
+    Uploads to MinIO through a PositionalReader, so extraction can read the
+    same upload meanwhile.
+
+    Returns:
+        tuple[Optional[str], float]: ETag (None on failure) and upload seconds.
+    """
+    started = time.perf_counter()
+    with minio_manager.PositionalReader(file_data, file_length) as reader:
+        upload_etag = minio_manager.minio_metadata_manager.upload_file(
+            file_data=reader, object_name=object_name, file_length=file_length
+        )
+    return upload_etag, time.perf_counter() - started
+
+def upload_metrics(file_size: int, minio_seconds: Optional[float]) -> dict:
+    if minio_seconds is None:
+        return {"upload_seconds": None, "upload_mb_per_second": None}
+    return {
+        "upload_seconds": round(minio_seconds, 4),
+        "upload_mb_per_second": round(minio_manager.mb_per_second(file_size, minio_seconds), 2),
+    }
+
+def spool_to_path(file_data: IO[bytes]) -> str:
+    """
+    Copies the spooled upload to a named temporary file, chunk by chunk, so
+    the page workers and the MinIO upload can read it by path after the
+    request has closed the upload, without the PDF held in memory. The
+    caller removes the file (see remove_when_done).
+    """
+    file_data.seek(0)
+    with tempfile.NamedTemporaryFile(prefix="upload-", suffix=".pdf", delete=False) as f:
+        shutil.copyfileobj(file_data, f, HASH_CHUNK_SIZE)
+    return f.name
+
+def remove_when_done(path: str, futures: List[asyncio.Future]) -> None:
+    """Deletes `path` once every future reading it is done, or now if there are none."""
+    pending = set(futures)
+
+    def finished(future: Optional[asyncio.Future]) -> None:
+        pending.discard(future)
+        if pending:
+            return
+        try:
+            os.unlink(path)
+        except OSError as e:
+            logger.warning(f"Could not remove spooled upload {path}: {e}")
+
+    if not pending:
+        finished(None)
+    for future in futures:
+        future.add_done_callback(finished)
+
+def store_file(path: str, object_name: str, file_length: int) -> tuple[Optional[str], float]:
+    """store_object for a file on disk."""
+    with open(path, "rb") as file_data:
+        return store_object(file_data, object_name, file_length)
+
+def cancel_analysis(analysis: asyncio.Future, cancel: CancelToken) -> None:
+    """
+    Stops a submitted analysis. A queued one is dropped from the executor;
+    a running one stops at its next page, and `analysis` is only done once
+    it has stopped reading the upload.
+    """
+    if cancel.cancel():
+        analysis.cancel()
+    else:
+        # Nobody awaits the AnalysisCancelled it ends with; retrieving it keeps asyncio from logging it
+        analysis.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+def abandon(future: asyncio.Future) -> None:
+    """Cancels a future nobody will await; if it has already finished, its exception is retrieved instead."""
+    if not future.cancel():
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+async def index_logged_upload(db_id: int, filename: str, uploaded_time: datetime.datetime,
+                              result: DocumentAnalysis) -> None:
+    """
+    Indexes an upload whose row is already committed. A saturated executor
+    is logged, not raised: a 503 would make the client retry an upload that
+    was stored, and the background search index sync adds the row later.
+    """
+    try:
+        await io_executor.run(
+            index_upload, db_id, filename, uploaded_time, result.document_type, result.extracted_text,
+            result.extracted_entities, result.sentences, result.sentence_embeddings
+        )
+    except ExecutorSaturated as e:
+        logger.warning(f"Not indexing record {db_id} now: {e}")
+
+def format_event(stream_format: str, event: str, payload: dict) -> str:
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+    return json.dumps({"event": event, **payload}, default=str) + "\n"
+
+async def upload_event_stream(stream_format: str, filename: str, uploaded_time: datetime.datetime,
+                              content_hash: str, file_size: int, minio_object_name: str, cached: Optional[dict],
+                              extractor: Optional[str], analysis: Optional[asyncio.Future],
+                              cancel: Optional[CancelToken], upload: Optional[asyncio.Future],
+                              page_events: asyncio.Queue) -> AsyncIterator[str]:
+    """
+    Events of a streamed upload: `page` per extracted page (or one `text`
+    event for a cached duplicate), `classification`, `entities`, then `done`
+    with the db_id, ETag and upload throughput. `upload` is the MinIO upload
+    already running alongside `analysis`. Failures after the stream started
+    are reported as an `error` event, since the status code has already
+    been sent. If the client disconnects first, the analysis is cancelled.
+    """
+    upload_etag = None
+    minio_seconds = None
+    if analysis is not None:
+        try:
+            while True:
+                record = await page_events.get()
+                if record is None:
+                    break
+                yield format_event(stream_format, "page", {
+                    "page_number": record.page_number,
+                    "method": record.method,
+                    "text": record.text,
+                    "seconds": round(record.seconds, 4),
+                    "timings": record.timings,
+                })
+            try:
+                result = await analysis
+            except Exception as e:
+                logger.error(f"Text extraction or entity extraction failed: {e}")
+                if upload is not None:
+                    # Nothing will be logged, so the object it stores is not waited for
+                    abandon(upload)
+                yield format_event(stream_format, "error", {"detail": "Text or entity extraction failed."})
+                return
+        finally:
+            # Left early: the client went away, so nobody is waiting for the rest of the pages
+            if not analysis.done():
+                cancel_analysis(analysis, cancel)
+    else:
+        result = cached_analysis(cached)
+        minio_object_name = cached["minio_object_name"] or minio_object_name
+        if extractor is not None:
+            try:
+                result = await cpu_executor.run(rerun_entities, result, extractor)
+            except ExecutorSaturated as e:
+                yield format_event(stream_format, "error", {"detail": str(e), "retry_after": e.retry_after})
+                return
+            except Exception as e:
+                logger.error(f"Entity extraction failed: {e}")
+                yield format_event(stream_format, "error", {"detail": "Entity extraction failed."})
+                return
+        yield format_event(stream_format, "text", {
+            "total_pages": result.total_pages, "text": result.extracted_text, "cached": True
+        })
+
+    yield format_event(stream_format, "classification", {"document_type": result.document_type})
+    yield format_event(stream_format, "entities", {"extracted_entities": result.extracted_entities})
+
+    try:
+        if upload is not None:
+            upload_etag, minio_seconds = await upload
+            if not upload_etag:
+                raise RuntimeError("Failed to upload file to MinIO.")
+        db_id = await db_manager.async_db_metadata_manager.log_file_metadata(**upload_record(
+            result, cached, minio_seconds,
+            filename=filename,
+            uploaded_time=uploaded_time,
+            file_size=file_size,
+            content_hash=content_hash,
+            minio_object_name=minio_object_name
+        ))
+        if db_id is None:
+            raise RuntimeError("Failed to log file metadata to database.")
+    except Exception as e:
+        logger.error(f"Storing streamed upload failed: {e}")
+        yield format_event(stream_format, "error", {"detail": str(e)})
+        return
+    await index_logged_upload(db_id, filename, uploaded_time, result)
+
+    yield format_event(stream_format, "done", {
+        "db_id": db_id,
+        "filename": filename,
+        "minio_object_name": minio_object_name,
+        "etag": upload_etag,
+        "file_size": file_size,
+        "total_pages": result.total_pages,
+        "uploaded_time": uploaded_time.isoformat(),
+        "content_hash": content_hash,
+        **upload_metrics(file_size, minio_seconds),
+    })
+
+def validate_extractor(extractor: Optional[str]) -> None:
+    if extractor is not None and extractor not in EXTRACTOR_BACKENDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown extractor '{extractor}'. Choose from {sorted(EXTRACTOR_BACKENDS)}."
+        )
+
+def hash_upload(file_data: IO[bytes], chunk_size: int = HASH_CHUNK_SIZE) -> tuple[str, int]:
+    """
+    Streams the spooled upload through SHA-256 in chunks. This runs once
+    the request body has been received: the multipart parser spools the
+    body before the handler starts, so the hash is not computed while the
+    bytes arrive.
+
+    Returns:
+        tuple[str, int]: Hex digest and size in bytes of the content.
+    """
+    digest = hashlib.sha256()
+    file_size = 0
+    file_data.seek(0)
+    for chunk in iter(lambda: file_data.read(chunk_size), b""):
+        digest.update(chunk)
+        file_size += len(chunk)
+    file_data.seek(0)
+    return digest.hexdigest(), file_size
+
+def content_object_name(content_hash: str) -> str:
+    # Content-addressed key: identical bytes share one object, and different
+    # documents with the same filename never overwrite each other.
+    return f"sha256/{content_hash}.pdf"
+
 @router.post("/upload/", response_model=FileUploadResponse)
-async def upload_pdf_file(file: Annotated[UploadFile, File()]):
+async def upload_pdf_file(file: Annotated[UploadFile, File()], extractor: Optional[str] = None,
+                          stream: Optional[str] = None):
+    """
+    Uploads and processes a PDF. `extractor` picks the entity extractor
+    backend ("semantic" or "ner"); by default it is chosen per document type.
+    `stream` ("ndjson" or "sse") switches to a streamed response that emits
+    each page as it finishes, then the classification, the entities and
+    finally the db_id / ETag.
+    """
     if not (file.filename.lower().endswith(".pdf") or file.content_type == "application/pdf"):
         raise HTTPException(status_code=400, detail="Invalid file type. Only PDF files are accepted.")
+    validate_extractor(extractor)
+    if stream is not None and stream not in STREAM_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown stream format '{stream}'. Use 'ndjson' or 'sse'.")
 
     filename = file.filename
     uploaded_time = datetime.datetime.utcnow()
 
-    file.file.seek(0, os.SEEK_END)
-    file_size = file.file.tell()
-    file.file.seek(0)
+    try:
+        content_hash, file_size = await io_executor.run(hash_upload, file.file)
+    except ExecutorSaturated:
+        await file.close()
+        raise
 
     if file_size == 0:
+        await file.close()
         raise HTTPException(status_code=400, detail="Uploaded file is empty.")
 
+    minio_object_name = content_object_name(content_hash)
     try:
-        total_pages, extracted_text = extract_text_hybrid(file)
-        file.file.seek(0)
-
-        document_type = classify_doc_type(extracted_text)
-        extracted_entities = extract_entities_semantic(extracted_text, document_type)
-
+        cached = await db_manager.async_db_metadata_manager.find_by_content_hash(content_hash)
+    except ExecutorSaturated:
+        await file.close()
+        raise
     except Exception as e:
-        logger.error(f"Text extraction or entity extraction failed: {e}")
-        raise HTTPException(status_code=500, detail="Text or entity extraction failed.")
+        await file.close()
+        logger.error(f"Content hash lookup failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Database lookup failed: {str(e)}")
 
-    minio_object_name = filename
-    logger.debug(f"Preparing to upload file: {filename}, size: {file_size}, pages: {total_pages}")
-    try:
-        upload_etag = minio_manager.minio_metadata_manager.upload_file(
-            file_data=file.file,
-            object_name=minio_object_name,
-            file_length=file_size
+    if stream is not None:
+        analysis, cancel, upload = None, None, None
+        page_events: asyncio.Queue = asyncio.Queue()
+        if cached is None:
+            # The upload is closed once this handler returns, so the stream reads a copy on disk
+            try:
+                path = await io_executor.run(spool_to_path, file.file)
+            finally:
+                await file.close()
+            loop = asyncio.get_running_loop()
+            cancel = CancelToken()
+            try:
+                # Admission happens here, so a saturated executor still gets a plain 503.
+                analysis = cpu_executor.submit(
+                    analyze_pdf_streamed, path, extractor,
+                    lambda record: loop.call_soon_threadsafe(page_events.put_nowait, record), cancel
+                )
+                # The object is content addressed, so it is stored while the PDF is still being analyzed
+                upload = io_executor.submit(store_file, path, minio_object_name, file_size)
+            except ExecutorSaturated:
+                if analysis is not None:
+                    cancel_analysis(analysis, cancel)
+                raise
+            finally:
+                remove_when_done(path, [future for future in (analysis, upload) if future is not None])
+        else:
+            await file.close()
+        return StreamingResponse(
+            upload_event_stream(
+                stream, filename, uploaded_time, content_hash, file_size,
+                minio_object_name, cached, extractor, analysis, cancel, upload, page_events
+            ),
+            media_type=STREAM_MEDIA_TYPES[stream]
         )
+
+    minio_seconds = None
+    if cached is not None:
+        # Same bytes were processed before: reuse the stored object and extraction.
+        logger.debug(f"Content hash {content_hash} already processed as record {cached['db_id']}, skipping OCR")
+        await file.close()
+        result = cached_analysis(cached)
+        minio_object_name = cached["minio_object_name"] or minio_object_name
+        if extractor is not None:
+            # The cached entities may come from another backend; rerunning it on the cached text is cheap.
+            result = await cpu_executor.run(rerun_entities, result, extractor)
+        message = "Duplicate upload; cached extraction returned and metadata logged successfully."
+    else:
+        cancel = CancelToken()
+        try:
+            analysis = cpu_executor.submit(analyze_document, file, extractor, cancel)
+        except ExecutorSaturated:
+            await file.close()
+            raise
+        # The object is content addressed, so it is stored while the PDF is still being analyzed
+        logger.debug(f"Uploading file {filename} ({file_size} bytes) alongside extraction")
+        try:
+            upload = io_executor.submit(store_object, file.file, minio_object_name, file_size)
+        except ExecutorSaturated:
+            # No point finishing the analysis for a 503; the file is closed once it has stopped reading
+            cancel_analysis(analysis, cancel)
+            await asyncio.wait([analysis])
+            await file.close()
+            raise
+        # Both read the spooled upload, so it is only closed once both are done
+        await asyncio.wait([analysis, upload])
+        await file.close()
+
+        try:
+            result = analysis.result()
+        except Exception as e:
+            logger.error(f"Text extraction or entity extraction failed: {e}")
+            raise HTTPException(status_code=500, detail="Text or entity extraction failed.")
+        try:
+            upload_etag, minio_seconds = upload.result()
+        except Exception as e:
+            logger.error(f"MinIO upload failed: {e}")
+            raise HTTPException(status_code=500, detail=f"MinIO upload failed: {str(e)}")
         if not upload_etag:
             raise HTTPException(status_code=500, detail="Failed to upload file to MinIO.")
-    except Exception as e:
-        logger.error(f"MinIO upload failed: {e}")
-        raise HTTPException(status_code=500, detail=f"MinIO upload failed: {str(e)}")
-    finally:
-        await file.close()
+        message = "File uploaded, processed, and metadata logged successfully."
 
     try:
-        db_id = db_manager.db_metadata_manager.log_file_metadata(
+        db_id = await db_manager.async_db_metadata_manager.log_file_metadata(**upload_record(
+            result, cached, minio_seconds,
             filename=filename,
             uploaded_time=uploaded_time,
             file_size=file_size,
-            total_pages=total_pages
-        )
+            content_hash=content_hash,
+            minio_object_name=minio_object_name
+        ))
         if db_id is None:
             raise HTTPException(status_code=500, detail="Failed to log file metadata to database.")
+    except (HTTPException, ExecutorSaturated):
+        raise
     except Exception as e:
         logger.error(f"Database logging failed: {e}")
         raise HTTPException(status_code=500, detail=f"Database logging failed: {str(e)}")
 
+    await index_logged_upload(db_id, filename, uploaded_time, result)
+
     return FileUploadResponse(
         db_id=db_id,
         filename=filename,
+        message=message,
+        minio_object_name=minio_object_name,
+        file_size=file_size,
+        total_pages=result.total_pages,
+        uploaded_time=uploaded_time,
+        extracted_text=result.extracted_text,
+        document_type=result.document_type,
+        extracted_entities=result.extracted_entities,
+        content_hash=content_hash,
+        **upload_metrics(file_size, minio_seconds)
+    )
+
+def process_job(job_id: str) -> None:
+    """
+    Runs the full ingestion pipeline for a queued job and stores the
+    FileUploadResponse payload (or the failure) on the job record.
+    """
+    dbm = db_manager.db_metadata_manager
+    owner = job_queue.owner
+    # Another worker process may hold the job already; only the claimant runs it
+    if not dbm.claim_job(job_id, owner, job_queue.lease_seconds):
+        logger.debug(f"Job {job_id} is done or held by another worker, skipping.")
+        return
+    job = dbm.get_job(job_id)
+
+    try:
+        cached = dbm.find_by_content_hash(job["content_hash"]) if job["content_hash"] else None
+        if cached is not None:
+            analysis = cached_analysis(cached)
+        else:
+            file_bytes = minio_manager.minio_metadata_manager.download_file(job["minio_object_name"])
+            if file_bytes is None:
+                raise RuntimeError(f"Could not read '{job['minio_object_name']}' from MinIO.")
+            analysis = analyze_pdf_bytes(file_bytes)
+
+        # The MinIO upload happened at submission and is not timed here
+        db_id = dbm.log_file_metadata(**upload_record(
+            analysis, cached,
+            filename=job["filename"],
+            uploaded_time=job["uploaded_time"],
+            file_size=job["file_size"],
+            content_hash=job["content_hash"],
+            minio_object_name=job["minio_object_name"]
+        ))
+        if db_id is None:
+            raise RuntimeError("Failed to log file metadata to database.")
+        index_upload(
+            db_id, job["filename"], job["uploaded_time"], analysis.document_type, analysis.extracted_text,
+            analysis.extracted_entities, analysis.sentences, analysis.sentence_embeddings
+        )
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {e}")
+        dbm.update_job(job_id, db_manager.JOB_FAILED, error=str(e), owner=owner)
+        return
+
+    result = FileUploadResponse(
+        db_id=db_id,
+        filename=job["filename"],
         message="File uploaded, processed, and metadata logged successfully.",
+        minio_object_name=job["minio_object_name"],
+        file_size=job["file_size"],
+        total_pages=analysis.total_pages,
+        uploaded_time=job["uploaded_time"],
+        extracted_text=analysis.extracted_text,
+        document_type=analysis.document_type,
+        extracted_entities=analysis.extracted_entities,
+        content_hash=job["content_hash"]
+    )
+    dbm.update_job(job_id, db_manager.JOB_DONE, result=result.model_dump(mode="json"), owner=owner)
+
+job_queue.set_handler(process_job)
+
+def resume_pending_jobs() -> int:
+    """
+    Enqueues the jobs no live worker holds (queued, or running under an
+    expired lease, e.g. left by a stopped process) and starts renewing the
+    leases of this process's jobs. Every worker process does this; the
+    claim in process_job lets exactly one of them run each job.
+    """
+    dbm = db_manager.db_metadata_manager
+    return job_queue.start(
+        renew=lambda job_ids: dbm.renew_job_leases(job_ids, job_queue.owner, job_queue.lease_seconds),
+        claimable=dbm.list_claimable_job_ids,
+    )
+
+@router.post("/jobs/", response_model=JobSubmitResponse, status_code=202)
+async def submit_upload_job(file: Annotated[UploadFile, File()]):
+    """
+    Stores the PDF in MinIO and queues it for background processing.
+    Poll /files/jobs/{job_id} for the result.
+    """
+    if not (file.filename.lower().endswith(".pdf") or file.content_type == "application/pdf"):
+        raise HTTPException(status_code=400, detail="Invalid file type. Only PDF files are accepted.")
+
+    filename = file.filename
+    uploaded_time = datetime.datetime.utcnow()
+
+    try:
+        content_hash, file_size = await io_executor.run(hash_upload, file.file)
+    except ExecutorSaturated:
+        await file.close()
+        raise
+
+    if file_size == 0:
+        await file.close()
+        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+
+    job_id = uuid.uuid4().hex
+    minio_object_name = content_object_name(content_hash)
+    try:
+        cached = await db_manager.async_db_metadata_manager.find_by_content_hash(content_hash)
+        if cached is not None:
+            # Same bytes were stored before; the job reuses that object and extraction.
+            minio_object_name = cached["minio_object_name"] or minio_object_name
+        else:
+            upload_etag = await io_executor.run(
+                minio_manager.minio_metadata_manager.upload_file,
+                file_data=file.file,
+                object_name=minio_object_name,
+                file_length=file_size
+            )
+            if not upload_etag:
+                raise HTTPException(status_code=500, detail="Failed to upload file to MinIO.")
+    except (HTTPException, ExecutorSaturated):
+        raise
+    except Exception as e:
+        logger.error(f"MinIO upload failed: {e}")
+        raise HTTPException(status_code=500, detail=f"MinIO upload failed: {str(e)}")
+    finally:
+        await file.close()
+
+    created = await db_manager.async_db_metadata_manager.create_job(
+        job_id=job_id,
+        filename=filename,
         minio_object_name=minio_object_name,
         file_size=file_size,
-        total_pages=total_pages,
         uploaded_time=uploaded_time,
-        extracted_text=extracted_text,
-        document_type=document_type,
-        extracted_entities=extracted_entities
+        content_hash=content_hash
+    )
+    if not created:
+        raise HTTPException(status_code=500, detail="Failed to record ingestion job.")
+
+    job_queue.enqueue(job_id)
+    return JobSubmitResponse(
+        job_id=job_id,
+        status=db_manager.JOB_QUEUED,
+        filename=filename,
+        minio_object_name=minio_object_name,
+        file_size=file_size,
+        uploaded_time=uploaded_time
+    )
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_upload_job(job_id: str):
+    job = await db_manager.async_db_metadata_manager.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return JobStatusResponse(**job)
+
+@router.get("/documents/{db_id}", response_model=DocumentResponse)
+async def get_document(db_id: int, include_text: bool = True):
+    """
+    A processed upload as stored: classification, entities, per-page
+    extraction method and text, and per-stage timings. Nothing is
+    recomputed.
+    """
+    document = await db_manager.async_db_metadata_manager.get_document(db_id, include_text=include_text)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    return DocumentResponse(**document)
+
+@router.get("/slowest/", response_model=List[SlowDocument])
+async def slowest_documents(stage: str = db_manager.STAGE_EXTRACT, limit: int = 20):
+    """The uploads that spent the longest in one pipeline stage."""
+    if stage not in db_manager.PIPELINE_STAGES:
+        raise HTTPException(status_code=400, detail=f"Unknown stage '{stage}'. Use one of: {', '.join(db_manager.PIPELINE_STAGES)}.")
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000.")
+    return await db_manager.async_db_metadata_manager.slowest_documents(stage, limit=limit)
+
+@router.post("/batch/analyze/", response_model=BatchAnalyzeResponse)
+async def batch_analyze(request: BatchAnalyzeRequest):
+    """
+    Classifies and extracts entities for many texts, or for previously
+    uploaded documents by db id, in one batched inference pass.
+    """
+    texts = list(request.texts or [])
+    db_ids = list(request.db_ids or [])
+    if not texts and not db_ids:
+        raise HTTPException(status_code=400, detail="Provide 'texts' or 'db_ids'.")
+    if len(texts) + len(db_ids) > BATCH_MAX_DOCUMENTS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_DOCUMENTS} documents per batch.")
+    validate_extractor(request.extractor)
+
+    stored = await db_manager.async_db_metadata_manager.get_extracted_texts(db_ids) if db_ids else {}
+    found_ids = [db_id for db_id in db_ids if db_id in stored]
+    inputs = texts + [stored[db_id] for db_id in found_ids]
+    analyses = await cpu_executor.run(analyze_texts, inputs, request.extractor) if inputs else []
+
+    results = []
+    for index, (document_type, extracted_entities) in enumerate(analyses):
+        results.append(BatchAnalyzeResult(
+            index=index,
+            db_id=found_ids[index - len(texts)] if index >= len(texts) else None,
+            document_type=document_type,
+            extracted_entities=extracted_entities
+        ))
+    return BatchAnalyzeResponse(
+        results=results,
+        missing_db_ids=[db_id for db_id in db_ids if db_id not in stored]
+    )
+
+def label_studio_unavailable(e: ExportQueueFull) -> HTTPException:
+    return HTTPException(
+        status_code=503, detail=str(e), headers={"Retry-After": str(max(1, round(LABEL_STUDIO_BATCH_SECONDS)))}
     )
 
 @router.post("/create-label-task/")
@@ -166,28 +979,48 @@ async def create_label_task(file: Annotated[UploadFile, File()]):
         raise HTTPException(status_code=400, detail="Only PDF files are supported.")
 
     # Step 1: Extract text using your hybrid extractor
-    total_pages, extracted_text = extract_text_hybrid(file)
+    total_pages, extracted_text = await cpu_executor.run(extract_text_hybrid, file)
 
     # Step 2: Clean the text
     cleaned_text = clean_extracted_text(extracted_text)
 
-    # Step 3: Prepare and send to Label Studio
+    # Step 3: Queue for Label Studio; sent with other queued tasks in one import
     task = {"data": {"text": cleaned_text}}
-    headers = {
-        "Authorization": f"Token {LABEL_STUDIO_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    url = f"{LABEL_STUDIO_URL}/api/projects/{LABEL_STUDIO_PID}/import?format=JSON"
-
     try:
-        resp = requests.post(url, json=[task], headers=headers, timeout=10)
-        resp.raise_for_status()
-    except requests.RequestException as e:
+        response = await exporter.enqueue(task)
+    except ExportQueueFull as e:
+        raise label_studio_unavailable(e)
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Label Studio API error: {str(e)}")
 
     return {
         "message": "PDF extracted and task sent to Label Studio",
         "pages": total_pages,
         "filename": file.filename,
-        "response": resp.json()
+        "response": response
     }
+
+@router.post("/label-tasks/", response_model=LabelTasksResponse, status_code=202)
+async def queue_label_tasks(request: LabelTasksRequest):
+    """
+    Queues many documents for annotation at once: raw texts and/or
+    previously uploaded documents by db id. Tasks are cleaned and sent to
+    Label Studio in batched imports in the background; see /labelstudio
+    for progress.
+    """
+    texts = list(request.texts or [])
+    db_ids = list(request.db_ids or [])
+    if not texts and not db_ids:
+        raise HTTPException(status_code=400, detail="Provide 'texts' or 'db_ids'.")
+
+    stored = await db_manager.async_db_metadata_manager.get_extracted_texts(db_ids) if db_ids else {}
+    documents = [(text, None) for text in texts] + [(stored[db_id], db_id) for db_id in db_ids if db_id in stored]
+    tasks = await cpu_executor.run(build_label_tasks, documents)
+    try:
+        queued = exporter.enqueue_many(tasks)
+    except ExportQueueFull as e:
+        raise label_studio_unavailable(e)
+    return LabelTasksResponse(
+        queued=queued,
+        missing_db_ids=[db_id for db_id in db_ids if db_id not in stored]
+    )
@@ -0,0 +1,34 @@
+"""
+Gunicorn settings for running the API in several worker processes:
+
+    gunicorn app.main:app -c python:app.gunicorn_conf
+
+The app is imported and the MODEL_WARMUP models are loaded once in the
+master process, before any worker is forked, so every worker maps the same
+weight pages copy-on-write instead of loading its own copy. Each worker
+still runs main.on_startup (tables, bucket, job resumption); its
+registry.warm_up finds the models already loaded. Measure the effect with
+`python -m benchmarks.worker_memory`.
+"""
+import gc
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Workers must be forked from a master that already holds the models
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+
+
+def when_ready(server):
+    """Runs in the master after the app is loaded, before workers are forked."""
+    from app import model_loader
+
+    # Load only: no inference runs here, so torch starts no thread pools before the fork
+    model_loader.registry.warm_up()
+    server.log.info(f"Models loaded before forking workers: {model_loader.MODEL_WARMUP or 'none'}")
+    # Everything allocated so far is left out of later collections, which would
+    # otherwise write to (and so copy) the shared pages in every worker
+    gc.collect()
+    gc.freeze()
@@ -0,0 +1,125 @@
+import os
+import socket
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# A claimed job belongs to its worker process until the lease expires. Leases
+# of running jobs are renewed every third of it, so only a job whose process
+# died (or hung) is taken over by another process.
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+
+
+class LocalJobQueue:
+    """
+    In-process job queue backed by a thread pool.
+
+    Stands in for an external broker: job ids are enqueued and a registered
+    handler processes each one on a worker thread. Job state itself lives in
+    the database, so anything still queued when the process dies is picked
+    up again by another process or on the next startup.
+
+    Several API worker processes share the jobs table, so the handler must
+    claim a job (with this queue's `owner` id and a lease) before running
+    it. Once started, a lease thread renews the leases of this process's
+    running jobs and periodically enqueues the jobs that are claimable
+    again: still queued, or running under an expired lease.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, handler: Optional[Callable[[str], None]] = None,
+                 lease_seconds: int = JOB_LEASE_SECONDS):
+        self.workers = workers
+        self.handler = handler
+        self.lease_seconds = lease_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest-job")
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._running = set()
+        self._renew: Optional[Callable[[List[str]], None]] = None
+        self._claimable: Optional[Callable[[], Iterable[str]]] = None
+        self._stopped = threading.Event()
+        self._lease_thread: Optional[threading.Thread] = None
+
+    @property
+    def owner(self) -> str:
+        # Read per call: a queue created before a fork belongs to the child afterwards
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def set_handler(self, handler: Callable[[str], None]) -> None:
+        self.handler = handler
+
+    def start(self, renew: Callable[[List[str]], None], claimable: Callable[[], Iterable[str]]) -> int:
+        """
+        Enqueues the currently claimable jobs and starts the lease thread.
+
+        Args:
+            renew (Callable): Extends the leases of the given running job ids.
+            claimable (Callable): Returns the ids of jobs any process may claim.
+
+        Returns:
+            int: Number of jobs enqueued now.
+        """
+        self._renew = renew
+        self._claimable = claimable
+        enqueued = self.enqueue_claimable()
+        if self._lease_thread is None:
+            self._lease_thread = threading.Thread(target=self._lease_loop, name="ingest-job-lease", daemon=True)
+            self._lease_thread.start()
+        return enqueued
+
+    def enqueue_claimable(self) -> int:
+        return sum(self.enqueue(job_id) for job_id in self._claimable())
+
+    def _lease_loop(self) -> None:
+        ticks = 0
+        while not self._stopped.wait(self.lease_seconds / 3):
+            ticks += 1
+            try:
+                with self._lock:
+                    running = list(self._running)
+                if running:
+                    self._renew(running)
+                if ticks % 3 == 0:
+                    self.enqueue_claimable()
+            except Exception as e:
+                logger.error(f"Job lease maintenance failed: {e}")
+
+    def enqueue(self, job_id: str) -> bool:
+        """
+        Schedules a job for processing. Returns False if it is already pending.
+        """
+        if self.handler is None:
+            raise RuntimeError("No job handler registered.")
+        with self._lock:
+            if job_id in self._pending:
+                return False
+            self._pending.add(job_id)
+        self._executor.submit(self._run, job_id)
+        return True
+
+    def _run(self, job_id: str) -> None:
+        with self._lock:
+            self._running.add(job_id)
+        try:
+            self.handler(job_id)
+        except Exception as e:
+            logger.error(f"Job {job_id} handler raised: {e}")
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+                self._pending.discard(job_id)
+
+    def depth(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._stopped.set()
+        self._executor.shutdown(wait=wait)
+
+
+job_queue = LocalJobQueue()
@@ -0,0 +1,82 @@
+from typing import Dict, List, Sequence, Tuple, Union
+
+# A keyword entry is either a plain phrase (weight 1) or a (phrase, weight) pair.
+KeywordEntry = Union[str, Tuple[str, float]]
+
+
+class KeywordMatcher:
+    """
+    Counts the keywords of several labels in a text and scores the labels.
+
+    Matching is case-insensitive substring matching, the same as
+    `keyword in text.lower()`. Each distinct phrase is counted once per
+    text, however many labels it belongs to, by one C substring scan over
+    the once-lowercased text; presence scans stop at the first hit and
+    occurrences are counted non-overlapping (str.count).
+    """
+
+    def __init__(self, keyword_sets: Dict[str, Sequence[KeywordEntry]]):
+        self.labels: List[str] = list(keyword_sets)
+        self.phrases: List[str] = []
+        # keyword id -> [(label, weight), ...]; a phrase may belong to several labels
+        self._targets: List[List[Tuple[str, float]]] = []
+        keyword_ids: Dict[str, int] = {}
+
+        for label, entries in keyword_sets.items():
+            for entry in entries:
+                phrase, weight = (entry, 1) if isinstance(entry, str) else entry
+                phrase = phrase.lower()
+                if not phrase:
+                    continue
+                if phrase not in keyword_ids:
+                    keyword_ids[phrase] = len(self.phrases)
+                    self.phrases.append(phrase)
+                    self._targets.append([])
+                self._targets[keyword_ids[phrase]].append((label, weight))
+
+    @property
+    def num_keywords(self) -> int:
+        return len(self.phrases)
+
+    def find_matches(self, text: str) -> List[int]:
+        """
+        Returns 1 for every keyword id present in `text`, else 0. The
+        substring scan stops at each phrase's first occurrence.
+        """
+        lowered = text.lower()
+        return [1 if phrase in lowered else 0 for phrase in self.phrases]
+
+    def count_matches(self, text: str) -> List[int]:
+        """
+        Returns the number of occurrences of every keyword id in `text`.
+        """
+        return [text.lower().count(phrase) for phrase in self.phrases]
+
+    def score(self, text: str, count_occurrences: bool = False) -> Dict[str, float]:
+        """
+        Scores every label against `text`.
+
+        Args:
+            text (str): Text to scan.
+            count_occurrences (bool): Weight each keyword by how often it occurs
+                instead of counting it once if present.
+
+        Returns:
+            Dict[str, float]: Sum of matched keyword weights per label, in the
+            order the labels were given.
+        """
+        matches = self.count_matches(text) if count_occurrences else self.find_matches(text)
+        return self.scores_from_counts(matches, count_occurrences=count_occurrences)
+
+    def scores_from_counts(self, counts: List[int], count_occurrences: bool = False) -> Dict[str, float]:
+        """
+        Turns per-keyword counts (e.g. summed over the pages of a document)
+        into per-label scores, as `score` does for a single text.
+        """
+        scores: Dict[str, float] = {label: 0 for label in self.labels}
+        for keyword_id, count in enumerate(counts):
+            if not count:
+                continue
+            for label, weight in self._targets[keyword_id]:
+                scores[label] += weight * count if count_occurrences else weight
+        return scores
@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from typing import Iterable, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+LABEL_STUDIO_URL = os.getenv("LABEL_STUDIO_URL", "http://labelstudio:8080")
+LABEL_STUDIO_TOKEN = os.getenv("LABEL_STUDIO_TOKEN", "changeme")
+LABEL_STUDIO_PID = os.getenv("LABEL_STUDIO_PID", "1")
+# A batch is sent once it holds this many tasks or bytes, or this many
+# seconds after its first task arrived, whichever comes first.
+LABEL_STUDIO_BATCH_SIZE = int(os.getenv("LABEL_STUDIO_BATCH_SIZE", "100"))
+LABEL_STUDIO_BATCH_BYTES = int(os.getenv("LABEL_STUDIO_BATCH_BYTES", str(8 * 1024 * 1024)))
+LABEL_STUDIO_BATCH_SECONDS = float(os.getenv("LABEL_STUDIO_BATCH_SECONDS", "2.0"))
+# Batches in flight at once, and pooled keep-alive connections
+LABEL_STUDIO_CONCURRENCY = int(os.getenv("LABEL_STUDIO_CONCURRENCY", "2"))
+LABEL_STUDIO_QUEUE_SIZE = int(os.getenv("LABEL_STUDIO_QUEUE_SIZE", "10000"))
+LABEL_STUDIO_MAX_RETRIES = int(os.getenv("LABEL_STUDIO_MAX_RETRIES", "5"))
+LABEL_STUDIO_BACKOFF_SECONDS = float(os.getenv("LABEL_STUDIO_BACKOFF_SECONDS", "0.5"))
+LABEL_STUDIO_TIMEOUT = float(os.getenv("LABEL_STUDIO_TIMEOUT", "30"))
+BACKOFF_MAX_SECONDS = 30.0
+
+
+class ExportQueueFull(Exception):
+    """Raised when the export queue cannot take the tasks."""
+
+
+class _RetryableStatus(Exception):
+    def __init__(self, response: httpx.Response):
+        super().__init__(f"Label Studio answered {response.status_code}")
+        self.response = response
+
+
+class LabelStudioExporter:
+    """
+    Batches annotation tasks into Label Studio project imports.
+
+    Tasks are queued from request handlers and sent by background workers
+    over one pooled, keep-alive httpx.AsyncClient: each import carries up to
+    `batch_size` tasks / `batch_bytes` bytes, collected for at most
+    `batch_seconds`. Connection errors, 429s and 5xx answers are retried
+    with exponential backoff (or the server's Retry-After).
+
+    Args:
+        base_url (str): Label Studio URL; point it at a mock server in tests.
+        token (str): API token.
+        project_id (str): Project the tasks are imported into.
+        **client_kwargs: Passed to httpx.AsyncClient (e.g. `transport`).
+    """
+
+    def __init__(self, base_url: str = LABEL_STUDIO_URL, token: str = LABEL_STUDIO_TOKEN,
+                 project_id: str = LABEL_STUDIO_PID, batch_size: int = LABEL_STUDIO_BATCH_SIZE,
+                 batch_bytes: int = LABEL_STUDIO_BATCH_BYTES, batch_seconds: float = LABEL_STUDIO_BATCH_SECONDS,
+                 concurrency: int = LABEL_STUDIO_CONCURRENCY, queue_size: int = LABEL_STUDIO_QUEUE_SIZE,
+                 max_retries: int = LABEL_STUDIO_MAX_RETRIES, backoff_seconds: float = LABEL_STUDIO_BACKOFF_SECONDS,
+                 timeout: float = LABEL_STUDIO_TIMEOUT, **client_kwargs):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.project_id = project_id
+        self.batch_size = max(1, batch_size)
+        self.batch_bytes = batch_bytes
+        self.batch_seconds = batch_seconds
+        self.concurrency = max(1, concurrency)
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.client_kwargs = client_kwargs
+        self._queue: Optional[asyncio.Queue] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._workers: List[asyncio.Task] = []
+        self._counts = {"tasks": 0, "batches": 0, "retries": 0, "failed_tasks": 0, "failed_batches": 0}
+        self._send_seconds = 0.0
+        self._last_error: Optional[str] = None
+
+    @property
+    def import_path(self) -> str:
+        return f"/api/projects/{self.project_id}/import"
+
+    def _start(self) -> None:
+        # Bound to the running event loop, so created on first use
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Authorization": f"Token {self.token}", "Content-Type": "application/json"},
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+            **self.client_kwargs,
+        )
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    def enqueue(self, task: dict) -> asyncio.Future:
+        """
+        Queues one task and returns a future resolving to the Label Studio
+        import response of its batch.
+
+        Raises:
+            ExportQueueFull: If the queue is full.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._put([task], [future])
+        return future
+
+    def enqueue_many(self, tasks: Iterable[dict]) -> int:
+        """
+        Queues tasks without waiting for them to be imported. Either all of
+        them are queued or, if they do not fit, none.
+
+        Returns:
+            int: Number of tasks queued.
+
+        Raises:
+            ExportQueueFull: If the queue cannot take all of them.
+        """
+        tasks = list(tasks)
+        self._put(tasks, [None] * len(tasks))
+        return len(tasks)
+
+    def _put(self, tasks: List[dict], futures: list) -> None:
+        self._start()
+        if self._queue.maxsize and self._queue.maxsize - self._queue.qsize() < len(tasks):
+            raise ExportQueueFull(f"Label Studio export queue is full ({self._queue.qsize()} tasks waiting).")
+        for task, future in zip(tasks, futures):
+            # Serialized once here; a batch body is the joined parts
+            self._queue.put_nowait((json.dumps(task).encode("utf-8"), future))
+
+    async def _next_batch(self, carry: Optional[tuple]) -> Tuple[list, Optional[tuple]]:
+        first = carry if carry is not None else await self._queue.get()
+        batch, size = [first], len(first[0])
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if size + len(item[0]) > self.batch_bytes:
+                # Opens the next batch instead
+                return batch, item
+            batch.append(item)
+            size += len(item[0])
+        return batch, None
+
+    async def _worker(self) -> None:
+        carry = None
+        while True:
+            batch, carry = await self._next_batch(carry)
+            try:
+                result = await self._send([payload for payload, _ in batch])
+            except Exception as e:
+                self._counts["failed_tasks"] += len(batch)
+                self._counts["failed_batches"] += 1
+                self._last_error = str(e)
+                logger.error(f"Label Studio import of {len(batch)} task(s) failed: {e}")
+                for _, future in batch:
+                    if future is not None and not future.done():
+                        future.set_exception(e)
+            else:
+                self._counts["tasks"] += len(batch)
+                self._counts["batches"] += 1
+                for _, future in batch:
+                    if future is not None and not future.done():
+                        future.set_result(result)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _send(self, payloads: List[bytes]) -> dict:
+        body = b"[" + b",".join(payloads) + b"]"
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            retry_after = None
+            try:
+                response = await self._client.post(self.import_path, params={"format": "JSON"}, content=body)
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise _RetryableStatus(response)
+                response.raise_for_status()
+                return response.json()
+            except (httpx.TransportError, _RetryableStatus) as e:
+                if attempt == self.max_retries:
+                    if isinstance(e, _RetryableStatus):
+                        e.response.raise_for_status()
+                    raise
+                if isinstance(e, _RetryableStatus):
+                    retry_after = e.response.headers.get("Retry-After")
+                delay = self._backoff(attempt, retry_after)
+                self._counts["retries"] += 1
+                logger.warning(f"Label Studio import failed ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+            finally:
+                self._send_seconds += time.perf_counter() - started
+        raise RuntimeError("unreachable")
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after is not None:
+            try:
+                return min(BACKOFF_MAX_SECONDS, float(retry_after))
+            except ValueError:
+                pass
+        # Full jitter keeps workers that failed together from retrying together
+        return random.uniform(0, min(BACKOFF_MAX_SECONDS, self.backoff_seconds * 2 ** attempt))
+
+    async def flush(self) -> None:
+        """Waits until every queued task has been sent (or has failed)."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self, drain_seconds: float = 10.0) -> None:
+        """Sends what is queued (for up to `drain_seconds`), then stops the workers."""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self.flush(), drain_seconds)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self._queue.qsize()} queued Label Studio task(s) on shutdown.")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        await self._client.aclose()
+        self._workers = []
+        self._queue = None
+        self._client = None
+
+    def stats(self) -> dict:
+        """Queued, sent and failed tasks, batches, retries and average send time."""
+        batches = self._counts["batches"] + self._counts["failed_batches"]
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            **self._counts,
+            "avg_batch_size": self._counts["tasks"] / self._counts["batches"] if self._counts["batches"] else 0.0,
+            "avg_send_seconds": self._send_seconds / batches if batches else 0.0,
+            "last_error": self._last_error,
+        }
+
+
+exporter = LabelStudioExporter()
@@ -1,5 +1,14 @@
-from fastapi import FastAPI
-from app import file_service, db_manager
+import os
+import logging
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app import file_service, db_manager, minio_manager, page_extractor, executors, job_queue, model_loader
+from app import document_classifier, entity_extractor, search_service, search_index, vector_index, bulk_service
+from app import label_studio, metrics, profiler
+
+# One place sets the log level for the whole process (DEBUG while investigating)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 
 # Ensure singleton instance is created before use
 _ = db_manager.DBMetadataManager()
@@ -8,21 +17,130 @@ app = FastAPI(title="Title Search Platform API")
 
 # Include routers
 app.include_router(file_service.router, prefix="/files", tags=["File Operations"])
+app.include_router(bulk_service.router, prefix="/files/bulk", tags=["File Operations"])
+app.include_router(search_service.router, prefix="/search", tags=["Search"])
+
+if profiler.profiling_enabled():
+    # Not installed otherwise, so requests pay nothing for it
+    app.middleware("http")(profiler.profile_request)
+
+metrics.registry.gauge(
+    "title_search_executor_queued", "Calls waiting for a pipeline executor worker.", ("executor",),
+    lambda: {(name,): stats["queued"] for name, stats in executors.executor_stats().items()},
+)
+metrics.registry.gauge(
+    "title_search_executor_running", "Calls running on a pipeline executor.", ("executor",),
+    lambda: {(name,): stats["running"] for name, stats in executors.executor_stats().items()},
+)
+metrics.registry.gauge(
+    "title_search_label_studio_queued", "Tasks waiting to be sent to Label Studio.", (),
+    lambda: {(): label_studio.exporter.stats()["queued"]},
+)
+
+@app.exception_handler(executors.ExecutorSaturated)
+async def executor_saturated_handler(request: Request, exc: executors.ExecutorSaturated):
+    # Shed load instead of queueing unboundedly; clients retry after the hint.
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 @app.on_event("startup")
 def on_startup():
     """
     Actions to perform on application startup.
     - Create database tables.
+    - Check (or create) the MinIO bucket once, instead of on every upload.
+    - Start indexing uploads missing from the search index, in the background.
+    - Re-enqueue ingestion jobs and bulk runs interrupted by a previous shutdown.
+    - Warm up the models listed in MODEL_WARMUP (others load on first use),
+      along with the reference and prompt embeddings. This runs in each
+      worker after it is forked; under app.gunicorn_conf the master has
+      loaded the models already and the workers share them.
     """
     print("Application starting up...")
     db_manager.db_metadata_manager.create_tables()
     print("Database tables checked/created.")
+    if minio_manager.minio_metadata_manager.ensure_bucket():
+        print(f"MinIO bucket '{minio_manager.MINIO_BUCKET}' ready.")
+    search_index.start_background_sync()
+    print("Search index sync started in the background.")
+    model_loader.registry.warm_up()
+    if "embedding" in model_loader.MODEL_WARMUP:
+        document_classifier.reference_embeddings()
+        for doc_type in entity_extractor.ENTITY_PROMPTS:
+            entity_extractor.prompt_embeddings(doc_type)
+    print(f"Models warmed up: {model_loader.MODEL_WARMUP or 'none (lazy loading)'}")
+    resumed = file_service.resume_pending_jobs()
+    print(f"Resumed {resumed} pending ingestion job(s).")
+    resumed = bulk_service.resume_bulk_runs()
+    print(f"Resumed {resumed} bulk ingest run(s).")
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """
+    Actions to perform on application shutdown.
+    - Stop the job workers, pipeline executors and page extraction worker processes.
+    - Stop bulk runs from admitting documents; they resume at the next startup.
+    - Send the Label Studio tasks still queued and close the HTTP connection pool.
+    """
+    bulk_service.stop_bulk_runs()
+    await label_studio.exporter.close()
+    job_queue.job_queue.shutdown(wait=False)
+    executors.cpu_executor.shutdown(wait=False)
+    executors.io_executor.shutdown(wait=False)
+    page_extractor.shutdown_page_pool()
 
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to the Title Search Platform API"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics():
+    """
+    Per-stage latency histograms, page and cache counters and queue gauges
+    in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/executors")
+async def read_executor_stats():
+    """Queue depth, rejections and wait times of the pipeline executors."""
+    stats = executors.executor_stats()
+    stats["jobs"] = {"workers": job_queue.job_queue.workers, "pending": job_queue.job_queue.depth()}
+    return stats
+
+@app.get("/extraction")
+async def read_extraction_stats():
+    """Pages extracted per method (text / OCR) and time spent per extraction phase."""
+    return page_extractor.extraction_stats()
+
+@app.get("/models")
+async def read_model_stats():
+    """Load state, load time and memory usage of the shared models."""
+    return model_loader.registry.stats()
+
+@app.get("/database")
+async def read_database_stats():
+    """Connection pool occupancy, checkout wait times and statement latency."""
+    return db_manager.pool_stats()
+
+@app.get("/storage")
+async def read_storage_stats():
+    """MinIO upload count, latency and throughput, and the multipart settings."""
+    return minio_manager.upload_stats.snapshot()
+
+@app.get("/labelstudio")
+async def read_label_studio_stats():
+    """Label Studio export queue depth, tasks and batches sent, retries and failures."""
+    return label_studio.exporter.stats()
+
+@app.get("/vectors")
+async def read_vector_index_stats():
+    """Rows, storage dtype, IVF lists and size on disk of the vector indexes."""
+    return vector_index.vector_index_stats()
+
 if __name__ == "__main__":
     import uvicorn
     # This is for local development testing only.
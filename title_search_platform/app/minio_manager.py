@@ -1,15 +1,18 @@
+import io
 import os
+import time
+import threading
 from typing import IO, Optional  # Added Optional for Python 3.9 compatibility
 from minio import Minio
 from minio.error import S3Error
 from dotenv import load_dotenv
 import logging
 
+from app import metrics
+
 # Load environment variables from .env file
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # MinIO connection details from environment variables
@@ -18,11 +21,96 @@ MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
 MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
 MINIO_BUCKET = os.getenv("MINIO_BUCKET", "title-search-bucket")
+# Objects larger than one part are sent as a multipart upload, with up to
+# MINIO_PARALLEL_UPLOADS parts in flight. S3 requires parts of at least 5 MiB.
+MINIO_PART_SIZE = max(5 * 1024 * 1024, int(os.getenv("MINIO_PART_SIZE", str(8 * 1024 * 1024))))
+MINIO_PARALLEL_UPLOADS = int(os.getenv("MINIO_PARALLEL_UPLOADS", "4"))
 
 logger.debug(f"MinIO config: endpoint={MINIO_ENDPOINT}, bucket={MINIO_BUCKET}, access_key length={len(MINIO_ACCESS_KEY)}, secret_key length={len(MINIO_SECRET_KEY)}")
 
+def mb_per_second(num_bytes: int, seconds: float) -> float:
+    return num_bytes / (1024 * 1024) / seconds if seconds > 0 else 0.0
+
+class UploadStats:
+    """Upload count, bytes and latency, totalled over every upload_file call."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.uploads = 0
+        self.failures = 0
+        self.bytes = 0
+        self.seconds_total = 0.0
+        self.seconds_max = 0.0
+
+    def record(self, num_bytes: int, seconds: float, failed: bool = False) -> None:
+        with self._lock:
+            if failed:
+                self.failures += 1
+                return
+            self.uploads += 1
+            self.bytes += num_bytes
+            self.seconds_total += seconds
+            self.seconds_max = max(self.seconds_max, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "uploads": self.uploads,
+                "failures": self.failures,
+                "bytes": self.bytes,
+                "avg_seconds": self.seconds_total / self.uploads if self.uploads else 0.0,
+                "max_seconds": self.seconds_max,
+                "avg_mb_per_second": mb_per_second(self.bytes, self.seconds_total),
+                "part_size": MINIO_PART_SIZE,
+                "parallel_uploads": MINIO_PARALLEL_UPLOADS,
+            }
+
+upload_stats = UploadStats()
+
+class PositionalReader(io.RawIOBase):
+    """
+    Read-only view of an upload with its own offset. Reads go through
+    os.pread (or a memoryview while a SpooledTemporaryFile is still in
+    memory), so the upload can be streamed to MinIO while another thread
+    reads the same file for extraction. Nothing is copied up front.
+    """
+
+    def __init__(self, file_data: IO[bytes], length: int):
+        super().__init__()
+        # SpooledTemporaryFile keeps its data in _file: a BytesIO until it rolls over to disk
+        raw = getattr(file_data, "_file", file_data)
+        self._length = length
+        self._position = 0
+        self._buffer = raw.getbuffer() if isinstance(raw, io.BytesIO) else None
+        self._fd = raw.fileno() if self._buffer is None else None
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        remaining = self._length - self._position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        if size <= 0:
+            return b""
+        if self._buffer is not None:
+            data = bytes(self._buffer[self._position:self._position + size])
+        else:
+            data = os.pread(self._fd, size, self._position)
+        self._position += len(data)
+        return data
+
+    def close(self) -> None:
+        # An exported buffer would keep the BytesIO from being closed
+        if self._buffer is not None:
+            self._buffer.release()
+            self._buffer = None
+        super().close()
+
 class MinioMetadataManager:
     _instance = None
+    _bucket_ready = False
+    _bucket_lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
@@ -39,10 +127,41 @@ class MinioMetadataManager:
                 cls.minio_client = None
         return cls._instance
 
+    def ensure_bucket(self) -> bool:
+        """
+        Creates the bucket if it doesn't already exist. The answer is cached
+        once the bucket is known to exist, so uploads skip the round trip.
+
+        Returns:
+            bool: True if the bucket exists.
+        """
+        if self._bucket_ready:
+            return True
+        if not self.minio_client:
+            logger.warning("Minio client not initialized.")
+            return False
+        with self._bucket_lock:
+            if self._bucket_ready:
+                return True
+            try:
+                if not self.minio_client.bucket_exists(MINIO_BUCKET):
+                    self.minio_client.make_bucket(MINIO_BUCKET)
+                    logger.info(f"Bucket '{MINIO_BUCKET}' created.")
+                else:
+                    logger.info(f"Bucket '{MINIO_BUCKET}' already exists.")
+                MinioMetadataManager._bucket_ready = True
+            except S3Error as e:
+                logger.error(f"MinIO S3 Error while checking bucket '{MINIO_BUCKET}': {e}")
+            except Exception as e:
+                logger.error(f"An unexpected error occurred while checking bucket '{MINIO_BUCKET}': {e}")
+        return self._bucket_ready
+
     def upload_file(self, file_data: IO[bytes], object_name: str, file_length: int) -> Optional[str]:
         """
         Uploads a file (from a file-like object) to the specified MinIO bucket.
-        Creates the bucket if it doesn't already exist.
+        Files larger than MINIO_PART_SIZE are sent as a multipart upload with
+        MINIO_PARALLEL_UPLOADS parts in flight, read from `file_data` one part
+        at a time.
 
         Args:
             file_data (IO[bytes]): File-like object containing the data to upload.
@@ -52,35 +171,61 @@ class MinioMetadataManager:
         Returns:
             Optional[str]: ETag of the uploaded object on success, None otherwise.
         """
-        if not self.minio_client:
-            logger.warning("Minio client not initialized.")
+        if not self.ensure_bucket():
             return None
 
+        started = time.perf_counter()
         try:
-            # Check if the bucket exists, create it if not
-            found = self.minio_client.bucket_exists(MINIO_BUCKET)
-            if not found:
-                self.minio_client.make_bucket(MINIO_BUCKET)
-                logger.info(f"Bucket '{MINIO_BUCKET}' created.")
-            else:
-                logger.info(f"Bucket '{MINIO_BUCKET}' already exists.")
-
-            # Upload the file using put_object
             result = self.minio_client.put_object(
-                MINIO_BUCKET, object_name, file_data, length=file_length
+                MINIO_BUCKET, object_name, file_data, length=file_length,
+                part_size=MINIO_PART_SIZE, num_parallel_uploads=MINIO_PARALLEL_UPLOADS
             )
+            seconds = time.perf_counter() - started
+            upload_stats.record(file_length, seconds)
+            metrics.observe_stage(metrics.STAGE_MINIO_PUT, seconds)
             logger.info(
-                f"File-like object uploaded as '{object_name}' to bucket '{MINIO_BUCKET}'. "
-                f"ETag: {result.etag}"
+                f"File-like object uploaded as '{object_name}' to bucket '{MINIO_BUCKET}' in {seconds:.3f}s "
+                f"({mb_per_second(file_length, seconds):.1f} MB/s). ETag: {result.etag}"
             )
             return result.etag
         except S3Error as e:
+            upload_stats.record(file_length, 0.0, failed=True)
             logger.error(f"MinIO S3 Error during file upload: {e}")
             return None
         except Exception as e:
+            upload_stats.record(file_length, 0.0, failed=True)
             logger.error(f"An unexpected error occurred during file upload: {e}")
             return None
 
+    def download_file(self, object_name: str) -> Optional[bytes]:
+        """
+        Downloads the full content of an object from MinIO.
+
+        Args:
+            object_name (str): Name of the object in MinIO.
+
+        Returns:
+            Optional[bytes]: Object content on success, None otherwise.
+        """
+        if not self.minio_client:
+            logger.warning("Minio client not initialized.")
+            return None
+
+        response = None
+        try:
+            response = self.minio_client.get_object(MINIO_BUCKET, object_name)
+            return response.read()
+        except S3Error as e:
+            logger.error(f"MinIO S3 Error during file download: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"An unexpected error occurred during file download: {e}")
+            return None
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+
     def get_file_info(self, object_name: str) -> Optional[dict]:
         """
         Retrieves metadata of a file from MinIO.
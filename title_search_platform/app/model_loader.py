@@ -1,4 +1,250 @@
-from sentence_transformers import SentenceTransformer
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
 
-# Load once at import time
-model = SentenceTransformer("all-MiniLM-L6-v2")
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+# Comma-separated models to load in main.on_startup; empty means load on first use.
+MODEL_WARMUP = [name.strip() for name in os.getenv("MODEL_WARMUP", "embedding").split(",") if name.strip()]
+# Batch size for model.encode; sentences are length-sorted before batching.
+ENCODE_BATCH_SIZE = int(os.getenv("ENCODE_BATCH_SIZE", "32"))
+# Batch size for encoding whole documents (the classifier's embedding
+# fallback); they fill the 256 word piece window, so smaller batches pay off.
+CLASSIFY_ENCODE_BATCH_SIZE = int(os.getenv("CLASSIFY_ENCODE_BATCH_SIZE", str(ENCODE_BATCH_SIZE)))
+# "int8" applies dynamic quantization to the embedding model's Linear layers
+# (int8 weights, activations quantized on the fly) for faster CPU inference;
+# "none" keeps fp32. Check the trade-off with benchmarks.quantization.
+EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "none").lower()
+QUANTIZE_MODES = ("none", "int8")
+# torch intra-op / inter-op threads per process; 0 keeps torch's default
+# (all cores). With CPU_EXECUTOR_WORKERS encodes running at once, about
+# cores / CPU_EXECUTOR_WORKERS avoids oversubscribing the CPU.
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "0"))
+# Directory for persisted embeddings of static strings (prompts, reference texts).
+EMBEDDING_CACHE_DIR = Path(os.getenv("EMBEDDING_CACHE_DIR", str(Path(__file__).parent / ".embedding_cache")))
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _parameter_bytes(model: Any) -> int:
+    # torch modules report their weights exactly; anything else reports 0.
+    # The state dict also holds the packed weights of quantized layers, which
+    # are neither parameters nor buffers.
+    try:
+        state = model.state_dict()
+    except Exception:
+        return 0
+    total = 0
+    for value in state.values():
+        for tensor in (value if isinstance(value, tuple) else (value,)):
+            if hasattr(tensor, "element_size"):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class ModelRegistry:
+    """
+    Loads each registered model at most once per process.
+
+    Models are loaded lazily on the first `get`, or eagerly via `warm_up`.
+    FastAPI startup hooks run in each worker after it is forked, so weights
+    are only shared copy-on-write between workers when `warm_up` runs in
+    the parent before the fork, as app/gunicorn_conf.py does.
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._stats: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        self._loaders[name] = loader
+
+    def get(self, name: str) -> Any:
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                if name not in self._loaders:
+                    raise KeyError(f"No model registered under '{name}'.")
+                rss_before = _rss_bytes()
+                started = time.perf_counter()
+                model = self._loaders[name]()
+                load_seconds = time.perf_counter() - started
+                self._stats[name] = {
+                    "load_seconds": round(load_seconds, 3),
+                    "parameter_bytes": _parameter_bytes(model),
+                    "rss_delta_bytes": max(0, _rss_bytes() - rss_before),
+                    "loaded_at": time.time(),
+                }
+                self._models[name] = model
+                logger.info(f"Loaded model '{name}' in {load_seconds:.2f}s")
+        return model
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def warm_up(self, names: Optional[List[str]] = None) -> None:
+        for name in (MODEL_WARMUP if names is None else names):
+            self.get(name)
+
+    def stats(self) -> dict:
+        return {
+            "process_rss_bytes": _rss_bytes(),
+            "settings": {
+                "embedding_quantize": EMBEDDING_QUANTIZE,
+                "torch_num_threads": _torch_threads(),
+                "encode_batch_size": ENCODE_BATCH_SIZE,
+                "classify_encode_batch_size": CLASSIFY_ENCODE_BATCH_SIZE,
+            },
+            "models": {
+                name: {"loaded": name in self._models, **self._stats.get(name, {})}
+                for name in self._loaders
+            },
+        }
+
+
+_threads_configured = False
+
+
+def configure_torch_threads() -> None:
+    """Applies TORCH_NUM_THREADS / TORCH_INTEROP_THREADS once per process."""
+    global _threads_configured
+    if _threads_configured:
+        return
+    import torch
+    if TORCH_NUM_THREADS > 0:
+        torch.set_num_threads(TORCH_NUM_THREADS)
+    if TORCH_INTEROP_THREADS > 0:
+        try:
+            # Only allowed before the first parallel op runs
+            torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+        except RuntimeError as e:
+            logger.warning(f"Could not set torch inter-op threads: {e}")
+    _threads_configured = True
+
+
+def _torch_threads() -> Optional[int]:
+    if not _threads_configured:
+        return None
+    import torch
+    return torch.get_num_threads()
+
+
+def quantize_int8(model):
+    """
+    Dynamic int8 quantization of every torch.nn.Linear (the attention and
+    feed-forward projections, nearly all of MiniLM's compute). Embeddings
+    and LayerNorm stay fp32.
+    """
+    import torch
+    model.eval()
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_sentence_transformer(quantize: str = EMBEDDING_QUANTIZE):
+    if quantize not in QUANTIZE_MODES:
+        raise ValueError(f"Unknown EMBEDDING_QUANTIZE '{quantize}'. Choose from {QUANTIZE_MODES}.")
+    from sentence_transformers import SentenceTransformer
+    configure_torch_threads()
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu" if quantize == "int8" else None)
+    if quantize == "int8":
+        # Quantized Linear kernels run on CPU only
+        model = quantize_int8(model)
+    return model
+
+
+def _load_embedding_model():
+    return load_sentence_transformer(EMBEDDING_QUANTIZE)
+
+
+registry = ModelRegistry()
+registry.register("embedding", _load_embedding_model)
+
+
+def get_embedding_model():
+    return registry.get("embedding")
+
+
+_static_embeddings: Dict[str, Any] = {}
+_static_lock = threading.Lock()
+
+
+def _embedding_fingerprint(texts: List[str]) -> str:
+    try:
+        from sentence_transformers import __version__ as st_version
+    except ImportError:
+        st_version = "unknown"
+    payload = {"model": EMBEDDING_MODEL_NAME, "library": st_version, "texts": texts}
+    if EMBEDDING_QUANTIZE != "none":
+        # Quantized embeddings differ slightly; fp32 keys stay as they were
+        payload["quantize"] = EMBEDDING_QUANTIZE
+    payload = json.dumps(payload)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_static_embeddings(texts: List[str]):
+    """
+    Returns the embedding matrix (one row per text) for a fixed list of strings.
+
+    Matrices are computed once per process and persisted to EMBEDDING_CACHE_DIR.
+    The cache key covers the model name, library version and the exact texts,
+    so editing a prompt or reference dictionary invalidates it automatically.
+    """
+    import numpy as np
+    import torch
+
+    key = _embedding_fingerprint(texts)
+    cached = _static_embeddings.get(key)
+    if cached is not None:
+        return cached
+
+    with _static_lock:
+        cached = _static_embeddings.get(key)
+        if cached is not None:
+            return cached
+
+        path = EMBEDDING_CACHE_DIR / f"{key}.npy"
+        matrix = None
+        if path.exists():
+            try:
+                matrix = np.load(path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable embedding cache {path}: {e}")
+        if matrix is None or matrix.shape[0] != len(texts):
+            matrix = get_embedding_model().encode(texts, convert_to_numpy=True)
+            try:
+                EMBEDDING_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+                with open(tmp_path, "wb") as f:
+                    np.save(f, matrix)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Could not persist embedding cache {path}: {e}")
+
+        cached = torch.from_numpy(matrix)
+        _static_embeddings[key] = cached
+        return cached
+
+
+def __getattr__(name: str) -> Any:
+    # Backwards compatible `from app.model_loader import model`, loaded on access.
+    if name == "model":
+        return get_embedding_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,61 @@
+import os
+from pathlib import Path
+from typing import Dict, List
+
+from app.model_loader import registry
+
+# Trained tok2vec + NER pipeline from app/training (see config.cfg there)
+NER_MODEL_PATH = os.getenv("NER_MODEL_PATH", str(Path(__file__).parent / "training" / "output" / "model-best"))
+NER_BATCH_SIZE = int(os.getenv("NER_BATCH_SIZE", "32"))
+NER_N_PROCESS = int(os.getenv("NER_N_PROCESS", "1"))
+# Only these components run at inference time; anything else in the pipeline is disabled.
+NER_COMPONENTS = ("tok2vec", "ner")
+
+
+def _load_ner_model():
+    import spacy
+    nlp = spacy.load(NER_MODEL_PATH)
+    nlp.select_pipes(enable=[name for name in NER_COMPONENTS if name in nlp.pipe_names])
+    return nlp
+
+
+registry.register("ner", _load_ner_model)
+
+
+def get_ner_model():
+    return registry.get("ner")
+
+
+def extract_spans(texts: List[str]) -> List[List[dict]]:
+    """
+    Runs the NER pipeline over many texts with nlp.pipe.
+
+    Returns:
+        List[List[dict]]: Per text, the entity spans with their label, text
+        and character offsets into that text.
+    """
+    nlp = get_ner_model()
+    results = []
+    for doc in nlp.pipe(texts, batch_size=NER_BATCH_SIZE, n_process=NER_N_PROCESS):
+        results.append([
+            {"label": ent.label_, "text": ent.text, "start": ent.start_char, "end": ent.end_char}
+            for ent in doc.ents
+        ])
+    return results
+
+
+def extract_entities_ner_batch(texts: List[str], doc_types: List[str]) -> List[Dict[str, List[dict]]]:
+    """
+    NER extractor backend. Spans are grouped by lower-cased label, so
+    RECORDING_DATE spans land under "recording_date" like the semantic
+    backend's keys. The model covers every document type.
+    """
+    extracted = []
+    for spans in extract_spans(texts):
+        entities: Dict[str, List[dict]] = {}
+        for span in spans:
+            entities.setdefault(span["label"].lower(), []).append(
+                {"text": span["text"], "start": span["start"], "end": span["end"]}
+            )
+        extracted.append(entities)
+    return extracted
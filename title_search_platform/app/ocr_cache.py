@@ -0,0 +1,157 @@
+import os
+import fcntl
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# In-memory LRU entries per process (OCR text is small, a few KB per page)
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "2048"))
+# On-disk tier shared by all worker processes on the node; empty disables it.
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", str(Path(__file__).parent / ".ocr_cache"))
+# Disk space the on-disk tier may use. Past it, the least recently used
+# files are removed until it is back under 90% of the limit.
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(256 * 2 ** 20)))
+# Each process checks the size of the on-disk tier on its first write and
+# then after every this many writes.
+OCR_CACHE_SWEEP_WRITES = int(os.getenv("OCR_CACHE_SWEEP_WRITES", "256"))
+
+
+class OCRCache:
+    """
+    Two-tier cache of OCR output keyed by the rendered page raster.
+
+    The key hashes the raw pixels together with the OCR settings (lang,
+    dpi), so identical pages (cover sheets, notary pages, recording stamps,
+    re-uploaded amendments) skip tesseract even across different files.
+    Hit rates are reported by page_extractor.extraction_stats, which
+    counts them in the worker processes that do the OCR.
+    """
+
+    def __init__(self, max_entries: int = OCR_CACHE_SIZE, directory: Optional[str] = OCR_CACHE_DIR,
+                 max_disk_bytes: int = OCR_CACHE_MAX_BYTES, sweep_writes: int = OCR_CACHE_SWEEP_WRITES):
+        self.max_entries = max_entries
+        self.directory = Path(directory) if directory else None
+        self.max_disk_bytes = max_disk_bytes
+        self.sweep_writes = sweep_writes
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Starts due, so a process sweeps a directory left over-size before adding to it
+        self._writes_since_sweep = sweep_writes
+
+    @staticmethod
+    def key(samples: bytes, width: int, height: int, lang: str, dpi: int) -> str:
+        digest = hashlib.sha256(f"{lang}|{dpi}|{width}x{height}|".encode("utf-8"))
+        digest.update(samples)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.txt"
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached OCR text, or None on a miss. Disk hits are
+        promoted into the in-memory tier, and their file's mtime is bumped
+        so the sweep removes it last.
+        """
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                return text
+
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            text = path.read_text(encoding="utf-8")
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"OCR cache read failed for {key}: {e}")
+            return None
+        self._remember(key, text)
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        self._remember(key, text)
+        if self.directory is None:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(text, encoding="utf-8")
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"OCR cache write failed for {key}: {e}")
+            return
+        with self._lock:
+            self._writes_since_sweep += 1
+            if self._writes_since_sweep < self.sweep_writes:
+                return
+            self._writes_since_sweep = 0
+        try:
+            self.sweep()
+        except OSError as e:
+            logger.warning(f"OCR cache sweep failed: {e}")
+
+    def sweep(self) -> None:
+        """
+        Removes the least recently used files of the on-disk tier until it
+        uses less than 90% of max_disk_bytes, if it uses more than all of
+        it. One process sweeps at a time; the others skip while it does.
+        """
+        if self.directory is None or self.max_disk_bytes <= 0:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / ".sweep.lock", "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            files = []
+            used = 0
+            for shard in os.scandir(self.directory):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    # Allocated blocks: a few hundred bytes of text still take a whole block on disk
+                    size = stat.st_blocks * 512
+                    files.append((stat.st_mtime, size, entry.path))
+                    used += size
+            if used <= self.max_disk_bytes:
+                return
+            target = self.max_disk_bytes * 0.9
+            removed = 0
+            for _, size, path in sorted(files):
+                if used <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                used -= size
+                removed += 1
+            logger.info(f"OCR cache sweep removed {removed} files; {used / 2 ** 20:.1f} MiB left")
+
+    def _remember(self, key: str, text: str) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+ocr_cache = OCRCache()
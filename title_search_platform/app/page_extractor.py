@@ -0,0 +1,362 @@
+import os
+import time
+import logging
+import tempfile
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Iterator, List, NamedTuple, Optional, Tuple, Union
+
+import fitz  # PyMuPDF
+import pytesseract
+from PIL import Image
+
+from app import metrics
+from app.ocr_cache import ocr_cache
+
+logger = logging.getLogger(__name__)
+
+# Number of worker processes used for page extraction. OCR is CPU bound and
+# holds the GIL for the pixmap work, so pages are fanned out to processes.
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+# Documents with fewer pages than this are extracted in-process.
+OCR_PARALLEL_MIN_PAGES = int(os.getenv("OCR_PARALLEL_MIN_PAGES", "4"))
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+# OCR render resolution: 300 dpi is the ceiling; oversized pages are rendered
+# at a lower dpi so the raster stays within OCR_MAX_PIXELS (letter @ 300 dpi).
+OCR_MAX_DPI = int(os.getenv("OCR_MAX_DPI", "300"))
+OCR_MIN_DPI = int(os.getenv("OCR_MIN_DPI", "150"))
+OCR_MAX_PIXELS = int(os.getenv("OCR_MAX_PIXELS", str(2550 * 3300)))
+
+# A PDF given as bytes, or the path of a PDF on disk
+PdfSource = Union[bytes, str]
+
+# Guards creating, replacing, submitting to and shutting down the shared pool,
+# which the CPU executor's threads use concurrently
+_pool_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+
+# Totals over every page yielded by iter_pages in this process
+_stats_lock = threading.Lock()
+_stats = {
+    "pages": {"text": 0, "ocr": 0, "error": 0},
+    "seconds": {"total": 0.0, "classify": 0.0, "render": 0.0, "ocr": 0.0},
+    "ocr_cache": {"hit": 0, "miss": 0},
+}
+
+
+def _record_stats(record: "PageRecord") -> None:
+    timings = record.timings or {}
+    with _stats_lock:
+        _stats["pages"][record.method] = _stats["pages"].get(record.method, 0) + 1
+        _stats["seconds"]["total"] += record.seconds
+        _stats["seconds"]["classify"] += timings.get("classify_seconds", 0.0)
+        _stats["seconds"]["render"] += timings.get("render_seconds", 0.0)
+        _stats["seconds"]["ocr"] += timings.get("ocr_seconds", 0.0)
+        if "ocr_cache" in timings:
+            _stats["ocr_cache"][timings["ocr_cache"]] += 1
+    metrics.PAGES.inc(record.method)
+    if record.method == "ocr":
+        metrics.observe_stage(metrics.STAGE_PAGE_RENDER, timings.get("render_seconds", 0.0))
+        metrics.observe_stage(metrics.STAGE_PAGE_OCR, timings.get("ocr_seconds", 0.0))
+        if "ocr_cache" in timings:
+            metrics.count_cache("ocr", timings["ocr_cache"] == "hit")
+    elif record.method == "text":
+        metrics.observe_stage(metrics.STAGE_PAGE_TEXT, record.seconds)
+
+
+def extraction_stats() -> dict:
+    """
+    Page counts per method, summed seconds per extraction phase and OCR
+    cache hits/misses, totalled over pages from every worker process.
+    """
+    with _stats_lock:
+        return {
+            "pages": dict(_stats["pages"]),
+            "seconds": {k: round(v, 4) for k, v in _stats["seconds"].items()},
+            "ocr_cache": dict(_stats["ocr_cache"]),
+        }
+
+
+def classify_page(page: fitz.Page) -> Tuple[bool, str]:
+    """
+    Decides whether a page needs OCR, parsing its text layer only once.
+
+    Returns:
+        Tuple[bool, str]: Whether the page is scanned, and its stripped text
+        layer (reused as the page text when it is not scanned).
+    """
+    textpage = page.get_textpage()
+    text = page.get_text("text", textpage=textpage).strip()
+    if len(text) > 30:
+        return False, text
+    blocks = page.get_text("dict", textpage=textpage)["blocks"]
+    has_text_blocks = any(block.get("type") == 0 for block in blocks)
+    if has_text_blocks:
+        return False, text
+    has_images = len(page.get_images(full=True)) > 0
+    return has_images or not text, text
+
+
+def is_scanned_page(page: fitz.Page) -> bool:
+    return classify_page(page)[0]
+
+
+def ocr_dpi(page: fitz.Page) -> int:
+    """
+    Render resolution for OCR: OCR_MAX_DPI for ordinary page sizes, scaled
+    down for oversized pages (plats, surveys) so the raster stays within
+    OCR_MAX_PIXELS, but never below OCR_MIN_DPI.
+    """
+    width_in = page.rect.width / 72
+    height_in = page.rect.height / 72
+    area = width_in * height_in
+    if area <= 0:
+        return OCR_MAX_DPI
+    fitting_dpi = int((OCR_MAX_PIXELS / area) ** 0.5)
+    return max(OCR_MIN_DPI, min(OCR_MAX_DPI, fitting_dpi))
+
+
+def ocr_page(page: fitz.Page, timings: dict) -> str:
+    """
+    Renders the page straight to an 8-bit grayscale raster and hands the raw
+    buffer to tesseract, without a PNG encode/decode round-trip.
+    """
+    dpi = ocr_dpi(page)
+    started = time.perf_counter()
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    samples = pix.samples
+    rendered = time.perf_counter()
+    timings["dpi"] = dpi
+    timings["render_seconds"] = rendered - started
+
+    # Identical rasters (boilerplate pages, re-uploads) skip tesseract entirely
+    cache_key = ocr_cache.key(samples, pix.width, pix.height, OCR_LANG, dpi)
+    ocr_text = ocr_cache.get(cache_key)
+    if ocr_text is not None:
+        timings["ocr_cache"] = "hit"
+        timings["ocr_seconds"] = time.perf_counter() - rendered
+        return ocr_text
+
+    img = Image.frombytes("L", (pix.width, pix.height), samples, "raw", "L", pix.stride)
+    ocr_text = pytesseract.image_to_string(img, lang=OCR_LANG)
+    ocr_cache.put(cache_key, ocr_text)
+    timings["ocr_cache"] = "miss"
+    timings["ocr_seconds"] = time.perf_counter() - rendered
+    return ocr_text
+
+
+class PageRecord(NamedTuple):
+    """One extracted page, as yielded by iter_pages."""
+    page_number: int  # 1-based
+    method: str       # "text", "ocr" or "error"
+    text: str
+    seconds: float
+    # Per-phase breakdown: classify_seconds, and render_seconds / ocr_seconds / dpi / ocr_cache for OCR pages
+    timings: Optional[dict] = None
+
+    @property
+    def segment(self) -> str:
+        """The page as it appears in the concatenated extract_text_hybrid output."""
+        if self.method == "ocr":
+            return f"--- Page {self.page_number} (OCR) ---\n{self.text}\n\n"
+        if self.method == "text":
+            return f"--- Page {self.page_number} (Text) ---\n{self.text}\n\n"
+        return f"--- Page {self.page_number} ---\n[Error: {self.text}]\n\n"
+
+
+def extract_page(page: fitz.Page, page_index: int) -> PageRecord:
+    """
+    Extracts a single page, falling back to OCR for scanned pages.
+    Errors are contained in the returned record (rendered as an `[Error: ...]` marker).
+    """
+    started = time.perf_counter()
+    timings = {}
+    try:
+        scanned, text = classify_page(page)
+        timings["classify_seconds"] = time.perf_counter() - started
+        if scanned:
+            ocr_text = ocr_page(page, timings)
+            return PageRecord(page_index + 1, "ocr", ocr_text.strip(), time.perf_counter() - started, timings)
+        return PageRecord(page_index + 1, "text", text, time.perf_counter() - started, timings)
+    except Exception as err:
+        return PageRecord(page_index + 1, "error", str(err), time.perf_counter() - started, timings)
+
+
+def _error_records(start: int, stop: int, err: Exception) -> List[PageRecord]:
+    return [PageRecord(i + 1, "error", str(err), 0.0) for i in range(start, stop)]
+
+
+def open_pdf(source: PdfSource) -> fitz.Document:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source, filetype="pdf")
+
+
+@contextmanager
+def pdf_path(source: PdfSource) -> Iterator[str]:
+    """
+    A path to the PDF on disk for worker processes. Paths are used as is;
+    bytes are written to a temporary file once, so workers receive a path
+    instead of a pickled copy of the document per chunk.
+    """
+    if not isinstance(source, (bytes, bytearray, memoryview)):
+        yield os.fspath(source)
+        return
+    with tempfile.NamedTemporaryFile(prefix="pages-", suffix=".pdf", delete=False) as f:
+        f.write(source)
+    try:
+        yield f.name
+    finally:
+        os.unlink(f.name)
+
+
+def extract_page_range(path: str, start: int, stop: int) -> List[PageRecord]:
+    """
+    Worker entry point: opens the PDF at `path` and extracts pages [start, stop).
+    """
+    try:
+        doc = fitz.open(path, filetype="pdf")
+    except Exception as err:
+        return _error_records(start, stop, err)
+    try:
+        return [extract_page(doc[i], i) for i in range(start, stop)]
+    finally:
+        doc.close()
+
+
+def _get_pool_locked(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+        _pool_workers = workers
+    return _pool
+
+
+def _shutdown_pool_locked(wait: bool) -> None:
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown(wait=wait)
+        _pool = None
+        _pool_workers = 0
+
+
+def get_page_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Returns the shared page extraction pool, (re)creating it for a new size.
+    Workers are spawned rather than forked so they do not inherit the
+    API process's loaded models and threads.
+    """
+    with _pool_lock:
+        return _get_pool_locked(workers)
+
+
+def submit_pages(workers: int, path: str, start: int, stop: int) -> Future:
+    """
+    Submits pages [start, stop) of the PDF at `path` to the shared pool.
+    Submitting holds the pool lock, so another thread cannot shut the pool
+    down in between. A pool broken by a crashed worker is replaced and the
+    submit retried once.
+    """
+    with _pool_lock:
+        try:
+            return _get_pool_locked(workers).submit(extract_page_range, path, start, stop)
+        except BrokenProcessPool:
+            logger.warning("Page worker pool is broken; starting a new one")
+            _shutdown_pool_locked(wait=False)
+            return _get_pool_locked(workers).submit(extract_page_range, path, start, stop)
+
+
+def shutdown_page_pool() -> None:
+    with _pool_lock:
+        _shutdown_pool_locked(wait=True)
+
+
+def _page_chunks(total_pages: int, workers: int) -> List[Tuple[int, int]]:
+    # A few chunks per worker keeps the pool busy when OCR pages cluster.
+    chunk_size = max(1, -(-total_pages // (workers * 4)))
+    return [(start, min(start + chunk_size, total_pages)) for start in range(0, total_pages, chunk_size)]
+
+
+def count_pages(source: PdfSource) -> int:
+    doc = open_pdf(source)
+    try:
+        return len(doc)
+    finally:
+        doc.close()
+
+
+def iter_pages(source: PdfSource, workers: Optional[int] = None) -> Iterator[PageRecord]:
+    """
+    Yields one PageRecord per page, in page order, as pages finish.
+
+    Only a bounded window of page chunks is in flight at a time, so memory
+    stays proportional to a few pages rather than the whole document.
+
+    Args:
+        source (PdfSource): Raw PDF content, or the path of the PDF on disk.
+        workers (Optional[int]): Worker process count. Defaults to OCR_WORKERS;
+            1 or less runs serially in the calling process.
+    """
+    workers = OCR_WORKERS if workers is None else workers
+    doc = open_pdf(source)
+    total_pages = len(doc)
+
+    if workers <= 1 or total_pages < OCR_PARALLEL_MIN_PAGES:
+        try:
+            for i in range(total_pages):
+                record = extract_page(doc[i], i)
+                _record_stats(record)
+                yield record
+        finally:
+            doc.close()
+        return
+    doc.close()
+
+    chunks = _page_chunks(total_pages, workers)
+    window = workers * 2
+    in_flight = deque()
+    next_chunk = 0
+    with pdf_path(source) as path:
+        try:
+            while next_chunk < len(chunks) or in_flight:
+                while next_chunk < len(chunks) and len(in_flight) < window:
+                    start, stop = chunks[next_chunk]
+                    try:
+                        future = submit_pages(workers, path, start, stop)
+                    except Exception as err:
+                        # Even a fresh pool failed; the chunk becomes error records like a failed worker
+                        future = Future()
+                        future.set_exception(err)
+                    in_flight.append((start, stop, future))
+                    next_chunk += 1
+                start, stop, future = in_flight.popleft()
+                try:
+                    records = future.result()
+                except Exception as err:
+                    logger.error(f"Page worker failed for pages {start+1}-{stop}: {err}")
+                    records = _error_records(start, stop, err)
+                for record in records:
+                    _record_stats(record)
+                    yield record
+        finally:
+            # Workers may still be reading the file; cancel what has not started yet
+            for _, _, future in in_flight:
+                future.cancel()
+
+
+def extract_pages(source: PdfSource, workers: Optional[int] = None) -> Tuple[int, List[str]]:
+    """
+    Extracts every page of a PDF, in page order.
+
+    Returns:
+        Tuple[int, List[str]]: Total page count and one text segment per page.
+    """
+    segments = [record.segment for record in iter_pages(source, workers=workers)]
+    return len(segments), segments
@@ -0,0 +1,150 @@
+import os
+import re
+import sys
+import time
+import logging
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# off: no middleware is installed at all; header: only requests sent with
+# an "X-Profile: 1" header are sampled; all: every request is sampled.
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "off").lower()
+# Profiles are written only for sampled requests at least this slow
+PROFILE_SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", "1.0"))
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", "0.005"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", str(Path(__file__).parent / ".profiles"))
+PROFILE_HEADER = "x-profile"
+
+_UNSAFE_FILENAME = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class Profile:
+    """Collapsed stacks sampled while one request was in flight."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for the threads of this process.
+
+    One background thread snapshots every thread's stack with
+    sys._current_frames() each PROFILE_INTERVAL_SECONDS while at least one
+    profile is active, and adds the collapsed stacks to every active
+    profile. Concurrent requests therefore also see each other's threads;
+    stacks are rooted at the thread name (e.g. cpu-exec_0) to tell them
+    apart. Page extraction worker processes are not sampled.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_SECONDS):
+        self.interval = interval
+        self._active: Dict[int, Profile] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._code_names: Dict[object, str] = {}
+
+    def start(self, name: str) -> Profile:
+        profile = Profile(name)
+        with self._lock:
+            self._active[id(profile)] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+                self._thread.start()
+        return profile
+
+    def stop(self, profile: Profile) -> float:
+        """Stops sampling for `profile` and returns its wall time in seconds."""
+        with self._lock:
+            self._active.pop(id(profile), None)
+        return time.perf_counter() - profile.started
+
+    def _frame_name(self, code) -> str:
+        name = self._code_names.get(code)
+        if name is None:
+            name = f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})".replace(";", ":")
+            self._code_names[code] = name
+        return name
+
+    def _sample(self) -> Counter:
+        stacks = Counter()
+        own_id = threading.get_ident()
+        threads = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            names = []
+            while frame is not None:
+                names.append(self._frame_name(frame.f_code))
+                frame = frame.f_back
+            names.append(threads.get(thread_id, str(thread_id)).replace(";", ":"))
+            stacks[";".join(reversed(names))] += 1
+        return stacks
+
+    def _sample_loop(self) -> None:
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                profiles = list(self._active.values())
+            stacks = self._sample()
+            for profile in profiles:
+                profile.stacks.update(stacks)
+                profile.samples += 1
+            time.sleep(self.interval)
+
+    def write(self, profile: Profile, seconds: float, directory: str = PROFILE_DIR) -> Path:
+        """
+        Writes the profile in collapsed-stack format ("frame;frame;frame count"
+        per line), as read by flamegraph.pl, speedscope and inferno.
+        """
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        name = _UNSAFE_FILENAME.sub("_", profile.name).strip("_")[:80]
+        path = Path(directory) / f"{stamp}-{name}-{int(seconds * 1000)}ms.folded"
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in profile.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+profiler = SamplingProfiler()
+
+
+def profiling_enabled() -> bool:
+    return PROFILE_REQUESTS in ("header", "all")
+
+
+def wants_profile(headers) -> bool:
+    if PROFILE_REQUESTS == "all":
+        return True
+    return PROFILE_REQUESTS == "header" and headers.get(PROFILE_HEADER, "") not in ("", "0")
+
+
+async def profile_request(request, call_next):
+    """
+    HTTP middleware: samples the request while it is handled and writes a
+    profile under PROFILE_DIR if it took at least PROFILE_SLOW_SECONDS.
+    A streamed response is profiled until its headers are sent.
+    """
+    if not wants_profile(request.headers):
+        return await call_next(request)
+    profile = profiler.start(f"{request.method}-{request.url.path}")
+    try:
+        return await call_next(request)
+    finally:
+        seconds = profiler.stop(profile)
+        if seconds >= PROFILE_SLOW_SECONDS and profile.samples:
+            try:
+                path = profiler.write(profile, seconds)
+                logger.warning(f"Slow request {request.method} {request.url.path} took {seconds:.2f}s; profile: {path}")
+            except OSError as e:
+                logger.error(f"Could not write request profile: {e}")
@@ -0,0 +1,332 @@
+import os
+import re
+import sqlite3
+import time
+import logging
+import datetime
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# SQLite FTS5 index over extracted text and entities. MySQL stays the source
+# of truth; rows missing from the index are added from it in the background.
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", str(Path(__file__).parent / ".search_index.sqlite3"))
+# Seconds between background syncs after the one at startup (0 = startup only)
+SEARCH_SYNC_INTERVAL = int(os.getenv("SEARCH_SYNC_INTERVAL", "600"))
+# Ids per IN (...) lookup; stays below SQLite's bound-parameter limit
+SEARCH_SYNC_LOOKUP_SIZE = 500
+SEARCH_MAX_PAGE_SIZE = 100
+# Matches ranked (and counted) per query, newest first; bounds latency for common terms.
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "10000"))
+# bm25 column weights for text, grantor, grantee and other entities
+BM25_WEIGHTS = "1.0, 4.0, 4.0, 2.0"
+
+# Entity fields with their own FTS column; all other entities share one column.
+ENTITY_COLUMNS = ("grantor", "grantee")
+
+MONTHS = {
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6, "july": 7,
+    "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+}
+_NUMERIC_DATE = re.compile(r"\b(\d{1,2})[/-](\d{1,2})[/-](\d{4})\b")
+_WRITTEN_DATE = re.compile(r"\b(" + "|".join(MONTHS) + r")\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})\b", re.IGNORECASE)
+_QUERY_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def entity_values(entities: Optional[dict]) -> Dict[str, str]:
+    """
+    Flattens extracted entities to one string per field. Semantic entities
+    are already strings; NER entities are lists of spans.
+    """
+    values = {}
+    for name, value in (entities or {}).items():
+        if isinstance(value, list):
+            value = "; ".join(span.get("text", "") if isinstance(span, dict) else str(span) for span in value)
+        if value:
+            values[name] = str(value)
+    return values
+
+
+def parse_date(text: str) -> Optional[str]:
+    """
+    First date found in `text` (MM/DD/YYYY or "May 23, 2025"), as an ISO
+    date string, or None.
+    """
+    if not text:
+        return None
+    candidates = []
+    match = _NUMERIC_DATE.search(text)
+    if match:
+        month, day, year = (int(g) for g in match.groups())
+        candidates.append((match.start(), year, month, day))
+    match = _WRITTEN_DATE.search(text)
+    if match:
+        candidates.append((match.start(), int(match.group(3)), MONTHS[match.group(1).lower()], int(match.group(2))))
+    for _, year, month, day in sorted(candidates):
+        try:
+            return datetime.date(year, month, day).isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def to_match_query(query: str) -> str:
+    """
+    Turns free text into an FTS5 query that ANDs the quoted terms, so user
+    input can never be parsed as FTS5 syntax.
+    """
+    return " ".join(f'"{term}"' for term in _QUERY_TERM.findall(query))
+
+
+class SearchIndex:
+    """
+    Full-text and metadata index of uploaded documents.
+
+    Text, grantor, grantee and the remaining entities are FTS5 columns
+    ranked with bm25; document type, recording date and upload time live in
+    a regular table with indexes for filtering. The rowid is the
+    FileUpload id.
+    """
+
+    def __init__(self, path: str = SEARCH_INDEX_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._init_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._connection()
+        with self._write_lock, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " id INTEGER PRIMARY KEY, filename TEXT, document_type TEXT,"
+                " recording_date TEXT, uploaded_time TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_documents_type_recorded ON documents (document_type, recording_date)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_documents_recorded ON documents (recording_date)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_documents_uploaded ON documents (uploaded_time)")
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5("
+                " text, grantor, grantee, entities, tokenize='unicode61 remove_diacritics 2')"
+            )
+
+    def index_documents(self, documents: Iterable[dict]) -> int:
+        """
+        Adds or replaces documents in one transaction.
+
+        Each document is a dict with id, filename, document_type,
+        uploaded_time, extracted_text and extracted_entities.
+
+        Returns:
+            int: Number of documents indexed.
+        """
+        meta_rows, fts_rows = [], []
+        for doc in documents:
+            values = entity_values(doc.get("extracted_entities"))
+            uploaded = doc.get("uploaded_time")
+            meta_rows.append((
+                doc["id"],
+                doc.get("filename"),
+                doc.get("document_type"),
+                parse_date(values.get("recording_date", "")),
+                uploaded.isoformat() if isinstance(uploaded, datetime.datetime) else uploaded,
+            ))
+            others = " ".join(v for k, v in values.items() if k not in ENTITY_COLUMNS)
+            fts_rows.append((
+                doc["id"], doc.get("extracted_text") or "",
+                values.get("grantor", ""), values.get("grantee", ""), others,
+            ))
+        if not meta_rows:
+            return 0
+
+        conn = self._connection()
+        with self._write_lock, conn:
+            conn.executemany("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)", meta_rows)
+            conn.executemany("DELETE FROM documents_fts WHERE rowid = ?", [(row[0],) for row in fts_rows])
+            conn.executemany(
+                "INSERT INTO documents_fts (rowid, text, grantor, grantee, entities) VALUES (?, ?, ?, ?, ?)",
+                fts_rows,
+            )
+        return len(meta_rows)
+
+    def max_indexed_id(self) -> int:
+        row = self._connection().execute("SELECT COALESCE(MAX(id), 0) FROM documents").fetchone()
+        return row[0]
+
+    def missing_ids(self, ids: List[int]) -> List[int]:
+        """The ids in `ids` that are not indexed, in their given order."""
+        conn = self._connection()
+        indexed = set()
+        for start in range(0, len(ids), SEARCH_SYNC_LOOKUP_SIZE):
+            chunk = ids[start:start + SEARCH_SYNC_LOOKUP_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            indexed.update(row[0] for row in conn.execute(f"SELECT id FROM documents WHERE id IN ({placeholders})", chunk))
+        return [doc_id for doc_id in ids if doc_id not in indexed]
+
+    def search(self, query: str = "", grantor: str = "", grantee: str = "", document_type: Optional[str] = None,
+               date_from: Optional[str] = None, date_to: Optional[str] = None, date_field: str = "recorded",
+               page: int = 1, page_size: int = 20) -> dict:
+        """
+        Ranked, filtered and paginated search.
+
+        Args:
+            query (str): Free text matched against text and all entity fields.
+            grantor (str): Terms that must appear in the grantor field.
+            grantee (str): Terms that must appear in the grantee field.
+            document_type (Optional[str]): Exact document type filter.
+            date_from (Optional[str]): Inclusive ISO date lower bound.
+            date_to (Optional[str]): Inclusive ISO date upper bound.
+            date_field (str): "recorded" (recording date entity) or "uploaded".
+            page (int): 1-based page number.
+            page_size (int): Results per page, at most SEARCH_MAX_PAGE_SIZE.
+
+        Returns:
+            dict: Hit count (capped at SEARCH_RANK_WINDOW, see total_exact),
+            the page and its results, best first.
+        """
+        page = max(1, page)
+        page_size = max(1, min(page_size, SEARCH_MAX_PAGE_SIZE))
+        date_column = "d.uploaded_time" if date_field == "uploaded" else "d.recording_date"
+
+        match_parts = []
+        if to_match_query(query):
+            match_parts.append(f"({to_match_query(query)})")
+        for column, terms in (("grantor", grantor), ("grantee", grantee)):
+            if to_match_query(terms):
+                match_parts.append(f"{column} : ({to_match_query(terms)})")
+
+        where, params = [], []
+        if match_parts:
+            where.append("documents_fts MATCH ?")
+            params.append(" AND ".join(match_parts))
+        if document_type:
+            where.append("d.document_type = ?")
+            params.append(document_type)
+        if date_from:
+            where.append(f"{date_column} >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append(f"{date_column} <= ?")
+            # Upload times carry a time part; include the whole last day
+            params.append(date_to + "T23:59:59.999999" if date_field == "uploaded" else date_to)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+        # Candidates are the newest SEARCH_RANK_WINDOW matches, read in rowid
+        # order straight off the FTS doclists, so scoring and counting stay
+        # bounded however common the terms are. CROSS JOIN keeps FTS as the
+        # outer loop; otherwise SQLite may drive the join from the type index
+        # and run the MATCH once per row.
+        if match_parts:
+            # Only metadata filters need the documents table here
+            joined = len(where) > 1
+            candidates = (
+                f"SELECT documents_fts.rowid AS id, bm25(documents_fts, {BM25_WEIGHTS}) AS score FROM documents_fts "
+                + ("CROSS JOIN documents d ON d.id = documents_fts.rowid " if joined else "")
+                + f"{where_sql} ORDER BY documents_fts.rowid DESC LIMIT ?"
+            )
+        else:
+            candidates = f"SELECT d.id AS id, 0.0 AS score FROM documents d {where_sql} ORDER BY d.id DESC LIMIT ?"
+        # Metadata is only read for the rows of the requested page
+        sql = (
+            f"SELECT d.id, d.filename, d.document_type, d.recording_date, d.uploaded_time, c.score, c.total "
+            f"FROM (SELECT id, score, COUNT(*) OVER () AS total FROM ({candidates}) "
+            f"ORDER BY score, id DESC LIMIT ? OFFSET ?) c "
+            f"JOIN documents d ON d.id = c.id ORDER BY c.score, c.id DESC"
+        )
+        rows = self._connection().execute(
+            sql, params + [SEARCH_RANK_WINDOW, page_size, (page - 1) * page_size]
+        ).fetchall()
+
+        total = rows[0][6] if rows else self._count(candidates, params)
+        return {
+            "total": total,
+            # Past the window only a lower bound is known
+            "total_exact": total < SEARCH_RANK_WINDOW,
+            "page": page,
+            "page_size": page_size,
+            "results": [
+                {
+                    "db_id": row[0],
+                    "filename": row[1],
+                    "document_type": row[2],
+                    "recording_date": row[3],
+                    "uploaded_time": row[4],
+                    # bm25 is lower-is-better; flip it so higher scores rank first
+                    "score": -row[5] or 0.0,
+                }
+                for row in rows
+            ],
+        }
+
+    def _count(self, candidates: str, params: list) -> int:
+        # Only needed when the requested page is past the last hit
+        sql = f"SELECT COUNT(*) FROM ({candidates})"
+        return self._connection().execute(sql, params + [SEARCH_RANK_WINDOW]).fetchone()[0]
+
+
+_search_index: Optional[SearchIndex] = None
+_search_index_lock = threading.Lock()
+
+
+def get_search_index() -> SearchIndex:
+    global _search_index
+    if _search_index is None:
+        with _search_index_lock:
+            if _search_index is None:
+                _search_index = SearchIndex()
+    return _search_index
+
+
+def sync_from_db(batch_size: int = 10000) -> int:
+    """
+    Indexes every processed FileUpload row the index does not have: the ids
+    are compared batch by batch, so rows whose indexing failed at upload,
+    or that were written without indexing (bulk_ingest --no-index), are
+    picked up even when newer rows are already indexed. Returns the number
+    of documents indexed.
+    """
+    from app import db_manager
+
+    index = get_search_index()
+    indexed = 0
+    for ids in db_manager.db_metadata_manager.iter_document_ids(batch_size=batch_size):
+        missing = index.missing_ids(ids)
+        if missing:
+            indexed += index.index_documents(db_manager.db_metadata_manager.get_documents(missing))
+    return indexed
+
+
+def start_background_sync(interval: int = SEARCH_SYNC_INTERVAL) -> threading.Thread:
+    """
+    Runs sync_from_db in a daemon thread, so startup does not wait for it:
+    once right away, then every `interval` seconds (if positive). Searches
+    see the added documents as each batch is committed.
+    """
+    def run():
+        while True:
+            try:
+                indexed = sync_from_db()
+                if indexed:
+                    logger.info(f"Search index sync added {indexed} document(s)")
+            except Exception as e:
+                logger.error(f"Search index sync failed: {e}")
+            if interval <= 0:
+                return
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="search-index-sync", daemon=True)
+    thread.start()
+    return thread
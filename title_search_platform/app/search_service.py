@@ -0,0 +1,148 @@
+import datetime
+import logging
+from typing import Any, List, Optional
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from app.executors import cpu_executor, io_executor
+from app.model_loader import get_embedding_model
+from app.search_index import get_search_index, SEARCH_MAX_PAGE_SIZE
+from app.vector_index import get_vector_index, index_document_vectors, VECTOR_NPROBE
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+DATE_FIELDS = ("recorded", "uploaded")
+SIMILAR_LEVELS = ("document", "passage")
+SIMILAR_MODES = ("exact", "approximate")
+SIMILAR_MAX_K = 100
+
+
+class SearchHit(BaseModel):
+    db_id: int
+    filename: Optional[str] = None
+    document_type: Optional[str] = None
+    recording_date: Optional[str] = None
+    uploaded_time: Optional[str] = None
+    score: float
+
+
+class SearchResponse(BaseModel):
+    total: int
+    total_exact: bool
+    page: int
+    page_size: int
+    results: List[SearchHit]
+
+
+class SimilarHit(BaseModel):
+    db_id: int
+    score: float
+    text: Optional[str] = None
+
+
+class SimilarResponse(BaseModel):
+    level: str
+    mode: str
+    results: List[SimilarHit]
+
+
+def index_upload(db_id: int, filename: str, uploaded_time: datetime.datetime, document_type: Optional[str],
+                 extracted_text: Optional[str], extracted_entities: Optional[dict],
+                 sentences: Optional[List[str]] = None, sentence_embeddings: Any = None) -> None:
+    """
+    Adds a freshly logged upload to the search index and, when its sentence
+    embeddings were computed, to the vector indexes. Both are derived data,
+    so a failure here is logged rather than failing the upload; the
+    background search index sync adds a document missed here later.
+    """
+    try:
+        get_search_index().index_documents([{
+            "id": db_id,
+            "filename": filename,
+            "uploaded_time": uploaded_time,
+            "document_type": document_type,
+            "extracted_text": extracted_text,
+            "extracted_entities": extracted_entities,
+        }])
+    except Exception as e:
+        logger.error(f"Indexing record {db_id} for search failed: {e}")
+    if sentences and sentence_embeddings is not None:
+        try:
+            index_document_vectors(db_id, sentences, sentence_embeddings)
+        except Exception as e:
+            logger.error(f"Indexing vectors of record {db_id} failed: {e}")
+
+
+def find_similar(db_id: Optional[int], q: Optional[str], level: str, mode: str, k: int, nprobe: int) -> Optional[list]:
+    """
+    Top-k documents or passages closest to an indexed document (its pooled
+    vector) or to free text. Returns None if `db_id` has no vectors.
+    """
+    index = get_vector_index(level)
+    if db_id is not None:
+        query = get_vector_index("document").vectors_for(db_id)
+        if len(query) == 0:
+            return None
+        query = query[0]
+    else:
+        query = get_embedding_model().encode(q)
+    return index.search(query, k=k, approximate=mode == "approximate", nprobe=nprobe, exclude_id=db_id)
+
+
+@router.get("/", response_model=SearchResponse)
+async def search_documents(q: str = "", grantor: str = "", grantee: str = "", document_type: Optional[str] = None,
+                           date_from: Optional[datetime.date] = None, date_to: Optional[datetime.date] = None,
+                           date_field: str = "recorded", page: int = 1, page_size: int = 20):
+    """
+    Full-text search over extracted text and entities, ranked by bm25 with
+    grantor / grantee matches weighted highest. `document_type` and the
+    inclusive `date_from` / `date_to` range filter the hits; `date_field`
+    picks the recording date ("recorded") or the upload time ("uploaded").
+    Without any terms the filtered documents are listed newest first.
+    """
+    if date_field not in DATE_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Unknown date_field '{date_field}'. Use 'recorded' or 'uploaded'.")
+    if page < 1 or not 1 <= page_size <= SEARCH_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"page must be >= 1 and page_size between 1 and {SEARCH_MAX_PAGE_SIZE}.")
+
+    return await io_executor.run(
+        get_search_index().search,
+        query=q,
+        grantor=grantor,
+        grantee=grantee,
+        document_type=document_type,
+        date_from=date_from.isoformat() if date_from else None,
+        date_to=date_to.isoformat() if date_to else None,
+        date_field=date_field,
+        page=page,
+        page_size=page_size,
+    )
+
+
+@router.get("/similar/", response_model=SimilarResponse)
+async def similar_documents(db_id: Optional[int] = None, q: Optional[str] = None, level: str = "document",
+                            mode: str = "exact", k: int = 10, nprobe: int = VECTOR_NPROBE):
+    """
+    "Find similar instruments": the `k` uploads (level=document) or
+    sentences (level=passage) most similar to the upload `db_id` or to the
+    free text `q`, by cosine similarity of MiniLM embeddings. mode=exact
+    scans every vector; mode=approximate probes the `nprobe` nearest IVF
+    lists.
+    """
+    if (db_id is None) == (not q):
+        raise HTTPException(status_code=400, detail="Pass exactly one of db_id or q.")
+    if level not in SIMILAR_LEVELS:
+        raise HTTPException(status_code=400, detail=f"Unknown level '{level}'. Use 'document' or 'passage'.")
+    if mode not in SIMILAR_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown mode '{mode}'. Use 'exact' or 'approximate'.")
+    if not 1 <= k <= SIMILAR_MAX_K or nprobe < 1:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {SIMILAR_MAX_K} and nprobe >= 1.")
+
+    # Scoring (and encoding a free-text query) is CPU work
+    hits = await cpu_executor.run(find_similar, db_id, q, level, mode, k, nprobe)
+    if hits is None:
+        raise HTTPException(status_code=404, detail=f"No embeddings are indexed for record {db_id}.")
+    return SimilarResponse(level=level, mode=mode, results=hits)
+
@@ -1,29 +1,125 @@
-import sys
-import json
-import spacy
+"""
+Converts data/{mode}_data.json into sharded DocBin files under data/{mode}.spacy/.
+
+The input (JSON array, JSONL or a Label Studio export) is streamed and cut
+into shards of --shard-size records, which worker processes convert and
+write in parallel. spaCy reads a directory of .spacy files as one corpus,
+so `--paths.train data/train.spacy` keeps working.
+
+Spans that do not line up with token boundaries, or overlap another span,
+cannot be set on a Doc; they are counted per label and reported instead of
+being dropped silently.
+
+    python convert_to_spacy_format.py train --workers 4
+"""
+import os
+import argparse
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
 from pathlib import Path
+
+import spacy
 from spacy.tokens import DocBin
+from spacy.util import filter_spans
+
+from training_data import iter_records
+
+_nlp = None
+
+
+def convert_shard(records: list, output_file: str, alignment_mode: str) -> dict:
+    """Writes one DocBin shard and returns its record and span counts."""
+    global _nlp
+    if _nlp is None:
+        # Once per worker process
+        _nlp = spacy.blank("en")
+    db = DocBin()
+    stats = {"records": 0, "spans": 0, "misaligned": Counter(), "overlapping": Counter()}
+    for record in records:
+        doc = _nlp.make_doc(record["text"])
+        spans = []
+        for start, end, label in record["entities"]:
+            span = doc.char_span(start, end, label=label, alignment_mode=alignment_mode)
+            if span is None:
+                stats["misaligned"][label] += 1
+            else:
+                spans.append(span)
+        kept = filter_spans(spans)
+        for span in set(spans) - set(kept):
+            stats["overlapping"][span.label_] += 1
+        doc.ents = kept
+        db.add(doc)
+        stats["records"] += 1
+        stats["spans"] += len(kept)
+    db.to_disk(output_file)
+    return stats
+
+
+def iter_shards(records, shard_size: int):
+    while True:
+        shard = list(islice(records, shard_size))
+        if not shard:
+            return
+        yield shard
+
+
+def merge(total: dict, stats: dict) -> None:
+    for key, value in stats.items():
+        total[key] += value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    # Accept 'train' or 'dev' as command-line arg
+    parser.add_argument("mode", nargs="?", default="train")
+    parser.add_argument("--input", help="Defaults to data/{mode}_data.json.")
+    parser.add_argument("--output", help="Shard directory; defaults to data/{mode}.spacy.")
+    parser.add_argument("--shard-size", type=int, default=5000, help="Records per .spacy file.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="0 converts in this process.")
+    parser.add_argument("--alignment-mode", choices=["strict", "contract", "expand"], default="strict",
+                        help="How char_span snaps spans to token boundaries.")
+    args = parser.parse_args()
+
+    input_file = args.input or f"data/{args.mode}_data.json"
+    output_dir = Path(args.output or f"data/{args.mode}.spacy")
+    if output_dir.is_file():
+        # Written as a single DocBin by earlier versions of this script
+        output_dir.unlink()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for stale in output_dir.glob(f"{args.mode}-*.spacy"):
+        stale.unlink()
+
+    shards = iter_shards(iter_records([input_file]), args.shard_size)
+    total = {"records": 0, "spans": 0, "misaligned": Counter(), "overlapping": Counter()}
+    written = 0
+    if args.workers == 0:
+        for index, shard in enumerate(shards):
+            merge(total, convert_shard(shard, str(output_dir / f"{args.mode}-{index:05d}.spacy"), args.alignment_mode))
+            written += 1
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            # Read ahead only as far as the workers can take, so memory stays bounded
+            pending = set()
+            for index, shard in enumerate(shards):
+                if len(pending) >= 2 * args.workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        merge(total, future.result())
+                pending.add(pool.submit(
+                    convert_shard, shard, str(output_dir / f"{args.mode}-{index:05d}.spacy"), args.alignment_mode
+                ))
+                written += 1
+            for future in pending:
+                merge(total, future.result())
+
+    print(f"✅ Saved {total['records']} {args.mode} records ({total['spans']} spans) "
+          f"to {written} shard(s) in {output_dir}")
+    for name in ("misaligned", "overlapping"):
+        if total[name]:
+            by_label = ", ".join(f"{label}={count}" for label, count in total[name].most_common())
+            print(f"⚠️ Skipped {sum(total[name].values())} {name} span(s): {by_label}")
+
 
-# Accept 'train' or 'dev' as command-line arg
-mode = sys.argv[1] if len(sys.argv) > 1 else "train"
-input_file = f"data/{mode}_data.json"
-output_file = f"data/{mode}.spacy"
-
-nlp = spacy.blank("en")
-db = DocBin()
-
-with open(input_file, "r") as f:
-    training_data = json.load(f)
-
-for record in training_data:
-    doc = nlp.make_doc(record["text"])
-    ents = []
-    for start, end, label in record["entities"]:
-        span = doc.char_span(start, end, label=label)
-        if span:
-            ents.append(span)
-    doc.ents = ents
-    db.add(doc)
-
-db.to_disk(output_file)
-print(f"✅ Saved {mode} data to {output_file}")
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,17 @@
-import json
-import random
+"""
+Splits annotated examples into data/train_data.json and data/dev_data.json.
+
+Inputs are JSON or JSONL files of records or Label Studio exports; they are
+streamed, so the split never holds the whole export in memory. Without
+inputs, the sample examples below are split.
+
+    python prepare_training_data.py export.json more.jsonl --dev-ratio 0.2
+"""
+import argparse
 from pathlib import Path
 
+from training_data import JsonArrayWriter, iter_records, is_dev
+
 # ⚠️ Replace this list with more annotated examples later
 FULL_DATA = [
     {
@@ -22,21 +32,29 @@ FULL_DATA = [
     }
 ]
 
-# 🔀 Shuffle and split into 80/20 train/dev sets
-random.shuffle(FULL_DATA)
-split = int(len(FULL_DATA) * 0.8)
-train_data = FULL_DATA[:split]
-dev_data = FULL_DATA[split:]
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("inputs", nargs="*", help="JSON/JSONL records or Label Studio exports.")
+parser.add_argument("--dev-ratio", type=float, default=0.2, help="Share of examples for the dev set.")
+parser.add_argument("--seed", type=int, default=42, help="Changes which examples land in dev.")
+args = parser.parse_args()
+
+records = iter_records(args.inputs) if args.inputs else iter(FULL_DATA)
 
 # 📁 Write to /data/
 output_dir = Path(__file__).resolve().parent / "data"
 output_dir.mkdir(parents=True, exist_ok=True)
 
-with open(output_dir / "train_data.json", "w") as f:
-    json.dump(train_data, f, indent=2)
-
-with open(output_dir / "dev_data.json", "w") as f:
-    json.dump(dev_data, f, indent=2)
+# 🔀 Split by a hash of each text, streaming both files out
+train_writer = JsonArrayWriter(output_dir / "train_data.json")
+dev_writer = JsonArrayWriter(output_dir / "dev_data.json")
+try:
+    for record in records:
+        (dev_writer if is_dev(record, args.dev_ratio, args.seed) else train_writer).write(record)
+finally:
+    train_writer.close()
+    dev_writer.close()
 
-print(f"✅ Wrote {len(train_data)} training examples to data/train_data.json")
-print(f"✅ Wrote {len(dev_data)} dev examples to data/dev_data.json")
+print(f"✅ Wrote {train_writer.count} training examples to data/train_data.json")
+print(f"✅ Wrote {dev_writer.count} dev examples to data/dev_data.json")
+if not dev_writer.count or not train_writer.count:
+    print("⚠️ One of the sets is empty; add examples or change --seed / --dev-ratio.")
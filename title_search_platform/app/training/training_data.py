@@ -0,0 +1,152 @@
+"""
+Streaming readers and writers for NER training records.
+
+A record is {"text": ..., "entities": [[start, end, label], ...]}. Inputs
+may be a JSON array or JSONL of records, or a Label Studio export (JSON,
+JSON-MIN or JSONL); either way they are parsed one element at a time, so
+exports larger than memory can be split and converted.
+"""
+import json
+import hashlib
+from pathlib import Path
+from typing import IO, Iterable, Iterator, Optional
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+_decoder = json.JSONDecoder()
+# Characters that can continue a number, e.g. "12" + "34", "1." + "5", "1e" + "3"
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
+
+
+def _skip_whitespace(buffer: str, position: int) -> int:
+    while position < len(buffer) and buffer[position] in " \t\r\n":
+        position += 1
+    return position
+
+
+def iter_json_array(f: IO[str], chunk_size: int = READ_CHUNK_SIZE) -> Iterator[object]:
+    """Yields the elements of a top-level JSON array without reading the whole file."""
+    buffer, position, eof = "", 0, False
+
+    def fill() -> bool:
+        nonlocal buffer, position, eof
+        chunk = f.read(chunk_size)
+        buffer, position = buffer[position:] + chunk, 0
+        eof = not chunk
+        return bool(chunk)
+
+    fill()
+    position = _skip_whitespace(buffer, position)
+    # Leading whitespace may run past the first chunk
+    while position >= len(buffer) and fill():
+        position = _skip_whitespace(buffer, position)
+    if buffer[position:position + 1] != "[":
+        raise ValueError("Expected a JSON array.")
+    position += 1
+    while True:
+        position = _skip_whitespace(buffer, position)
+        if position >= len(buffer):
+            if not fill():
+                raise ValueError("Unterminated JSON array.")
+            continue
+        if buffer[position] == "]":
+            return
+        if buffer[position] == ",":
+            position += 1
+            continue
+        try:
+            item, end = _decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # The element continues past the buffered text
+            if eof or not fill():
+                raise
+            continue
+        # A number cut off by the end of the buffer decodes as a shorter number
+        if not eof and not isinstance(item, (dict, list, str)) \
+                and (end == len(buffer) or buffer[end] in _NUMBER_CHARS):
+            fill()
+            continue
+        position = end
+        yield item
+
+
+def iter_json_items(path: str) -> Iterator[object]:
+    """Yields the elements of a JSON array file, or the lines of a JSONL file."""
+    with open(path, "r", encoding="utf-8") as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        if first == "[":
+            yield from iter_json_array(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _label_studio_spans(results: Iterable[dict]) -> list:
+    entities = []
+    for result in results:
+        value = result.get("value", result)
+        if "start" in value and "end" in value and value.get("labels"):
+            entities.append([value["start"], value["end"], value["labels"][0]])
+    return entities
+
+
+def to_record(item: dict) -> Optional[dict]:
+    """
+    Normalizes a training record or a Label Studio task to a record.
+
+    Returns:
+        Optional[dict]: The record, or None for tasks without a usable annotation.
+    """
+    if "entities" in item:
+        return {"text": item["text"], "entities": [list(entity) for entity in item["entities"]]}
+    if "annotations" in item:
+        # Full JSON export: the first annotation that was not skipped
+        annotations = [a for a in item["annotations"] if not a.get("was_cancelled")]
+        if not annotations:
+            return None
+        return {"text": item["data"]["text"], "entities": _label_studio_spans(annotations[0].get("result", []))}
+    if "text" in item:
+        # JSON-MIN export: spans under the labels' from_name
+        return {"text": item["text"], "entities": _label_studio_spans(item.get("label", []))}
+    return None
+
+
+def iter_records(paths: Iterable[str]) -> Iterator[dict]:
+    """Records from each input file in turn, skipping unannotated tasks."""
+    for path in paths:
+        for item in iter_json_items(path):
+            record = to_record(item)
+            if record is not None:
+                yield record
+
+
+def is_dev(record: dict, dev_ratio: float, seed: int) -> bool:
+    """
+    Assigns a record to the dev set by a hash of its text, so the split
+    needs no shuffle buffer and a text lands on the same side every run.
+    """
+    digest = hashlib.blake2b(f"{seed}:{record['text']}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64 < dev_ratio
+
+
+class JsonArrayWriter:
+    """Writes records as a JSON array, one record per line, as they arrive."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.count = 0
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write("[")
+
+    def write(self, record: dict) -> None:
+        self._file.write(",\n" if self.count else "\n")
+        self._file.write(json.dumps(record, ensure_ascii=False))
+        self.count += 1
+
+    def close(self) -> None:
+        self._file.write("\n]\n")
+        self._file.close()
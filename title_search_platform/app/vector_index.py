@@ -0,0 +1,465 @@
+import os
+import json
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Sentence / document embeddings kept for "find similar" queries
+VECTOR_INDEX_ENABLED = os.getenv("VECTOR_INDEX_ENABLED", "true").lower() == "true"
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", str(Path(__file__).parent / ".vector_index"))
+# Storage per component: float16 (2 bytes) or int8 with a per-row scale (1 byte)
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float16")
+# Inverted lists probed by approximate search
+VECTOR_NPROBE = int(os.getenv("VECTOR_NPROBE", "8"))
+# Below this many vectors approximate search is exact
+VECTOR_MIN_TRAIN = int(os.getenv("VECTOR_MIN_TRAIN", "1024"))
+# The coarse quantizer is retrained once the index has grown this many times its training size
+VECTOR_RETRAIN_GROWTH = 4
+# Rows scored per matrix product; keeps the dequantized float32 block cache-sized
+SEARCH_BLOCK_ROWS = 4096
+
+STORAGE_DTYPES = ("float16", "int8")
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def pool(vectors: np.ndarray) -> np.ndarray:
+    """Document vector: the normalized mean of its sentence vectors."""
+    return normalize(normalize(vectors).mean(axis=0))
+
+
+class _Snapshot(NamedTuple):
+    vectors: Optional[np.ndarray]
+    scales: Optional[np.ndarray]
+    ids: Optional[np.ndarray]
+    offsets: Optional[np.ndarray]
+    centroids: Optional[np.ndarray]
+    lists: Optional[np.ndarray]
+    size: int
+
+
+class VectorIndex:
+    """
+    Append-only, memory-mapped index of L2-normalized vectors for cosine
+    similarity search.
+
+    Every row belongs to an owner id (the FileUpload id) and may carry a
+    text (the passage). Rows live in flat files that are only ever appended
+    to, so adds are incremental and readers simply re-map the grown files:
+
+        meta.json                 dim, storage dtype, quantizer training size
+        vectors.bin               float16 rows, or int8 rows ...
+        scales.bin                ... with a float32 scale per row
+        ids.bin                   int64 owner id per row
+        texts.bin, offsets.bin    utf-8 passage texts and their int64 end offsets
+        centroids.npy, lists.bin  IVF coarse quantizer and each row's list
+
+    Writers in any process (API workers, bulk_ingest) hold an exclusive
+    flock on the directory's .lock file while they append or retrain, and
+    start from the files as they are on disk, not from what this process
+    last mapped. Readers re-map when another process has added rows.
+
+    Exact search scans every row. Approximate search (IVF) scores only the
+    rows in the VECTOR_NPROBE lists whose centroids are closest to the query.
+    """
+
+    def __init__(self, directory: str, dtype: str = VECTOR_INDEX_DTYPE, with_texts: bool = False):
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown vector storage dtype '{dtype}'. Choose from {STORAGE_DTYPES}.")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.with_texts = with_texts
+        self._lock = threading.Lock()
+
+        self.meta = {"dim": None, "dtype": dtype}
+        self._centroids: Optional[np.ndarray] = None
+        self._centroids_mtime: Optional[int] = None
+        self._reload()
+        if self.dtype != dtype:
+            logger.warning(f"Vector index {directory} is stored as {self.dtype}; ignoring dtype={dtype}")
+
+    # -- storage ---------------------------------------------------------
+
+    def _path(self, name: str) -> Path:
+        return self.directory / name
+
+    @contextmanager
+    def _file_lock(self):
+        """
+        Exclusive flock on the index directory, so appends and retraining in
+        different processes never interleave their rows.
+        """
+        with open(self._path(".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _reload(self) -> None:
+        """
+        Re-reads meta.json, the centroids if they were retrained since they
+        were loaded, and maps the files at their current size.
+        """
+        meta_path = self._path("meta.json")
+        if meta_path.exists():
+            self.meta = json.loads(meta_path.read_text())
+        centroids_path = self._path("centroids.npy")
+        mtime = centroids_path.stat().st_mtime_ns if centroids_path.exists() else None
+        if mtime != self._centroids_mtime:
+            self._centroids = np.load(centroids_path) if mtime is not None else None
+            self._centroids_mtime = mtime
+        self._remap()
+
+    def _refresh(self) -> None:
+        """Picks up rows another process has appended since the last remap."""
+        if self._rows("ids.bin", 8) != self._snapshot.size:
+            with self._lock:
+                self._reload()
+
+    def _map(self, name: str, dtype, rows: Optional[int] = None, width: int = 1) -> Optional[np.ndarray]:
+        path = self._path(name)
+        if not path.exists():
+            return None
+        itemsize = np.dtype(dtype).itemsize * width
+        available = path.stat().st_size // itemsize
+        rows = available if rows is None else min(rows, available)
+        if rows == 0:
+            return None
+        shape = (rows, width) if width > 1 else (rows,)
+        return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+    def _remap(self) -> None:
+        """
+        Maps the files at their current size into a new snapshot. A row is
+        complete only once every file has it, so a crash between appends
+        just drops the tail. Readers take the snapshot once per call, so a
+        concurrent add never shows them files of different lengths.
+        """
+        dim = self.meta["dim"]
+        if dim is None:
+            self._snapshot = _Snapshot(None, None, None, None, None, None, 0)
+            return
+        counts = [self._rows("ids.bin", 8), self._rows("vectors.bin", dim * self._itemsize)]
+        if self.dtype == "int8":
+            counts.append(self._rows("scales.bin", 4))
+        if self.with_texts:
+            counts.append(self._rows("offsets.bin", 8))
+        size = min(counts)
+        self._snapshot = _Snapshot(
+            vectors=self._map("vectors.bin", self._storage, size, dim),
+            scales=self._map("scales.bin", np.float32, size) if self.dtype == "int8" else None,
+            ids=self._map("ids.bin", np.int64, size),
+            offsets=self._map("offsets.bin", np.int64, size) if self.with_texts else None,
+            centroids=self._centroids,
+            lists=self._map("lists.bin", np.int32, size) if self._centroids is not None else None,
+            size=size,
+        )
+
+    @property
+    def size(self) -> int:
+        return self._snapshot.size
+
+    @property
+    def dtype(self) -> str:
+        return self.meta["dtype"]
+
+    @property
+    def _storage(self):
+        return np.float16 if self.dtype == "float16" else np.int8
+
+    @property
+    def _itemsize(self) -> int:
+        return np.dtype(self._storage).itemsize
+
+    def _rows(self, name: str, row_bytes: int) -> int:
+        path = self._path(name)
+        return path.stat().st_size // row_bytes if path.exists() else 0
+
+    def _write_meta(self) -> None:
+        tmp_path = self._path("meta.json.tmp")
+        tmp_path.write_text(json.dumps(self.meta))
+        os.replace(tmp_path, self._path("meta.json"))
+
+    def _quantize(self, vectors: np.ndarray):
+        if self.dtype == "float16":
+            return vectors.astype(np.float16), None
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _repair_tail(self, snapshot: "_Snapshot") -> None:
+        """
+        Cuts files back to the last complete row and assigns IVF lists to
+        rows that lack one, so the next append stays row-aligned. Only
+        called under the file lock with a snapshot just mapped from disk, so
+        the rows it cuts are a crashed writer's, never another process's.
+        """
+        row_bytes = {"vectors.bin": self.meta["dim"] * self._itemsize, "ids.bin": 8}
+        if self.dtype == "int8":
+            row_bytes["scales.bin"] = 4
+        if self.with_texts:
+            row_bytes["offsets.bin"] = 8
+        if self._centroids is not None:
+            row_bytes["lists.bin"] = 4
+        for name, width in row_bytes.items():
+            path = self._path(name)
+            if path.exists() and path.stat().st_size > snapshot.size * width:
+                os.truncate(path, snapshot.size * width)
+        if self.with_texts and self._path("texts.bin").exists():
+            end = int(snapshot.offsets[-1]) if snapshot.offsets is not None else 0
+            if self._path("texts.bin").stat().st_size > end:
+                os.truncate(self._path("texts.bin"), end)
+        if self._centroids is not None:
+            assigned = self._rows("lists.bin", 4)
+            if assigned < snapshot.size:
+                with open(self._path("lists.bin"), "ab") as f:
+                    f.write(self._assign(self._decode(snapshot, slice(assigned, snapshot.size))).tobytes())
+
+    def add(self, owner_id: int, vectors: np.ndarray, texts: Optional[Sequence[str]] = None) -> int:
+        """
+        Appends vectors (one row per passage, or a single pooled row) for
+        one document without touching the existing rows.
+
+        Args:
+            owner_id (int): FileUpload id the vectors belong to.
+            vectors (np.ndarray): (n, dim) or (dim,) embeddings; normalized here.
+            texts (Optional[Sequence[str]]): Passage text per row, for indexes created with_texts.
+
+        Returns:
+            int: Number of rows added.
+        """
+        vectors = normalize(np.atleast_2d(vectors))
+        if len(vectors) == 0:
+            return 0
+        if self.with_texts and (texts is None or len(texts) != len(vectors)):
+            raise ValueError("A text is required for every passage vector.")
+
+        with self._lock, self._file_lock():
+            # Other processes may have appended or retrained since this one last mapped the files
+            self._reload()
+            if self.meta["dim"] is None:
+                self.meta["dim"] = int(vectors.shape[1])
+                self._write_meta()
+                self._remap()
+            elif vectors.shape[1] != self.meta["dim"]:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match the index ({self.meta['dim']}).")
+
+            snapshot = self._snapshot
+            self._repair_tail(snapshot)
+            stored, scales = self._quantize(vectors)
+            with open(self._path("vectors.bin"), "ab") as f:
+                f.write(stored.tobytes())
+            if scales is not None:
+                with open(self._path("scales.bin"), "ab") as f:
+                    f.write(scales.tobytes())
+            if self.with_texts:
+                encoded = [text.encode("utf-8") for text in texts]
+                end = int(snapshot.offsets[-1]) if snapshot.offsets is not None else 0
+                with open(self._path("texts.bin"), "ab") as f:
+                    f.write(b"".join(encoded))
+                with open(self._path("offsets.bin"), "ab") as f:
+                    f.write((end + np.cumsum([len(b) for b in encoded], dtype=np.int64)).tobytes())
+            if self._centroids is not None:
+                with open(self._path("lists.bin"), "ab") as f:
+                    f.write(self._assign(vectors).tobytes())
+            # ids.bin last: a row only counts once its owner id is written
+            with open(self._path("ids.bin"), "ab") as f:
+                f.write(np.full(len(vectors), owner_id, dtype=np.int64).tobytes())
+            self._remap()
+        return len(vectors)
+
+    # -- reading ---------------------------------------------------------
+
+    @staticmethod
+    def _decode(snapshot: "_Snapshot", rows) -> np.ndarray:
+        vectors = np.asarray(snapshot.vectors[rows], dtype=np.float32)
+        if snapshot.scales is not None:
+            vectors *= np.asarray(snapshot.scales[rows])[:, None]
+        return vectors
+
+    def vectors_for(self, owner_id: int) -> np.ndarray:
+        """Stored (dequantized) vectors of one owner id."""
+        self._refresh()
+        snapshot = self._snapshot
+        if snapshot.ids is None:
+            return np.empty((0, self.meta["dim"] or 0), dtype=np.float32)
+        return self._decode(snapshot, np.flatnonzero(np.asarray(snapshot.ids) == owner_id))
+
+    def _text(self, snapshot: "_Snapshot", row: int) -> str:
+        start = int(snapshot.offsets[row - 1]) if row > 0 else 0
+        end = int(snapshot.offsets[row])
+        with open(self._path("texts.bin"), "rb") as f:
+            f.seek(start)
+            return f.read(end - start).decode("utf-8")
+
+    # -- approximate search ----------------------------------------------
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+
+    def train(self, nlist: Optional[int] = None, iterations: int = 10, seed: int = 0) -> None:
+        """
+        Trains the IVF coarse quantizer (spherical k-means on a sample) and
+        assigns every row to its nearest centroid. Rows added later are
+        assigned as they come in, so the index never needs a rebuild.
+        """
+        with self._lock, self._file_lock():
+            self._reload()
+            snapshot = self._snapshot
+            size = snapshot.size
+            if size == 0:
+                return
+            nlist = nlist or int(np.clip(np.sqrt(size), 1, 1024))
+            rng = np.random.default_rng(seed)
+            sample_rows = np.sort(rng.choice(size, size=min(size, nlist * 64), replace=False))
+            sample = normalize(self._decode(snapshot, sample_rows))
+            centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                counts = np.bincount(labels, minlength=nlist)
+                # Empty clusters keep their previous centroid
+                centroids = np.where(counts[:, None] > 0, normalize(sums), centroids)
+
+            self._centroids = centroids.astype(np.float32)
+            tmp_path = self._path("lists.bin.tmp")
+            with open(tmp_path, "wb") as f:
+                for start in range(0, size, SEARCH_BLOCK_ROWS):
+                    block = self._decode(snapshot, slice(start, min(start + SEARCH_BLOCK_ROWS, size)))
+                    f.write(self._assign(block).tobytes())
+            os.replace(tmp_path, self._path("lists.bin"))
+            # Replaced atomically, as other processes load it without the file lock
+            np.save(self._path("centroids.tmp.npy"), self._centroids)
+            os.replace(self._path("centroids.tmp.npy"), self._path("centroids.npy"))
+            self.meta["trained_size"] = size
+            self._write_meta()
+            self._reload()
+            logger.info(f"Trained vector index {self.directory} with {nlist} lists over {size} rows")
+
+    def _needs_training(self) -> bool:
+        if self.size < VECTOR_MIN_TRAIN:
+            return False
+        trained = self.meta.get("trained_size")
+        return self._centroids is None or not trained or self.size > trained * VECTOR_RETRAIN_GROWTH
+
+    @staticmethod
+    def _probe_rows(snapshot: "_Snapshot", query: np.ndarray, nprobe: int) -> np.ndarray:
+        probes = np.argsort(-(snapshot.centroids @ query))[:nprobe]
+        assigned = len(snapshot.lists) if snapshot.lists is not None else 0
+        rows = np.flatnonzero(np.isin(np.asarray(snapshot.lists), probes)) if assigned else np.empty(0, dtype=np.int64)
+        # Rows appended without an assignment (e.g. after a crash) are always scanned
+        return np.concatenate([rows, np.arange(assigned, snapshot.size)])
+
+    # -- search ----------------------------------------------------------
+
+    def search(self, query: np.ndarray, k: int = 10, approximate: bool = False, nprobe: int = VECTOR_NPROBE,
+               exclude_id: Optional[int] = None) -> List[dict]:
+        """
+        Top-k rows by cosine similarity to `query`.
+
+        Args:
+            query (np.ndarray): Query embedding.
+            k (int): Number of hits.
+            approximate (bool): Score only the rows in the `nprobe` nearest
+                IVF lists; exact below VECTOR_MIN_TRAIN rows.
+            nprobe (int): Lists probed in approximate mode.
+            exclude_id (Optional[int]): Owner id whose rows are skipped
+                (the query document itself).
+
+        Returns:
+            List[dict]: Hits with the owner id, row, score and, for passage
+            indexes, the passage text; best first.
+        """
+        self._refresh()
+        if approximate and self._needs_training():
+            self.train()
+        snapshot = self._snapshot
+        if snapshot.size == 0 or k <= 0:
+            return []
+        query = normalize(query)
+
+        if approximate and snapshot.centroids is not None and snapshot.size >= VECTOR_MIN_TRAIN:
+            candidates = self._probe_rows(snapshot, query, nprobe)
+            blocks = [candidates[i:i + SEARCH_BLOCK_ROWS] for i in range(0, len(candidates), SEARCH_BLOCK_ROWS)]
+        else:
+            blocks = [slice(i, min(i + SEARCH_BLOCK_ROWS, snapshot.size)) for i in range(0, snapshot.size, SEARCH_BLOCK_ROWS)]
+
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for rows in blocks:
+            # Exact blocks are slices, which the memmap serves without a gather
+            scores = self._decode(snapshot, rows) @ query
+            if exclude_id is not None:
+                scores[np.asarray(snapshot.ids[rows]) == exclude_id] = -np.inf
+            row_numbers = np.arange(rows.start, rows.stop) if isinstance(rows, slice) else rows
+            best_scores = np.concatenate([best_scores, scores])
+            best_rows = np.concatenate([best_rows, row_numbers])
+            if len(best_scores) > k:
+                top = np.argpartition(-best_scores, k - 1)[:k]
+                best_scores, best_rows = best_scores[top], best_rows[top]
+
+        hits = []
+        for i in np.argsort(-best_scores, kind="stable"):
+            if not np.isfinite(best_scores[i]):
+                continue
+            row = int(best_rows[i])
+            hit = {"db_id": int(snapshot.ids[row]), "row": row, "score": float(best_scores[i])}
+            if self.with_texts:
+                hit["text"] = self._text(snapshot, row)
+            hits.append(hit)
+        return hits
+
+    def stats(self) -> dict:
+        return {
+            "rows": self.size,
+            "dim": self.meta["dim"],
+            "dtype": self.dtype,
+            "lists": 0 if self._centroids is None else len(self._centroids),
+            "trained_size": self.meta.get("trained_size"),
+            "bytes": sum(p.stat().st_size for p in self.directory.iterdir() if p.is_file()),
+        }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_vector_index(level: str) -> VectorIndex:
+    """
+    The "document" index (one pooled vector per upload) or the "passage"
+    index (one vector per cleaned sentence, with its text).
+    """
+    index = _indexes.get(level)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(level)
+            if index is None:
+                if level not in ("document", "passage"):
+                    raise ValueError(f"Unknown vector index level '{level}'. Use 'document' or 'passage'.")
+                index = VectorIndex(os.path.join(VECTOR_INDEX_DIR, level), with_texts=level == "passage")
+                _indexes[level] = index
+    return index
+
+
+def index_document_vectors(db_id: int, sentences: List[str], embeddings: np.ndarray) -> None:
+    """
+    Stores a document's sentence embeddings and their pooled document
+    vector. Called once the upload has its db_id.
+    """
+    if len(sentences) == 0:
+        return
+    get_vector_index("document").add(db_id, pool(embeddings))
+    get_vector_index("passage").add(db_id, embeddings, texts=sentences)
+
+
+def vector_index_stats() -> dict:
+    return {level: get_vector_index(level).stats() for level in ("document", "passage")}
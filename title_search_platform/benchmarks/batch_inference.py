@@ -0,0 +1,73 @@
+"""
+Throughput benchmark: single-document vs batched classification + entity extraction.
+
+Run from the title_search_platform directory:
+    python -m benchmarks.batch_inference --docs 200
+"""
+import time
+import random
+import argparse
+
+from app.document_classifier import classify_doc_type
+from app.entity_extractor import extract_entities_semantic
+from app.file_service import analyze_texts
+
+SENTENCES = [
+    "THIS WARRANTY DEED, made the {day} day of {month}, {year} by {grantor}, husband and wife, to {grantee}.",
+    "The grantor hereby conveys to the grantee in fee simple the property address at {number} {street} Street.",
+    "For and in consideration of the sum of ${amount}.00 and other good and valuable consideration.",
+    "Recorded {month_num}/{day_num}/{year} at 08:40 AM as Instrument #{instrument}.",
+    "The borrower promises to pay the lender the loan amount of ${amount}.00 under this mortgage.",
+    "Final judgment is entered in favor of the plaintiff and against the defendant by the court.",
+    "This satisfaction releases the mortgage, which has been paid in full and is hereby cancelled.",
+    "A lien is recorded against the property of the debtor in favor of the creditor.",
+    "The legal description of the parcel is set forth in Exhibit A attached hereto.",
+    "Signed, sealed and delivered in the presence of the undersigned witnesses.",
+]
+NAMES = ["Eric B. Zwiebel", "Julie Coates", "Geramy Garcia Rodriguez", "Ana Li", "Marcus Hale", "Priya Shah"]
+MONTHS = ["January", "March", "May", "July", "September", "November"]
+
+
+def make_document(rng: random.Random) -> str:
+    values = {
+        "day": f"{rng.randint(1, 28)}th", "month": rng.choice(MONTHS), "year": rng.randint(1990, 2025),
+        "grantor": rng.choice(NAMES), "grantee": rng.choice(NAMES), "number": rng.randint(1, 9999),
+        "street": rng.choice(["Oak", "Main", "Bay", "Palm"]), "amount": rng.randint(10, 900) * 1000,
+        "month_num": f"{rng.randint(1, 12):02d}", "day_num": f"{rng.randint(1, 28):02d}",
+        "instrument": rng.randint(10**8, 10**9),
+    }
+    sentences = [rng.choice(SENTENCES).format(**values) for _ in range(rng.randint(5, 60))]
+    return " ".join(sentences)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=200, help="Number of synthetic documents.")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [make_document(rng) for _ in range(args.docs)]
+    analyze_texts(texts[:2], extractor="semantic")  # load the model and cached prompt/reference embeddings
+
+    started = time.perf_counter()
+    single = []
+    for text in texts:
+        document_type = classify_doc_type(text)
+        single.append((document_type, extract_entities_semantic(text, document_type)))
+    single_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batched = analyze_texts(texts, extractor="semantic")
+    batched_seconds = time.perf_counter() - started
+
+    mismatches = sum(1 for a, b in zip(single, batched) if a != b)
+    print(f"documents:        {len(texts)}")
+    print(f"single-document:  {single_seconds:.2f}s  ({len(texts) / single_seconds:.1f} docs/s)")
+    print(f"batched:          {batched_seconds:.2f}s  ({len(texts) / batched_seconds:.1f} docs/s)")
+    print(f"speedup:          {single_seconds / batched_seconds:.2f}x")
+    print(f"mismatches:       {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
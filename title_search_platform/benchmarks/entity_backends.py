@@ -0,0 +1,38 @@
+"""
+Throughput benchmark: spaCy NER backend vs sentence-embedding backend for entity extraction.
+
+Run from the title_search_platform directory:
+    python -m benchmarks.entity_backends --docs 200
+"""
+import time
+import random
+import argparse
+
+from app.document_classifier import classify_doc_types
+from app.entity_extractor import extract_entities, EXTRACTOR_BACKENDS
+from benchmarks.batch_inference import make_document
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=200, help="Number of synthetic documents.")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [make_document(rng) for _ in range(args.docs)]
+    # Entity extraction only: the semantic backend covers deeds, NER covers every type.
+    doc_types = ["deed"] * len(texts)
+    classify_doc_types(texts[:2])
+
+    for backend in sorted(EXTRACTOR_BACKENDS):
+        extract_entities(texts[:2], doc_types[:2], backend=backend)  # load the model
+        started = time.perf_counter()
+        results = extract_entities(texts, doc_types, backend=backend)
+        seconds = time.perf_counter() - started
+        found = sum(1 for entities in results for value in entities.values() if value)
+        print(f"{backend:10s} {seconds:7.2f}s  {len(texts) / seconds:8.1f} docs/s  {found} non-empty entities")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Benchmark of the Label Studio exporter against a local mock server.
+
+Starts a mock of Label Studio's project import endpoint that answers a
+fraction of imports with 503 (with Retry-After: 0), then sends the same
+tasks one import per task (the previous behaviour) and through the batched
+exporter. Reports wall time, imports made, retries and that every task
+arrived exactly once.
+
+Run from the title_search_platform directory:
+    python -m benchmarks.label_studio_export --tasks 500 --fail-rate 0.1
+"""
+import json
+import time
+import random
+import logging
+import asyncio
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from app.label_studio import LabelStudioExporter
+
+
+class MockLabelStudio(ThreadingHTTPServer):
+    """Counts imports and received tasks; fails `fail_rate` of imports with 503."""
+
+    daemon_threads = True
+
+    def __init__(self, fail_rate: float, latency: float, seed: int = 0):
+        super().__init__(("127.0.0.1", 0), MockImportHandler)
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.imports = 0
+        self.failures = 0
+        self.task_ids = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class MockImportHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+        time.sleep(server.latency)
+        with server.lock:
+            fail = server.rng.random() < server.fail_rate
+            if fail:
+                server.failures += 1
+            else:
+                tasks = json.loads(body)
+                server.imports += 1
+                server.task_ids.extend(task["data"]["id"] for task in tasks)
+        if fail:
+            self.reply(503, {"detail": "busy"}, {"Retry-After": "0"})
+        else:
+            self.reply(201, {"task_count": len(tasks)})
+
+    def reply(self, status: int, payload: dict, headers: dict = None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_tasks(count: int, text_bytes: int) -> list:
+    text = ("warranty deed grantor conveys to grantee the property at 12 Oak Street " * (text_bytes // 70 + 1))[:text_bytes]
+    return [{"data": {"id": i, "text": text}} for i in range(count)]
+
+
+def run_single(url: str, tasks: list) -> float:
+    """One import per task on a fresh connection, as create_label_task used to."""
+    started = time.perf_counter()
+    for task in tasks:
+        for _ in range(20):
+            response = httpx.post(f"{url}/api/projects/1/import", json=[task], timeout=30)
+            if response.status_code != 503:
+                break
+        response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def run_batched(url: str, tasks: list, args) -> tuple:
+    exporter = LabelStudioExporter(
+        base_url=url, token="bench", project_id="1", batch_size=args.batch_size,
+        batch_seconds=args.batch_seconds, concurrency=args.concurrency, max_retries=20,
+    )
+    started = time.perf_counter()
+    exporter.enqueue_many(tasks)
+    await exporter.flush()
+    seconds = time.perf_counter() - started
+    stats = exporter.stats()
+    await exporter.close()
+    return seconds, stats
+
+
+def serve(args) -> MockLabelStudio:
+    server = MockLabelStudio(args.fail_rate, args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def report(name: str, seconds: float, server: MockLabelStudio, tasks: int) -> None:
+    received = len(server.task_ids)
+    exact = received == tasks and len(set(server.task_ids)) == tasks
+    print(f"{name:<8} {seconds:8.2f}s  {tasks / seconds:9.1f} tasks/s  imports={server.imports:<5} "
+          f"503s={server.failures:<4} all tasks once: {exact}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=500, help="Number of tasks to export.")
+    parser.add_argument("--text-bytes", type=int, default=4000, help="Size of each task's text.")
+    parser.add_argument("--fail-rate", type=float, default=0.1, help="Fraction of imports answered with 503.")
+    parser.add_argument("--latency", type=float, default=0.005, help="Mock server seconds per import.")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--batch-seconds", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--skip-single", action="store_true", help="Only run the batched exporter.")
+    args = parser.parse_args()
+
+    # Retries are counted in the report instead of logged one by one
+    logging.getLogger("app.label_studio").setLevel(logging.ERROR)
+    tasks = make_tasks(args.tasks, args.text_bytes)
+    if not args.skip_single:
+        server = serve(args)
+        report("single", run_single(server.url, tasks), server, len(tasks))
+        server.shutdown()
+
+    server = serve(args)
+    seconds, stats = asyncio.run(run_batched(server.url, tasks, args))
+    report("batched", seconds, server, len(tasks))
+    print(f"         retries={stats['retries']} failed_tasks={stats['failed_tasks']} "
+          f"avg_batch_size={stats['avg_batch_size']:.1f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
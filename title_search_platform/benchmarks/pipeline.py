@@ -0,0 +1,405 @@
+"""
+End-to-end benchmark of the ingestion pipeline.
+
+Generates (or loads) a corpus of text-layer and scanned PDFs, times each
+stage on its own (extract_text_hybrid, classify_doc_type,
+extract_entities_semantic, MinIO upload, DB insert), then drives
+POST /files/upload/ with concurrent clients through a real HTTP server.
+MySQL is replaced by SQLite and MinIO by an in-process object store, so it
+runs offline; the search and vector indexes live in a temporary directory.
+
+Reports p50 / p95 / p99 latency, throughput and peak RSS, and writes them
+as JSON that --compare diffs against an earlier run.
+
+Run from the title_search_platform directory:
+    python -m benchmarks.pipeline --docs 24 --concurrency 4 --output before.json
+    python -m benchmarks.pipeline --docs 24 --concurrency 4 --output after.json --compare before.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import socket
+import hashlib
+import argparse
+import datetime
+import resource
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+from pathlib import Path
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz  # PyMuPDF
+import requests
+
+# Latency metrics regress when they grow, throughput metrics when they shrink
+LOWER_IS_BETTER = ("p50", "p95", "p99", "mean", "max", "bytes", "seconds", "rejected", "failed")
+
+
+class LocalObjectStore:
+    """Filesystem stand-in for the Minio client calls the app makes."""
+
+    def __init__(self, directory: str):
+        self.root = Path(directory)
+
+    def bucket_exists(self, bucket: str) -> bool:
+        return (self.root / bucket).is_dir()
+
+    def make_bucket(self, bucket: str) -> None:
+        (self.root / bucket).mkdir(parents=True, exist_ok=True)
+
+    def put_object(self, bucket: str, object_name: str, data, length: int, part_size: int = 0, **kwargs):
+        path = self.root / bucket / object_name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.md5()
+        remaining = length
+        with open(path, "wb") as out:
+            while remaining > 0:
+                chunk = data.read(min(remaining, part_size or 1024 * 1024))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                remaining -= len(chunk)
+        return SimpleNamespace(etag=digest.hexdigest())
+
+    def get_object(self, bucket: str, object_name: str):
+        response = io.BytesIO((self.root / bucket / object_name).read_bytes())
+        response.release_conn = lambda: None
+        return response
+
+    def stat_object(self, bucket: str, object_name: str):
+        path = self.root / bucket / object_name
+        return SimpleNamespace(
+            bucket_name=bucket, object_name=object_name, size=path.stat().st_size,
+            last_modified=datetime.datetime.fromtimestamp(path.stat().st_mtime), etag=None,
+            content_type="application/pdf",
+        )
+
+
+def make_pdf(text_pages: list, scanned: bool) -> bytes:
+    """A PDF with one page per text; scanned pages carry only an image of the text."""
+    doc = fitz.open()
+    for text in text_pages:
+        page = doc.new_page(width=612, height=792)
+        box = fitz.Rect(54, 54, 558, 738)
+        if scanned:
+            source = fitz.open()
+            source.new_page(width=612, height=792).insert_textbox(box, text, fontsize=11)
+            pix = source[0].get_pixmap(dpi=200, colorspace=fitz.csGRAY)
+            page.insert_image(page.rect, pixmap=pix)
+            source.close()
+        else:
+            page.insert_textbox(box, text, fontsize=11)
+    try:
+        return doc.tobytes(garbage=3, deflate=True)
+    finally:
+        doc.close()
+
+
+def build_corpus(args, rng: random.Random) -> list:
+    if args.corpus:
+        paths = sorted(Path(args.corpus).rglob("*.pdf"))[:args.docs or None]
+        corpus = []
+        for path in paths:
+            data = path.read_bytes()
+            with fitz.open(stream=data, filetype="pdf") as doc:
+                pages = len(doc)
+            corpus.append({"name": path.name, "bytes": data, "pages": pages, "kind": "loaded"})
+        return corpus
+
+    from benchmarks.batch_inference import make_document
+
+    page_counts = [int(count) for count in args.pages.split(",")]
+    corpus = []
+    for index in range(args.docs):
+        pages = page_counts[index % len(page_counts)]
+        scanned = rng.random() < args.scanned_fraction
+        data = make_pdf([make_document(rng)[:1800] for _ in range(pages)], scanned)
+        kind = "scanned" if scanned else "text"
+        corpus.append({"name": f"{kind}_{index}_{pages}p.pdf", "bytes": data, "pages": pages, "kind": kind})
+    return corpus
+
+
+def unique_variant(data: bytes, nonce: str) -> bytes:
+    # A trailing comment changes the content hash (so the duplicate cache is
+    # not hit) without changing what the parser sees.
+    return data + f"\n%bench-{nonce}\n".encode()
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(samples: list) -> dict:
+    """Latency summary in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ms = [s * 1000 for s in samples]
+    return {
+        "count": len(ms),
+        "mean": round(sum(ms) / len(ms), 3),
+        "p50": round(percentile(ms, 50), 3),
+        "p95": round(percentile(ms, 95), 3),
+        "p99": round(percentile(ms, 99), 3),
+        "max": round(max(ms), 3),
+    }
+
+
+def peak_rss() -> dict:
+    """Peak RSS of this process and of the live page extraction workers (Linux)."""
+    workers = 0
+    for child in multiprocessing.active_children():
+        try:
+            with open(f"/proc/{child.pid}/status") as status:
+                for line in status:
+                    if line.startswith("VmHWM:"):
+                        workers += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return {
+        "process_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "workers_bytes": workers,
+    }
+
+
+def time_stages(corpus: list) -> dict:
+    from app import db_manager, minio_manager
+    from app.file_service import extract_text_hybrid
+    from app.document_classifier import classify_doc_type
+    from app.entity_extractor import extract_entities_semantic
+
+    timings = {name: [] for name in
+               ("extract_text_hybrid", "classify_doc_type", "extract_entities_semantic", "minio_upload", "db_insert")}
+    by_kind = {}
+    for position, doc in enumerate(corpus):
+        started = time.perf_counter()
+        total_pages, text = extract_text_hybrid(SimpleNamespace(file=io.BytesIO(doc["bytes"])))
+        extract_seconds = time.perf_counter() - started
+        timings["extract_text_hybrid"].append(extract_seconds)
+        by_kind.setdefault(doc["kind"], []).append(extract_seconds)
+
+        started = time.perf_counter()
+        document_type = classify_doc_type(text)
+        timings["classify_doc_type"].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        entities = extract_entities_semantic(text, document_type)
+        timings["extract_entities_semantic"].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        minio_manager.minio_metadata_manager.upload_file(
+            io.BytesIO(doc["bytes"]), f"bench/stage/{position}.pdf", len(doc["bytes"])
+        )
+        timings["minio_upload"].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        db_manager.db_metadata_manager.log_file_metadata(
+            filename=doc["name"], uploaded_time=datetime.datetime.utcnow(), file_size=len(doc["bytes"]),
+            total_pages=total_pages, document_type=document_type, extracted_text=text, extracted_entities=entities
+        )
+        timings["db_insert"].append(time.perf_counter() - started)
+
+    stages = {name: summarize(samples) for name, samples in timings.items()}
+    total_pages = sum(doc["pages"] for doc in corpus)
+    extract_total = sum(timings["extract_text_hybrid"])
+    stages["extract_text_hybrid"]["pages_per_second"] = round(total_pages / extract_total, 3) if extract_total else 0.0
+    stages["extract_text_hybrid"]["by_kind"] = {kind: summarize(samples) for kind, samples in by_kind.items()}
+    return stages
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int):
+    import uvicorn
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("API server failed to start.")
+        time.sleep(0.05)
+    return server, thread
+
+
+def load_endpoint(corpus: list, total_requests: int, concurrency: int, port: int, unique: bool) -> dict:
+    url = f"http://127.0.0.1:{port}/files/upload/"
+
+    def post(index: int) -> tuple:
+        doc = corpus[index % len(corpus)]
+        data = unique_variant(doc["bytes"], str(index)) if unique else doc["bytes"]
+        started = time.perf_counter()
+        response = requests.post(url, files={"file": (doc["name"], data, "application/pdf")}, timeout=600)
+        return response.status_code, time.perf_counter() - started, doc["pages"]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(post, range(total_requests)))
+    seconds = time.perf_counter() - started
+
+    ok = [(latency, pages) for status, latency, pages in results if status == 200]
+    return {
+        "requests": total_requests,
+        "concurrency": concurrency,
+        "ok": len(ok),
+        "rejected": sum(1 for status, _, _ in results if status == 503),
+        "failed": sum(1 for status, _, _ in results if status not in (200, 503)),
+        "seconds": round(seconds, 3),
+        "latency": summarize([latency for latency, _ in ok]),
+        "docs_per_second": round(len(ok) / seconds, 3),
+        "pages_per_second": round(sum(pages for _, pages in ok) / seconds, 3),
+    }
+
+
+def flatten(result: dict, prefix: str = "") -> dict:
+    metrics = {}
+    for key, value in result.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[name] = value
+    return metrics
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """Prints each shared metric with its change; returns the regressions beyond `threshold` percent."""
+    regressions = []
+    old_metrics = flatten({k: baseline.get(k, {}) for k in ("stages", "endpoint", "peak_rss")})
+    new_metrics = flatten({k: current.get(k, {}) for k in ("stages", "endpoint", "peak_rss")})
+    print(f"\n{'metric':<58} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name in sorted(old_metrics.keys() & new_metrics.keys()):
+        leaf = name.rsplit(".", 1)[-1]
+        if leaf in ("count", "requests", "concurrency"):
+            continue
+        old, new = old_metrics[name], new_metrics[name]
+        change = (new - old) / old * 100 if old else 0.0
+        worse = change > threshold if leaf.endswith(LOWER_IS_BETTER) else change < -threshold
+        if worse:
+            regressions.append(name)
+        print(f"{name:<58} {old:>12.3f} {new:>12.3f} {change:>+7.1f}%{'  <-- worse' if worse else ''}")
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=24, help="Synthetic documents (or the number to load from --corpus).")
+    parser.add_argument("--pages", default="1,4,12", help="Page counts, cycled over the documents.")
+    parser.add_argument("--scanned-fraction", type=float, default=0.5, help="Share of image-only (OCR) documents.")
+    parser.add_argument("--corpus", help="Directory of real PDFs to use instead of the synthetic corpus.")
+    parser.add_argument("--requests", type=int, help="Endpoint requests (default: 2 per document).")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent endpoint clients.")
+    parser.add_argument("--duplicates", action="store_true",
+                        help="Send the corpus bytes unchanged, so repeats hit the duplicate cache.")
+    parser.add_argument("--ocr-cache", action="store_true", help="Keep the OCR cache enabled.")
+    parser.add_argument("--skip-stages", action="store_true")
+    parser.add_argument("--skip-endpoint", action="store_true")
+    parser.add_argument("--output", help="Write the results as JSON to this path.")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against.")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent change reported as a regression.")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    # Local stand-ins; set before any app module reads its configuration
+    work_dir = tempfile.TemporaryDirectory(prefix="pipeline-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{work_dir.name}/metadata.db"
+    os.environ["SEARCH_INDEX_PATH"] = f"{work_dir.name}/search.sqlite3"
+    os.environ["VECTOR_INDEX_DIR"] = f"{work_dir.name}/vectors"
+    os.environ["BULK_INGEST_DIR"] = f"{work_dir.name}/bulk"
+    if not args.ocr_cache:
+        os.environ["OCR_CACHE_SIZE"] = "0"
+        os.environ["OCR_CACHE_DIR"] = ""
+
+    from app import db_manager, minio_manager
+    minio_manager.MinioMetadataManager.minio_client = LocalObjectStore(f"{work_dir.name}/objects")
+    db_manager.db_metadata_manager.create_tables()
+
+    rng = random.Random(args.seed)
+    corpus = build_corpus(args, rng)
+    if not corpus:
+        sys.exit("No documents in the corpus.")
+    print(f"corpus: {len(corpus)} documents, {sum(doc['pages'] for doc in corpus)} pages "
+          f"({sum(1 for doc in corpus if doc['kind'] == 'scanned')} scanned)")
+
+    result = {
+        "meta": {
+            "timestamp": datetime.datetime.utcnow().isoformat(),
+            "commit": git_commit(),
+            "cpu_count": os.cpu_count(),
+            "python": sys.version.split()[0],
+            "args": vars(args),
+        },
+        "corpus": {
+            "documents": len(corpus),
+            "pages": sum(doc["pages"] for doc in corpus),
+            "scanned_documents": sum(1 for doc in corpus if doc["kind"] == "scanned"),
+            "bytes": sum(len(doc["bytes"]) for doc in corpus),
+        },
+    }
+
+    if not args.skip_stages:
+        # Loads the models and warms the page workers before anything is timed
+        time_stages(corpus[:1])
+        result["stages"] = time_stages(corpus)
+        print(f"\n{'stage':<28} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+        for name, stats in result["stages"].items():
+            print(f"{name:<28} {stats['p50']:>10.2f} {stats['p95']:>10.2f} {stats['p99']:>10.2f}")
+
+    if not args.skip_endpoint:
+        server, thread = start_server(free_port())
+        try:
+            endpoint = load_endpoint(
+                corpus, args.requests or len(corpus) * 2, args.concurrency, server.config.port, not args.duplicates
+            )
+        finally:
+            server.should_exit = True
+            thread.join(timeout=30)
+        result["endpoint"] = endpoint
+        latency = endpoint["latency"]
+        print(f"\nPOST /files/upload/ x{endpoint['requests']} at concurrency {endpoint['concurrency']}: "
+              f"{endpoint['ok']} ok, {endpoint['rejected']} rejected (503), {endpoint['failed']} failed")
+        if latency.get("count"):
+            print(f"latency ms p50 {latency['p50']:.1f}  p95 {latency['p95']:.1f}  p99 {latency['p99']:.1f}")
+        print(f"throughput {endpoint['docs_per_second']:.2f} docs/s, {endpoint['pages_per_second']:.2f} pages/s")
+
+    result["peak_rss"] = peak_rss()
+    print(f"\npeak RSS: {result['peak_rss']['process_bytes'] / 2**20:.0f} MiB "
+          f"(+ {result['peak_rss']['workers_bytes'] / 2**20:.0f} MiB in page workers)")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+        print(f"results written to {args.output}")
+
+    regressions = []
+    if args.compare:
+        regressions = compare(json.loads(Path(args.compare).read_text()), result, args.threshold)
+        print(f"\n{len(regressions)} metric(s) worse by more than {args.threshold:.0f}%")
+
+    from app.page_extractor import shutdown_page_pool
+    shutdown_page_pool()
+    work_dir.cleanup()
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Accuracy and speed check of the int8-quantized embedding model against fp32.
+
+Loads all-MiniLM-L6-v2 both ways and runs the embedding-dependent
+decisions on a held-out set:
+  - classification by the embedding fallback (nearest REFERENCE_TEXTS entry)
+  - the semantic extractor's entity picks (best-matching sentence per entity)
+and reports how often int8 agrees with fp32, the cosine similarity of their
+sentence embeddings, encode throughput and the weight size of each model.
+
+The held-out set defaults to synthetic deeds drawn with a seed the other
+benchmarks do not use; pass --input with JSON/JSONL records or a Label
+Studio export (e.g. app/training/data/dev_data.json) to use real documents.
+Exits with status 1 if an agreement rate is below --min-agreement.
+
+Run from the title_search_platform directory:
+    python -m benchmarks.quantization --docs 200 --threads 4
+"""
+import sys
+import time
+import random
+import argparse
+
+from app.document_classifier import REFERENCE_TEXTS
+from app.entity_extractor import ENTITY_PROMPTS, clean_sentences, select_candidates, prompt_embeddings, pick_entities
+from app.model_loader import ENCODE_BATCH_SIZE, CLASSIFY_ENCODE_BATCH_SIZE, ModelRegistry, load_sentence_transformer
+from app.training.training_data import iter_json_items
+from benchmarks.batch_inference import make_document
+
+
+def load_texts(args) -> list:
+    if not args.input:
+        rng = random.Random(args.seed)
+        return [make_document(rng) for _ in range(args.docs)]
+    texts = []
+    for path in args.input:
+        for item in iter_json_items(path):
+            text = item.get("text") or item.get("data", {}).get("text")
+            if text:
+                texts.append(text)
+    return texts[:args.docs] if args.docs else texts
+
+
+def run_model(model, texts: list, sentence_lists: list) -> dict:
+    from sentence_transformers import util
+
+    started = time.perf_counter()
+    document_embeddings = model.encode(texts, batch_size=CLASSIFY_ENCODE_BATCH_SIZE, convert_to_tensor=True)
+    classify_seconds = time.perf_counter() - started
+    references = model.encode(list(REFERENCE_TEXTS.values()), convert_to_tensor=True)
+    doc_types = list(REFERENCE_TEXTS)
+    classes = [doc_types[int(row.argmax())] for row in util.cos_sim(document_embeddings, references)]
+
+    all_sentences = [sentence for sentences in sentence_lists for sentence in sentences]
+    started = time.perf_counter()
+    sentence_embeddings = model.encode(all_sentences, batch_size=ENCODE_BATCH_SIZE, convert_to_tensor=True).cpu()
+    encode_seconds = time.perf_counter() - started
+
+    prompt_matrix = prompt_embeddings("deed", model=model)
+    picks, offset = [], 0
+    for sentences in sentence_lists:
+        embeddings = sentence_embeddings[offset:offset + len(sentences)]
+        offset += len(sentences)
+        picks.append(pick_entities("deed", sentences, embeddings, prompt_matrix) if sentences else {})
+    return {
+        "classes": classes,
+        "picks": picks,
+        "sentence_embeddings": sentence_embeddings,
+        "classify_docs_per_second": len(texts) / classify_seconds if classify_seconds else 0.0,
+        "sentences_per_second": len(all_sentences) / encode_seconds if encode_seconds else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=200, help="Held-out documents (0 = all of --input).")
+    parser.add_argument("--seed", type=int, default=101)
+    parser.add_argument("--input", nargs="*", help="JSON/JSONL records or Label Studio exports.")
+    parser.add_argument("--threads", type=int, help="torch intra-op threads (overrides TORCH_NUM_THREADS).")
+    parser.add_argument("--min-agreement", type=float, default=0.97,
+                        help="Fail when classification or entity agreement is lower.")
+    args = parser.parse_args()
+
+    import torch
+
+    texts = load_texts(args)
+    sentence_lists = [select_candidates(clean_sentences(text)) for text in texts]
+
+    # A registry of its own records each model's weight size and load RSS
+    models = ModelRegistry()
+    results = {}
+    for mode in ("none", "int8"):
+        models.register(mode, lambda mode=mode: load_sentence_transformer(mode))
+        model = models.get(mode)
+        if args.threads:
+            torch.set_num_threads(args.threads)
+        with torch.inference_mode():
+            model.encode(texts[:2])  # warm-up
+            results[mode] = run_model(model, texts, sentence_lists)
+    sizes = models.stats()["models"]
+
+    fp32, int8 = results["none"], results["int8"]
+    class_agreement = sum(a == b for a, b in zip(fp32["classes"], int8["classes"])) / len(texts)
+    entity_pairs = [(a.get(entity), b.get(entity)) for a, b in zip(fp32["picks"], int8["picks"])
+                    for entity in ENTITY_PROMPTS["deed"] if a or b]
+    entity_agreement = sum(a == b for a, b in entity_pairs) / len(entity_pairs) if entity_pairs else 1.0
+    cosine = torch.nn.functional.cosine_similarity(fp32["sentence_embeddings"], int8["sentence_embeddings"], dim=1)
+
+    print(f"held-out documents:    {len(texts)} ({sum(map(len, sentence_lists))} candidate sentences)")
+    print(f"torch threads:         {torch.get_num_threads()}")
+    for mode, label in (("none", "fp32"), ("int8", "int8")):
+        print(f"{label}:  {results[mode]['sentences_per_second']:8.1f} sentences/s  "
+              f"{results[mode]['classify_docs_per_second']:7.1f} docs/s classify  "
+              f"weights {sizes[mode]['parameter_bytes'] / 2**20:6.1f} MiB  "
+              f"load RSS +{sizes[mode]['rss_delta_bytes'] / 2**20:6.1f} MiB")
+    print(f"speedup (sentences):   {int8['sentences_per_second'] / fp32['sentences_per_second']:.2f}x")
+    print(f"embedding cosine:      mean {cosine.mean().item():.4f}  min {cosine.min().item():.4f}")
+    print(f"classification agreement: {class_agreement:.3f}")
+    print(f"entity pick agreement:    {entity_agreement:.3f} ({len(entity_pairs)} entity slots)")
+
+    if min(class_agreement, entity_agreement) < args.min_agreement:
+        print(f"int8 agreement is below {args.min_agreement}; keep EMBEDDING_QUANTIZE=none.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Latency benchmark for the SQLite FTS5 search index.
+
+Builds an index of synthetic deed/mortgage/lien records and times
+representative /search queries (p50 / p95 / max per query).
+
+Run from the title_search_platform directory:
+    python -m benchmarks.search_index --docs 1000000
+"""
+import os
+import time
+import random
+import argparse
+import datetime
+import tempfile
+import statistics
+
+from app.search_index import SearchIndex
+
+FIRST_NAMES = ["Eric", "Julie", "Geramy", "Ana", "Marcus", "Priya", "Tomas", "Grace", "Omar", "Lena", "Ivan", "Rosa"]
+LAST_NAMES = ["Zwiebel", "Coates", "Rodriguez", "Li", "Hale", "Shah", "Novak", "Okafor", "Berg", "Moreau", "Silva",
+              "Kowalski", "Nakamura", "Fischer", "Haddad", "Brennan"]
+DOC_TYPES = ["deed", "mortgage", "lien", "judgment", "satisfaction"]
+TEXTS = {
+    "deed": "warranty deed the grantor hereby conveys to the grantee in fee simple the property at {address}",
+    "mortgage": "the borrower promises to pay the lender the loan amount secured by the property at {address}",
+    "lien": "a lien is recorded against the property at {address} in favor of the creditor",
+    "judgment": "final judgment is entered in favor of the plaintiff against the defendant owning {address}",
+    "satisfaction": "this satisfaction releases the mortgage on {address} which has been paid in full",
+}
+
+
+def make_record(rng: random.Random, doc_id: int) -> dict:
+    doc_type = rng.choice(DOC_TYPES)
+    address = f"{rng.randint(1, 9999)} {rng.choice(['Oak', 'Main', 'Bay', 'Palm', 'Cedar', 'Lake'])} Street"
+    recorded = datetime.date(1990, 1, 1) + datetime.timedelta(days=rng.randint(0, 35 * 365))
+    instrument = rng.randint(10**8, 10**9)
+    return {
+        "id": doc_id,
+        "filename": f"{doc_type}_{doc_id}.pdf",
+        "document_type": doc_type,
+        "uploaded_time": datetime.datetime(2025, 1, 1) + datetime.timedelta(seconds=doc_id),
+        "extracted_text": f"{TEXTS[doc_type].format(address=address)} instrument {instrument} "
+                          f"recorded {recorded:%m/%d/%Y} legal description exhibit a parcel",
+        "extracted_entities": {
+            "grantor": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "grantee": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "recording_date": f"Recorded {recorded:%m/%d/%Y} as Instrument #{instrument}",
+        },
+    }
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=1_000_000, help="Number of synthetic documents.")
+    parser.add_argument("--repeat", type=int, default=50, help="Runs per query.")
+    parser.add_argument("--batch", type=int, default=10_000, help="Documents per indexing transaction.")
+    parser.add_argument("--index", help="Reuse (or keep) the index at this path instead of a temporary file.")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    tmp_dir = None
+    path = args.index
+    if path is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp_dir.name, "search.sqlite3")
+    index = SearchIndex(path)
+
+    existing = index.max_indexed_id()
+    if existing < args.docs:
+        rng = random.Random(args.seed + existing)
+        started = time.perf_counter()
+        for start in range(existing + 1, args.docs + 1, args.batch):
+            stop = min(start + args.batch, args.docs + 1)
+            index.index_documents(make_record(rng, doc_id) for doc_id in range(start, stop))
+        seconds = time.perf_counter() - started
+        print(f"indexed {args.docs - existing} documents in {seconds:.1f}s "
+              f"({(args.docs - existing) / seconds:.0f} docs/s)")
+
+    # The first generated record, to look up an instrument number that exists
+    instrument = make_record(random.Random(args.seed), 1)["extracted_entities"]["recording_date"].split("#")[1]
+    queries = {
+        "grantor name":             dict(grantor="julie coates"),
+        "instrument number":        dict(query=instrument),
+        "name + type filter":       dict(query="novak", document_type="mortgage"),
+        "name + date range":        dict(grantee="okafor", date_from="2010-01-01", date_to="2010-12-31"),
+        "common term":              dict(query="property"),
+        "type + date, no terms":    dict(document_type="lien", date_from="2020-03-01", date_to="2020-03-31"),
+        "deep page":                dict(grantor="omar", page=50),
+    }
+
+    print(f"{'query':<24} {'hits':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for name, kwargs in queries.items():
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = index.search(**kwargs)
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f"{name:<24} {result['total']:>8} {statistics.median(timings):>8.2f} "
+              f"{percentile(timings, 95):>8.2f} {max(timings):>8.2f}")
+
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Benchmark of sentence segmentation, noise filtering and candidate selection
+for the semantic entity extractor.
+
+Builds multi-page OCR-style deeds (page headers, repeated notary and stamp
+boilerplate) and compares the previous whole-document clean_sentences, with
+every surviving sentence encoded, against the per-page segmentation and the
+capped, de-duplicated candidates now sent to model.encode. Unless --no-model
+is given, it also runs entity extraction both ways and counts the documents
+whose picks differ.
+
+Pass --input with annotated records (e.g. app/training/data/*_data.json)
+to check real documents instead: how many annotated spans are still in a
+candidate sentence, and how many deed entities are picked from the
+sentence holding their annotated span when every sentence is encoded and
+when only the candidates are. Exits with status 1 if the candidates do
+worse on either count.
+
+Run from the title_search_platform directory:
+    python -m benchmarks.sentence_filter --docs 50 --pages 12
+    python -m benchmarks.sentence_filter --input app/training/data/train_data.json app/training/data/dev_data.json
+"""
+import sys
+import time
+import random
+import argparse
+
+from nltk.tokenize import sent_tokenize
+
+from app.entity_extractor import (
+    ENTITY_PROMPTS, NOISE_KEYWORDS, clean_sentences, select_candidates, encode_sentence_lists,
+    extract_entities_from_sentences
+)
+from app.training.training_data import iter_records
+from benchmarks.batch_inference import make_document
+
+BOILERPLATE = [
+    "Prepared by and return to: Title Services LLC, 100 Main Street.",
+    "Notary Public, State of Florida. My commission expires 01/01/2027.",
+    "SPACE ABOVE THIS LINE FOR RECORDING DATA.",
+    "Doc Stamps $700.00 paid at recording.",
+]
+
+
+def baseline_clean_sentences(text: str) -> list:
+    """clean_sentences as it was: one sent_tokenize over the whole document."""
+    return [
+        s.strip()
+        for s in sent_tokenize(text)
+        if s.strip() and not any(nk.lower() in s.lower() for nk in NOISE_KEYWORDS)
+    ]
+
+
+def make_abstract(rng: random.Random, pages: int) -> str:
+    segments = []
+    for page_number in range(1, pages + 1):
+        body = " ".join([make_document(rng)] + rng.sample(BOILERPLATE, 2))
+        segments.append(f"--- Page {page_number} (OCR) ---\n{body}\n\n")
+    return "".join(segments)
+
+
+def timed(fn, texts):
+    started = time.perf_counter()
+    results = [fn(text) for text in texts]
+    return results, time.perf_counter() - started
+
+
+def annotated_spans(record: dict) -> list:
+    """(entity name, span text) of each annotation, names lowercased like ENTITY_PROMPTS keys."""
+    return [(label.lower(), record["text"][start:end]) for start, end, label in record["entities"]]
+
+
+def count_hits(picks: list, records: list) -> int:
+    """Annotated deed entities whose picked sentence contains the annotated span."""
+    return sum(
+        1
+        for extracted, record in zip(picks, records)
+        for entity, span in annotated_spans(record)
+        if entity in ENTITY_PROMPTS["deed"] and span in extracted.get(entity, "")
+    )
+
+
+def check_annotated(args) -> None:
+    records = list(iter_records(args.input))
+    sentence_lists = [clean_sentences(record["text"]) for record in records]
+    candidate_lists = [select_candidates(sentences) for sentences in sentence_lists]
+
+    spans = [(span, sentences, candidates)
+             for record, sentences, candidates in zip(records, sentence_lists, candidate_lists)
+             for _, span in annotated_spans(record)]
+    in_sentences = sum(1 for span, sentences, _ in spans if any(span in s for s in sentences))
+    in_candidates = sum(1 for span, _, candidates in spans if any(span in s for s in candidates))
+    print(f"annotated documents:  {len(records)}")
+    print(f"sentences per doc:    all {sum(map(len, sentence_lists)) / len(records):.1f}  "
+          f"encoded {sum(map(len, candidate_lists)) / len(records):.1f}")
+    print(f"annotated spans kept: all sentences {in_sentences}/{len(spans)}  candidates {in_candidates}/{len(spans)}")
+    failed = in_candidates < in_sentences
+
+    if not args.no_model:
+        doc_types = ["deed"] * len(records)
+        expected = extract_entities_from_sentences(sentence_lists, doc_types, encode_sentence_lists(sentence_lists))
+        actual = extract_entities_from_sentences(candidate_lists, doc_types, encode_sentence_lists(candidate_lists))
+        deed_spans = sum(1 for record in records for entity, _ in annotated_spans(record)
+                         if entity in ENTITY_PROMPTS["deed"])
+        expected_hits, actual_hits = count_hits(expected, records), count_hits(actual, records)
+        print(f"deed entities found:  all sentences {expected_hits}/{deed_spans}  "
+              f"candidates {actual_hits}/{deed_spans}")
+        print(f"documents with different picks: {sum(1 for a, b in zip(expected, actual) if a != b)}")
+        failed = failed or actual_hits < expected_hits
+
+    if failed:
+        print("Candidate selection loses annotated entities; raise ENTITY_MAX_SENTENCES.")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=50, help="Number of synthetic abstracts.")
+    parser.add_argument("--pages", type=int, default=12, help="Pages per abstract.")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--no-model", action="store_true", help="Skip the entity extraction comparison.")
+    parser.add_argument("--input", nargs="*", help="Annotated records or Label Studio exports to check instead.")
+    args = parser.parse_args()
+    if args.input:
+        check_annotated(args)
+        return
+
+    rng = random.Random(args.seed)
+    texts = [make_abstract(rng, args.pages) for _ in range(args.docs)]
+
+    baseline, baseline_seconds = timed(baseline_clean_sentences, texts)
+    current, current_seconds = timed(clean_sentences, texts)
+    candidates = [select_candidates(sentences) for sentences in current]
+    print(f"documents:            {len(texts)} x {args.pages} pages")
+    print(f"segment+filter:       baseline {baseline_seconds:.2f}s  current {current_seconds:.2f}s")
+    print(f"sentences per doc:    baseline {sum(map(len, baseline)) / len(texts):.1f}  "
+          f"current {sum(map(len, current)) / len(texts):.1f}  "
+          f"encoded {sum(map(len, candidates)) / len(texts):.1f}")
+    if args.no_model:
+        return
+
+    doc_types = ["deed"] * len(texts)
+    extract_entities_from_sentences(baseline[:1], doc_types[:1])  # load the model
+    started = time.perf_counter()
+    # Precomputed embeddings bypass candidate selection: every sentence is scored, as before
+    expected = extract_entities_from_sentences(baseline, doc_types, encode_sentence_lists(baseline))
+    baseline_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    actual = extract_entities_from_sentences(current, doc_types)
+    current_seconds = time.perf_counter() - started
+    differing = sum(1 for a, b in zip(expected, actual) if a != b)
+    print(f"entity extraction:    baseline {baseline_seconds:.2f}s  current {current_seconds:.2f}s")
+    print(f"documents with different picks: {differing}")
+
+
+if __name__ == "__main__":
+    main()
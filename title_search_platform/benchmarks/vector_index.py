@@ -0,0 +1,68 @@
+"""
+Recall and latency of the memory-mapped vector index: exact vs approximate
+(IVF) search, float16 vs int8 storage.
+
+Uses clustered random vectors shaped like MiniLM embeddings (384 dims), so
+no model is needed. Recall@k is measured against float32 brute force.
+
+Run from the title_search_platform directory:
+    python -m benchmarks.vector_index --vectors 200000
+"""
+import time
+import argparse
+import tempfile
+import statistics
+
+import numpy as np
+
+from app.vector_index import VectorIndex, normalize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centers = rng.normal(size=(args.clusters, args.dim))
+    vectors = normalize(centers[rng.integers(0, args.clusters, args.vectors)] + 0.5 * rng.normal(size=(args.vectors, args.dim)))
+    picks = rng.integers(0, args.vectors, args.queries)
+    queries = normalize(vectors[picks] + 0.2 * rng.normal(size=(args.queries, args.dim)))
+    truth = [set(np.argsort(-(vectors @ q))[:args.k]) for q in queries]
+
+    print(f"{'storage':<8} {'mode':<14} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for dtype in ("float16", "int8"):
+        with tempfile.TemporaryDirectory() as directory:
+            index = VectorIndex(directory, dtype=dtype)
+            started = time.perf_counter()
+            for owner, start in enumerate(range(0, args.vectors, 1000)):
+                index.add(owner, vectors[start:start + 1000])
+            add_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            index.train()
+            train_seconds = time.perf_counter() - started
+            stats = index.stats()
+            print(f"{dtype:<8} added {args.vectors} in {add_seconds:.1f}s, trained {stats['lists']} lists "
+                  f"in {train_seconds:.1f}s, {stats['bytes'] / 2**20:.1f} MiB on disk")
+
+            modes = [("exact", False, None)] + [(f"approx/{n}", True, n) for n in args.nprobe]
+            for name, approximate, nprobe in modes:
+                timings, recalls = [], []
+                for query, expected in zip(queries, truth):
+                    started = time.perf_counter()
+                    hits = index.search(query, k=args.k, approximate=approximate, nprobe=nprobe or 1)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    recalls.append(len({hit["row"] for hit in hits} & expected) / args.k)
+                timings.sort()
+                print(f"{dtype:<8} {name:<14} {statistics.mean(recalls):>9.3f} {statistics.median(timings):>8.2f} "
+                      f"{timings[int(0.95 * (len(timings) - 1))]:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Check that processes appending to the same vector index keep every row.
+
+Starts --writers processes that each add --docs documents (a random number
+of passage rows with texts, like the passage index) to one index
+directory, while the first writer also retrains the IVF quantizer
+halfway through. Then verifies that every writer's rows survived, with
+their owner ids, texts and vectors, and that every row has an IVF list.
+Exits with status 1 if any row is missing or wrong.
+
+Run from the title_search_platform directory:
+    python -m benchmarks.vector_index_writers --writers 4 --docs 200
+"""
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+from app.vector_index import VectorIndex, normalize
+
+DIM = 384
+
+
+def document(owner: int):
+    """The rows and texts of one document, reproducible from its owner id."""
+    rng = np.random.default_rng(owner)
+    rows = int(rng.integers(1, 20))
+    return normalize(rng.normal(size=(rows, DIM))), [f"{owner}:{row}" for row in range(rows)]
+
+
+def owners(writer: int, docs: int) -> range:
+    return range(writer * 1_000_000 + 1, writer * 1_000_000 + docs + 1)
+
+
+def write(directory: str, dtype: str, writer: int, docs: int) -> None:
+    index = VectorIndex(directory, dtype=dtype, with_texts=True)
+    for number, owner in enumerate(owners(writer, docs)):
+        vectors, texts = document(owner)
+        index.add(owner, vectors, texts=texts)
+        if writer == 0 and number == docs // 2:
+            index.train(nlist=16)
+
+
+def verify(directory: str, dtype: str, writers: int, docs: int) -> list:
+    index = VectorIndex(directory, dtype=dtype, with_texts=True)
+    snapshot = index._snapshot
+    ids = np.asarray(snapshot.ids)
+    problems = []
+    expected_rows = 0
+    for writer in range(writers):
+        for owner in owners(writer, docs):
+            vectors, texts = document(owner)
+            expected_rows += len(vectors)
+            rows = np.flatnonzero(ids == owner)
+            if len(rows) != len(vectors):
+                problems.append(f"owner {owner}: {len(rows)} rows, expected {len(vectors)}")
+                continue
+            try:
+                stored_texts = [index._text(snapshot, int(row)) for row in rows]
+            except (ValueError, UnicodeDecodeError) as e:
+                stored_texts = [f"unreadable: {e}"]
+            if stored_texts != texts:
+                problems.append(f"owner {owner}: texts do not match")
+            stored = index.vectors_for(owner)
+            if np.min(np.sum(normalize(stored) * vectors, axis=1)) < 0.99:
+                problems.append(f"owner {owner}: vectors do not match")
+    if snapshot.size != expected_rows:
+        problems.append(f"index has {snapshot.size} rows, expected {expected_rows}")
+    if snapshot.lists is None or len(snapshot.lists) != snapshot.size:
+        assigned = 0 if snapshot.lists is None else len(snapshot.lists)
+        problems.append(f"{assigned} of {snapshot.size} rows have an IVF list")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--docs", type=int, default=200, help="Documents added by each writer.")
+    parser.add_argument("--dtype", choices=("float16", "int8"), default="int8")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        context = multiprocessing.get_context("spawn")
+        processes = [context.Process(target=write, args=(directory, args.dtype, writer, args.docs))
+                     for writer in range(args.writers)]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        seconds = time.perf_counter() - started
+        failed_writers = [i for i, process in enumerate(processes) if process.exitcode != 0]
+        problems = verify(directory, args.dtype, args.writers, args.docs)
+
+    print(f"writers: {args.writers} x {args.docs} documents ({args.dtype}) in {seconds:.1f}s")
+    if failed_writers:
+        problems.append(f"writers {failed_writers} exited with an error")
+    for problem in problems[:20]:
+        print(f"  {problem}")
+    if problems:
+        print(f"FAILED: {len(problems)} problem(s)")
+        sys.exit(1)
+    print("all rows intact")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Per-worker memory of the API under gunicorn, with and without loading the
+models in the master before the workers fork.
+
+Starts `gunicorn app.main:app` twice with --workers N:
+  - per-worker: plain UvicornWorker workers; each loads the models in
+    main.on_startup, after the fork
+  - preload:    -c python:app.gunicorn_conf; the master loads the models
+    once and the workers inherit them copy-on-write
+waits until every worker has finished startup (which also encodes the
+reference and prompt texts), then reads /proc/<pid>/smaps_rollup of the
+master and each worker. RSS counts shared pages in full in every process;
+PSS splits them between the processes sharing them, so the PSS total is
+the memory the deployment really uses, and USS (private pages) is what
+each extra worker adds.
+
+Needs gunicorn and Linux /proc. The app reads its usual environment (.env);
+point DATABASE_URL at a SQLite file to run without MySQL.
+
+Run from the title_search_platform directory:
+    python -m benchmarks.worker_memory --workers 4
+"""
+import os
+import sys
+import time
+import signal
+import argparse
+import threading
+import subprocess
+
+MIB = 2 ** 20
+
+
+def smaps_rollup(pid: int) -> dict:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1]) * 1024
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "uss": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+def children(pid: int) -> list:
+    pids = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            pids.extend(int(child) for child in f.read().split())
+    return pids
+
+
+def run_gunicorn(mode: str, args) -> dict:
+    command = [sys.executable, "-m", "gunicorn", "app.main:app", "--workers", str(args.workers),
+               "--bind", f"127.0.0.1:{args.port}"]
+    if mode == "preload":
+        command += ["-c", "python:app.gunicorn_conf"]
+    else:
+        command += ["-k", "uvicorn.workers.UvicornWorker", "--timeout", "300"]
+    env = dict(os.environ, MODEL_WARMUP=args.models)
+    started = time.perf_counter()
+    process = subprocess.Popen(command, env=env, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, text=True)
+
+    ready = threading.Event()
+    lines = []
+
+    def read_log():
+        ready_workers = 0
+        for line in process.stderr:
+            lines.append(line)
+            if "Application startup complete" in line:
+                ready_workers += 1
+                if ready_workers == args.workers:
+                    ready.set()
+
+    threading.Thread(target=read_log, daemon=True).start()
+    try:
+        if not ready.wait(args.timeout):
+            raise RuntimeError(f"{mode}: workers not ready after {args.timeout}s:\n" + "".join(lines[-20:]))
+        ready_seconds = time.perf_counter() - started
+        time.sleep(args.settle)
+        return {
+            "ready_seconds": ready_seconds,
+            "master": smaps_rollup(process.pid),
+            "workers": [smaps_rollup(pid) for pid in children(process.pid)],
+        }
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def report(mode: str, result: dict) -> None:
+    workers = result["workers"]
+    print(f"{mode} ({len(workers)} workers ready in {result['ready_seconds']:.1f}s)")
+    print(f"  {'process':<10} {'RSS MiB':>9} {'PSS MiB':>9} {'USS MiB':>9}")
+    for name, usage in [("master", result["master"])] + [(f"worker {i}", w) for i, w in enumerate(workers)]:
+        print(f"  {name:<10} {usage['rss'] / MIB:9.1f} {usage['pss'] / MIB:9.1f} {usage['uss'] / MIB:9.1f}")
+    total_pss = (result["master"]["pss"] + sum(w["pss"] for w in workers)) / MIB
+    mean_rss = sum(w["rss"] for w in workers) / len(workers) / MIB
+    mean_uss = sum(w["uss"] for w in workers) / len(workers) / MIB
+    print(f"  per worker: RSS {mean_rss:.1f} MiB, USS {mean_uss:.1f} MiB; total PSS {total_pss:.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--models", default="embedding", help="MODEL_WARMUP for both runs.")
+    parser.add_argument("--settle", type=float, default=2.0, help="Seconds to wait after startup before measuring.")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    args = parser.parse_args()
+
+    for mode in ("per-worker", "preload"):
+        report(mode, run_gunicorn(mode, args))
+
+
+if __name__ == "__main__":
+    main()
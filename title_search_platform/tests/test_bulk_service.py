@@ -0,0 +1,127 @@
+import json
+import uuid
+import fcntl
+import asyncio
+import threading
+
+import pytest
+
+from app import bulk_service
+
+
+class FakeIngest:
+    """Stands in for BulkIngest: runs until released, then ends as done (or stopped)."""
+
+    def __init__(self, sources, checkpoint_path, extractor):
+        self.release = threading.Event()
+        self.status = "running"
+        self.outcome = "done"
+
+    def run(self):
+        self.release.wait(10)
+        self.status = self.outcome
+        return {"status": self.outcome, "documents": 1}
+
+    def stats(self):
+        return {"status": self.status}
+
+    def stop(self):
+        self.outcome = "stopped"
+        self.release.set()
+
+
+def stage(runs_dir, run_id=None):
+    run_id = run_id or uuid.uuid4().hex
+    run_dir = runs_dir / run_id
+    (run_dir / "sources").mkdir(parents=True)
+    (run_dir / "run.json").write_text(json.dumps({"extractor": None, "files": []}))
+    return run_id
+
+
+def finish(run_id, ingest):
+    ingest.release.set()
+    for thread in threading.enumerate():
+        if thread.name == f"bulk-{run_id[:8]}":
+            thread.join(10)
+
+
+def status(run_id):
+    return asyncio.run(bulk_service.get_bulk_ingest(run_id)).status
+
+
+@pytest.fixture
+def runs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk_service, "RUNS_DIR", tmp_path)
+    monkeypatch.setattr(bulk_service, "BulkIngest", FakeIngest)
+    yield tmp_path
+    with bulk_service._runs_lock:
+        running = list(bulk_service._runs.items())
+    for run_id, ingest in running:
+        finish(run_id, ingest)
+
+
+def test_a_claimed_run_is_not_started_twice(runs_dir):
+    run_id = stage(runs_dir)
+    ingest = bulk_service.start_run(run_id)
+
+    assert ingest is not None
+    assert bulk_service.start_run(run_id) is None
+    assert bulk_service.resume_bulk_runs() == 0
+    assert bulk_service._claimed_status(runs_dir / run_id) == "running"
+
+    finish(run_id, ingest)
+    assert json.loads((runs_dir / run_id / "summary.json").read_text())["status"] == "done"
+    assert not (runs_dir / run_id / "sources").exists()
+    assert bulk_service.start_run(run_id) is None
+    assert status(run_id) == "done"
+
+
+def test_resume_starts_only_staged_unfinished_runs(runs_dir):
+    unfinished = stage(runs_dir)
+    finished = stage(runs_dir)
+    (runs_dir / finished / "summary.json").write_text(json.dumps({"status": "done"}))
+    # Still being staged: run.json is written last
+    (runs_dir / uuid.uuid4().hex / "sources").mkdir(parents=True)
+    stage(runs_dir, run_id="not-a-run-id")
+
+    assert bulk_service.resume_bulk_runs() == 1
+    assert set(bulk_service._runs) == {unfinished}
+
+
+def test_run_held_by_another_worker_is_skipped(runs_dir):
+    run_id = stage(runs_dir)
+    # flock locks belong to the open file, so a second open stands in for another worker process
+    with open(runs_dir / run_id / "run.json", "rb") as other_worker:
+        fcntl.flock(other_worker, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        assert bulk_service.resume_bulk_runs() == 0
+        assert status(run_id) == "running"
+    # Released when that worker exits
+    assert status(run_id) == "interrupted"
+    assert bulk_service.resume_bulk_runs() == 1
+
+
+def test_stopped_run_releases_its_claim_for_the_next_start(runs_dir):
+    run_id = stage(runs_dir)
+    ingest = bulk_service.start_run(run_id)
+
+    bulk_service.stop_bulk_runs()
+    finish(run_id, ingest)
+
+    assert not (runs_dir / run_id / "summary.json").exists()
+    assert status(run_id) == "interrupted"
+    assert bulk_service.resume_bulk_runs() == 1
+
+
+def test_claim_is_released_when_the_run_cannot_be_set_up(runs_dir, monkeypatch):
+    run_id = stage(runs_dir)
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("bad sources")
+
+    monkeypatch.setattr(bulk_service, "BulkIngest", broken)
+    with pytest.raises(RuntimeError):
+        bulk_service.start_run(run_id)
+
+    claim = bulk_service._claim(runs_dir / run_id)
+    assert claim is not None
+    claim.close()
@@ -0,0 +1,92 @@
+import datetime
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import db_manager, file_service
+from app.db_manager import JOB_DONE, JOB_FAILED, JOB_RUNNING
+
+
+@pytest.fixture
+def dbm(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    db_manager.Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(db_manager.DBMetadataManager, "SessionLocal", sessionmaker(bind=engine))
+    yield db_manager.db_metadata_manager
+    engine.dispose()
+
+
+def create(dbm, job_id="job-1"):
+    assert dbm.create_job(job_id, "deed.pdf", "sha256/abc.pdf", 10, datetime.datetime.utcnow(), "abc")
+    return job_id
+
+
+def test_claim_job_is_exclusive_while_the_lease_holds(dbm):
+    job_id = create(dbm)
+
+    assert dbm.claim_job(job_id, "worker-a", lease_seconds=300)
+    assert not dbm.claim_job(job_id, "worker-b", lease_seconds=300)
+    assert not dbm.claim_job(job_id, "worker-a", lease_seconds=300)
+    assert dbm.get_job(job_id)["status"] == JOB_RUNNING
+    assert dbm.list_claimable_job_ids() == []
+
+
+def test_expired_lease_is_taken_over_and_fences_the_old_owner(dbm):
+    job_id = create(dbm)
+    assert dbm.claim_job(job_id, "worker-a", lease_seconds=-1)
+
+    assert dbm.list_claimable_job_ids() == [job_id]
+    assert dbm.claim_job(job_id, "worker-b", lease_seconds=300)
+    # The first owner's late result no longer applies, and it cannot renew the lease
+    assert not dbm.update_job(job_id, JOB_DONE, result={"db_id": 1}, owner="worker-a")
+    assert dbm.renew_job_leases([job_id], "worker-a", 300) == 0
+    assert dbm.renew_job_leases([job_id], "worker-b", 300) == 1
+    assert dbm.update_job(job_id, JOB_DONE, result={"db_id": 2}, owner="worker-b")
+    assert dbm.get_job(job_id)["result"] == {"db_id": 2}
+
+
+@pytest.mark.parametrize("status", [JOB_DONE, JOB_FAILED])
+def test_finished_jobs_are_not_claimable(dbm, status):
+    job_id = create(dbm)
+    assert dbm.claim_job(job_id, "worker-a", lease_seconds=300)
+    assert dbm.update_job(job_id, status, owner="worker-a")
+
+    assert dbm.get_job(job_id)["status"] == status
+    assert not dbm.claim_job(job_id, "worker-b", lease_seconds=-1)
+    assert dbm.list_claimable_job_ids() == []
+
+
+def test_concurrent_claims_have_one_winner(dbm):
+    job_id = create(dbm)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def claim(owner):
+        barrier.wait()
+        results.append(dbm.claim_job(job_id, owner, lease_seconds=300))
+
+    threads = [threading.Thread(target=claim, args=(f"worker-{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 1
+
+
+def test_process_job_skips_a_job_held_by_another_worker(dbm, monkeypatch):
+    job_id = create(dbm)
+    assert dbm.claim_job(job_id, "another-host:1", lease_seconds=300)
+
+    def unexpected(*args, **kwargs):
+        raise AssertionError("an unclaimed job was processed")
+
+    monkeypatch.setattr(file_service, "analyze_pdf_bytes", unexpected)
+    monkeypatch.setattr(file_service, "cached_analysis", unexpected)
+    file_service.process_job(job_id)
+
+    job = dbm.get_job(job_id)
+    assert job["status"] == JOB_RUNNING
+    assert job["error"] is None
@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+from app.keyword_matcher import KeywordMatcher
+from app.document_classifier import DOCUMENT_KEYWORDS, score_keywords
+
+
+def baseline_scores(keyword_sets, text, count_occurrences=False):
+    """The per-label scan KeywordMatcher replaced."""
+    lowered = text.lower()
+    scores = {}
+    for label, entries in keyword_sets.items():
+        scores[label] = 0
+        for entry in entries:
+            phrase, weight = (entry, 1) if isinstance(entry, str) else entry
+            if count_occurrences:
+                scores[label] += weight * lowered.count(phrase.lower())
+            elif phrase.lower() in lowered:
+                scores[label] += weight
+    return scores
+
+
+def test_counts_are_case_insensitive_and_non_overlapping():
+    matcher = KeywordMatcher({"a": ["Lien", "aa"], "b": ["lis pendens"]})
+    text = "LIEN and lien, recorded lien; aaaaa. No LIS  pendens here."
+
+    assert matcher.phrases == ["lien", "aa", "lis pendens"]
+    assert matcher.find_matches(text) == [1, 1, 0]
+    assert matcher.count_matches(text) == [3, 2, 0]
+
+
+def test_phrase_shared_by_labels_is_scanned_once_and_scored_per_label():
+    matcher = KeywordMatcher({"deed": ["grantor", ("deed", 2)], "mortgage": [("Deed", 0.5), "lender"], "empty": [""]})
+
+    assert matcher.num_keywords == 3
+    assert matcher.score("Deed: the grantor and the deed") == {"deed": 3, "mortgage": 0.5, "empty": 0}
+    assert matcher.score("Deed: the grantor and the deed", count_occurrences=True) == \
+        {"deed": 5, "mortgage": 1.0, "empty": 0}
+
+
+def test_scores_from_summed_page_counts_match_the_whole_text():
+    matcher = KeywordMatcher(DOCUMENT_KEYWORDS)
+    pages = ["Warranty Deed. Grantor: Jane Doe", "grantee John Roe; the grantor conveys", "recorded lien"]
+    counts = [sum(column) for column in zip(*(matcher.count_matches(page) for page in pages))]
+    text = "\n\n".join(pages)
+
+    assert matcher.scores_from_counts(counts, count_occurrences=True) == matcher.score(text, count_occurrences=True)
+    assert matcher.scores_from_counts(counts) == matcher.score(text)
+
+
+@pytest.mark.parametrize("count_occurrences", [False, True])
+def test_document_scores_match_the_per_label_scan(count_occurrences):
+    rng = random.Random(0)
+    vocabulary = [phrase for phrases in DOCUMENT_KEYWORDS.values() for phrase in phrases]
+    vocabulary += ["the", "property", "County", "1998", "recorded", "MORTGAGE", "Deed"]
+    for _ in range(300):
+        words = [rng.choice(vocabulary) for _ in range(rng.randint(0, 40))]
+        text = " ".join(word.upper() if rng.random() < 0.2 else word for word in words)
+        assert score_keywords(text, count_occurrences) == \
+            baseline_scores(DOCUMENT_KEYWORDS, text, count_occurrences)
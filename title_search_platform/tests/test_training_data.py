@@ -0,0 +1,71 @@
+import io
+import json
+
+import pytest
+
+from app.training.training_data import iter_json_array, iter_json_items, to_record
+
+
+def read(text: str, chunk_size: int) -> list:
+    return list(iter_json_array(io.StringIO(text), chunk_size))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 1024])
+@pytest.mark.parametrize("items", [
+    [],
+    [1234567, 2],
+    [-12.5e-3, 3.14159, 1.5e20, -0.0, 12345678901234567890],
+    [True, False, None, "abcdef", ""],
+    [{"text": "Grantor: Jane Doe", "entities": [[9, 17, "GRANTOR"]]}, [1e10, -7], {"a": [1, 22, 333]}],
+    ["quote \" and comma , and bracket ]", "été"],
+])
+def test_iter_json_array_matches_json_loads_at_every_chunk_size(items, chunk_size):
+    for separators in ((",", ":"), (", ", ": ")):
+        text = json.dumps(items, separators=separators)
+        assert read(text, chunk_size) == items
+        assert read(f"  \n{text}\n", chunk_size) == items
+
+
+@pytest.mark.parametrize("text", ["[1234567, 2]", "[1.5, 2]", "[1e3, 2]", "[1.5E+20, 2]", "[-42]"])
+def test_iter_json_array_does_not_split_numbers_at_a_chunk_edge(text):
+    expected = json.loads(text)
+    for chunk_size in range(1, len(text) + 1):
+        assert read(text, chunk_size) == expected
+
+
+@pytest.mark.parametrize("text, error", [
+    ("{}", "Expected a JSON array."),
+    ("[1, 2", "Unterminated JSON array."),
+    ('["abc', None),
+    ("[1.x]", None),
+])
+def test_iter_json_array_rejects_malformed_input(text, error):
+    with pytest.raises(ValueError, match=error):
+        read(text, 2)
+
+
+def test_iter_json_items_reads_arrays_and_jsonl(tmp_path):
+    records = [{"text": "a", "entities": []}, {"text": "b", "entities": [[0, 1, "X"]]}]
+    array_path = tmp_path / "records.json"
+    array_path.write_text(json.dumps(records, indent=2))
+    jsonl_path = tmp_path / "records.jsonl"
+    jsonl_path.write_text("\n".join(json.dumps(record) for record in records) + "\n\n")
+
+    assert list(iter_json_items(str(array_path))) == records
+    assert list(iter_json_items(str(jsonl_path))) == records
+
+
+def test_to_record_normalizes_label_studio_exports():
+    full_export = {
+        "data": {"text": "Deed by Jane"},
+        "annotations": [
+            {"was_cancelled": True, "result": []},
+            {"result": [{"value": {"start": 8, "end": 12, "labels": ["GRANTOR"]}}]},
+        ],
+    }
+    min_export = {"text": "Deed by Jane", "label": [{"start": 8, "end": 12, "labels": ["GRANTOR"]}]}
+    expected = {"text": "Deed by Jane", "entities": [[8, 12, "GRANTOR"]]}
+
+    assert to_record(full_export) == expected
+    assert to_record(min_export) == expected
+    assert to_record({"data": {"text": "x"}, "annotations": [{"was_cancelled": True}]}) is None
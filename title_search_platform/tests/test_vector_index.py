@@ -0,0 +1,107 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from app.vector_index import VectorIndex, normalize
+from benchmarks import vector_index_writers
+
+DIM = 16
+
+
+def rows(seed, count):
+    return normalize(np.random.default_rng(seed).normal(size=(count, DIM)))
+
+
+@pytest.fixture(params=["float16", "int8"])
+def dtype(request):
+    return request.param
+
+
+def test_add_grows_the_index_and_search_finds_each_row(tmp_path, dtype):
+    index = VectorIndex(str(tmp_path), dtype=dtype, with_texts=True)
+    first, second = rows(1, 3), rows(2, 2)
+
+    assert index.add(7, first, texts=["a", "b", "c"]) == 3
+    assert index.add(8, second, texts=["d", "é"]) == 2
+
+    assert index.size == 5
+    assert np.allclose(index.vectors_for(8), second, atol=0.02)
+    hit = index.search(second[1], k=1)[0]
+    assert (hit["db_id"], hit["row"], hit["text"]) == (8, 4, "é")
+    assert [hit["db_id"] for hit in index.search(second[1], k=5, exclude_id=8)] == [7, 7, 7]
+
+
+def test_add_rejects_mismatched_rows(tmp_path, dtype):
+    index = VectorIndex(str(tmp_path), dtype=dtype, with_texts=True)
+    index.add(1, rows(1, 2), texts=["a", "b"])
+
+    with pytest.raises(ValueError):
+        index.add(2, rows(2, 2), texts=["only one"])
+    with pytest.raises(ValueError):
+        index.add(2, np.ones((1, DIM + 1)), texts=["x"])
+    assert index.add(3, np.empty((0, DIM))) == 0
+    assert index.size == 2
+
+
+def test_instances_sharing_a_directory_see_and_keep_each_others_rows(tmp_path, dtype):
+    # Each instance maps the files on its own, as separate worker processes do
+    api = VectorIndex(str(tmp_path), dtype=dtype)
+    bulk = VectorIndex(str(tmp_path), dtype=dtype)
+
+    api.add(1, rows(1, 2))
+    bulk.add(2, rows(2, 3))
+    api.add(3, rows(3, 1))
+
+    for index in (api, bulk, VectorIndex(str(tmp_path), dtype=dtype)):
+        assert len(index.vectors_for(2)) == 3
+        assert index.size == 6
+        assert [hit["db_id"] for hit in index.search(rows(3, 1)[0], k=1)] == [3]
+    assert list(np.asarray(VectorIndex(str(tmp_path), dtype=dtype)._snapshot.ids)) == [1, 1, 2, 2, 2, 3]
+
+
+def test_retraining_in_one_instance_is_picked_up_by_the_others(tmp_path, dtype):
+    trainer = VectorIndex(str(tmp_path), dtype=dtype)
+    writer = VectorIndex(str(tmp_path), dtype=dtype)
+    for owner in range(20):
+        writer.add(owner, rows(owner, 4))
+
+    trainer.train(nlist=4)
+    writer.add(100, rows(100, 3))
+
+    snapshot = VectorIndex(str(tmp_path), dtype=dtype)._snapshot
+    assert snapshot.centroids is not None and len(snapshot.centroids) == 4
+    assert len(snapshot.lists) == snapshot.size == 83
+    assert writer.meta["trained_size"] == 80
+
+
+def test_a_torn_append_is_dropped_and_the_next_add_stays_aligned(tmp_path, dtype):
+    index = VectorIndex(str(tmp_path), dtype=dtype, with_texts=True)
+    index.add(1, rows(1, 2), texts=["a", "b"])
+    # A writer that died after writing only part of a row
+    with open(tmp_path / "vectors.bin", "ab") as f:
+        f.write(b"\x01" * 5)
+    with open(tmp_path / "texts.bin", "ab") as f:
+        f.write(b"partial")
+
+    reopened = VectorIndex(str(tmp_path), dtype=dtype, with_texts=True)
+    assert reopened.size == 2
+    reopened.add(2, rows(2, 1), texts=["c"])
+
+    assert reopened.size == 3
+    assert np.allclose(reopened.vectors_for(2), rows(2, 1), atol=0.02)
+    assert reopened.search(rows(2, 1)[0], k=1)[0]["text"] == "c"
+
+
+def test_concurrent_writer_processes_keep_every_row(tmp_path):
+    writers, docs = 3, 30
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=vector_index_writers.write, args=(str(tmp_path), "int8", writer, docs))
+                 for writer in range(writers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(120)
+
+    assert [process.exitcode for process in processes] == [0] * writers
+    assert vector_index_writers.verify(str(tmp_path), "int8", writers, docs) == []